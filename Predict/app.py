@@ -1,8 +1,25 @@
-from flask import Flask, request, jsonify, make_response
-import pickle
-import re
+from flask import Flask, Response, request, jsonify, make_response, g, has_request_context
+import os
+import time
 import logging
+import threading
+from contextlib import contextmanager
+from pathlib import Path
 from typing import List, Dict
+from prediction_cache import PredictionCache
+from model_registry import ModelRegistry, ModelNotReady
+from features import Entrada, canonical_name, consulta_atributos, consulta_relacion, orden_indiferente
+from domain_index import DomainIndex
+from inference import InferenceExecutor, MicroBatcher, Overloaded
+from metrics import MetricsRegistry, SampledPayloadLogger, SIZE_BUCKETS
+from sessions import SessionError, SessionStore
+from lookup import ExactLookup
+from features import normalize_name
+from domain_vocab import DomainVocab, collect_domain_entities
+from startup import StartupReport
+from streaming import stream_events
+from profiling import MODES as PROFILE_MODES, RequestProfiler
+from wire import FastJSONProvider, WireRequest
 try:
     from flask_cors import CORS
 except Exception:
@@ -11,40 +28,425 @@ except Exception:
 logging.basicConfig(level=logging.INFO,
                     format='[%(asctime)s] %(levelname)s in %(module)s: %(message)s')
 
+# Informe de arranque: hitos desde el inicio del proceso y duración de cada fase.
+# sklearn, joblib, numpy y scipy se importan en diferido (hilos de carga o primera petición
+# que los necesita) para que no estén en el camino hasta la primera respuesta.
+_STARTUP = StartupReport()
+_STARTUP.mark("imports")
+
 app = Flask(__name__)
-# CORS manual - más confiable que flask-cors
+# JSON con orjson si está disponible, msgpack por Content-Type/Accept y forma interning
+app.json_provider_class = FastJSONProvider
+app.json = FastJSONProvider(app)
+app.request_class = WireRequest
+# CORS manual - más confiable que flask-cors. asgi.py usa la misma política en /health y /ready
+_CORS_HEADERS = {
+    'Access-Control-Allow-Origin': '*',
+    'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
+    'Access-Control-Allow-Headers': 'Content-Type, Accept, Authorization',
+    'Access-Control-Max-Age': '3600',
+}
+
+
 @app.after_request
 def add_cors(response):
-    response.headers['Access-Control-Allow-Origin'] = '*'
-    response.headers['Access-Control-Allow-Methods'] = 'GET, POST, OPTIONS'
-    response.headers['Access-Control-Allow-Headers'] = 'Content-Type, Authorization'
-    response.headers['Access-Control-Max-Age'] = '3600'
+    response.headers.update(_CORS_HEADERS)
     return response
 
+# Métricas en proceso; el log de payloads es opcional y muestreado
+# (PREDICT_LOG_SAMPLE=0.01 registra ~1% de las peticiones desde un hilo aparte)
+_METRICS = MetricsRegistry()
+_PAYLOAD_LOG = SampledPayloadLogger(rate=float(os.environ.get("PREDICT_LOG_SAMPLE", "0")))
+_BYTES_BUCKETS = tuple(256 * 4 ** i for i in range(10))  # 256 B .. 64 MB
+# Perfilado bajo demanda: cabecera ``X-Profile: sample|cprofile`` (solo con ADMIN_TOKEN definido y su
+# X-Admin-Token) o una fracción de las peticiones (PREDICT_PROFILE_SAMPLE=0.001). Resultados en /admin/profiles
+_PROFILER = RequestProfiler(
+    rate=float(os.environ.get("PREDICT_PROFILE_SAMPLE", "0")),
+    mode=os.environ.get("PREDICT_PROFILE_MODE", "sample"),
+    interval=float(os.environ.get("PREDICT_PROFILE_INTERVAL_MS", "1")) / 1000,
+    max_profiles=int(os.environ.get("PREDICT_PROFILE_KEEP", "50")),
+)
+
+
+def _route_label() -> str:
+    return request.url_rule.rule if request.url_rule else "unmatched"
+
+
+@contextmanager
+def _stage(name: str):
+    """Mide una fase (parse / features / predict / serialize) de la ruta actual.
+
+    Una fase anidada (p. ej. las features que ``_tiered_atributos`` construye
+    solo para lo que no resuelve la consulta exacta) descuenta su tiempo de la
+    que la contiene. Fuera de una petición (productores SSE) no mide nada."""
+    if not has_request_context():
+        yield
+        return
+    anidadas = g.setdefault("stage_nested", [])
+    anidadas.append(0.0)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        own = elapsed - anidadas.pop()
+        if anidadas:
+            anidadas[-1] += elapsed
+        _METRICS.histogram("predict_stage_seconds", route=_route_label(), stage=name).observe(own)
+        profile = g.get("profile")
+        if profile is not None:
+            profile.stage(name, own)
+
+
 @app.before_request
-def _log_request():
+def _start_request():
+    g.request_start = time.perf_counter()
+    header = request.headers.get("X-Profile")
+    # la cabecera solo cuenta con ADMIN_TOKEN definido y un X-Admin-Token correcto
+    wanted = _PROFILER.wanted(header if header and _admin_authorized() else None)
+    if wanted and request.method != 'OPTIONS':
+        if wanted[1] == "header" or not request.path.startswith("/admin/profiles"):
+            g.profile = _PROFILER.start(*wanted, _route_label(), request.method)
+
+
+@app.teardown_request
+def _finish_profile(exc):
+    profile = g.pop("profile", None)
+    if profile is not None:
+        _PROFILER.finish(profile)
+
+
+@app.after_request
+def _record_request(response):
+    log_start = time.perf_counter()
     try:
-        logging.info(
-            f"REQ {request.method} {request.path} from {request.remote_addr}; "
-            f"Origin={request.headers.get('Origin')} | ACR-Method={request.headers.get('Access-Control-Request-Method')} | "
-            f"ACR-Headers={request.headers.get('Access-Control-Request-Headers')}"
-        )
-        if request.is_json:
-            logging.info(f"Payload: {request.get_json(silent=True)}")
+        route = _route_label()
+        _METRICS.counter(
+            "http_requests_total", route=route, method=request.method, status=str(response.status_code)
+        ).inc()
+        start = g.get("request_start")
+        if start is not None:
+            _METRICS.histogram("http_request_seconds", route=route).observe(time.perf_counter() - start)
+        if request.method == 'POST':
+            _METRICS.histogram("http_request_bytes", _BYTES_BUCKETS, route=route).observe(
+                request.content_length or 0
+            )
+            _PAYLOAD_LOG.maybe_log(request.method, request.path, lambda: request.get_data(cache=True))
+            if response.status_code == 200 and route in _PREDICT_ROUTES and _STARTUP.mark("first_prediction", once=True):
+                logging.info("Primera predicción servida: %s", _STARTUP.report())
+        profile = g.get("profile")
+        if profile is not None:
+            profile.status = response.status_code
+            profile.stage("log", time.perf_counter() - log_start)
+            response.headers["X-Profile-Id"] = str(profile.id)
     except Exception:
         pass
+    return response
+
+
+_PREDICT_ROUTES = {'/predict/atributos', '/predict/atributos/batch', '/predict/relacion', '/suggest/classes'}
+
+
+@app.route('/startup', methods=['GET', 'OPTIONS'])
+def startup_report():
+    if request.method == 'OPTIONS':
+        return '', 204
+    _STARTUP.record("models", _MODELS.load_seconds)
+    report = _STARTUP.report()
+    report["domain_vocab"] = _VOCAB_SOURCE
+    return jsonify(report)
 
 @app.route('/health', methods=['GET', 'OPTIONS'])
 def health():
     if request.method == 'OPTIONS':
         return '', 204
-    return jsonify({"status": "ok"})
+    # liveness: responde aunque los modelos sigan cargándose
+    return jsonify({"status": "ok", "ready": _MODELS.ready, "version": _MODELS.version})
+
+@app.route('/ready', methods=['GET', 'OPTIONS'])
+def ready():
+    if request.method == 'OPTIONS':
+        return '', 204
+    status = _MODELS.status()
+    return jsonify(status), (200 if status["ready"] else 503)
 
 # Cargar modelos
-with open('modelo_tablas.pkl', 'rb') as f:
-    modelo_atributos = pickle.load(f)
-with open('modelo_tablas_relacion.pkl', 'rb') as f:
-    modelo_relacion = pickle.load(f)
+# MODEL_LOAD: "background" (por defecto, /health responde durante la carga),
+# "lazy" (en la primera predicción) o "eager" (al importar; útil con gunicorn --preload
+# para que los workers hereden las páginas ya mapeadas)
+_MODEL_LOAD = os.environ.get("MODEL_LOAD", "background").lower()
+_MODELS = ModelRegistry(os.environ.get("MODEL_DIR", "."))
+if _MODEL_LOAD == "eager":
+    _MODELS.load()
+elif _MODEL_LOAD != "lazy":
+    _MODELS.load_in_background()
+
+
+@app.errorhandler(ModelNotReady)
+def _model_not_ready(e):
+    resp = jsonify({"error": "Modelos no disponibles todavía", "detail": str(e)})
+    resp.headers['Retry-After'] = '5'
+    return resp, 503
+
+
+# Pool acotado para predict(): PREDICT_WORKERS hilos y PREDICT_QUEUE_DEPTH en espera
+_INFERENCE = InferenceExecutor(
+    max_workers=int(os.environ.get("PREDICT_WORKERS", str(os.cpu_count() or 2))),
+    max_queue=int(os.environ.get("PREDICT_QUEUE_DEPTH", "32")),
+)
+
+
+# Micro-batching: junta predicciones concurrentes durante PREDICT_BATCH_WINDOW_MS
+# (o hasta PREDICT_BATCH_MAX entradas) en un solo predict(); 0 ms lo desactiva
+_BATCH_WINDOW_MS = float(os.environ.get("PREDICT_BATCH_WINDOW_MS", "2"))
+_BATCHER = MicroBatcher(
+    _INFERENCE,
+    max_wait=_BATCH_WINDOW_MS / 1000.0,
+    max_batch=int(os.environ.get("PREDICT_BATCH_MAX", "64")),
+    max_pending=int(os.environ.get("PREDICT_BATCH_PENDING", "1024")),
+) if _BATCH_WINDOW_MS > 0 else None
+
+
+@app.errorhandler(Overloaded)
+def _overloaded(e):
+    resp = jsonify({"error": "Servicio saturado, reintente en unos segundos"})
+    resp.headers['Retry-After'] = os.environ.get("PREDICT_RETRY_AFTER", "1")
+    return resp, 503
+
+
+@app.before_request
+def _shed_load():
+    # rechaza predicciones antes de parsear el JSON si la cola ya está llena
+    if request.method == 'POST' and request.path.startswith(('/predict', '/suggest')) and _INFERENCE.saturated:
+        raise Overloaded("Cola de inferencia llena")
+
+
+@app.route('/inference/stats', methods=['GET', 'OPTIONS'])
+def inference_stats():
+    if request.method == 'OPTIONS':
+        return '', 204
+    return jsonify(_INFERENCE.stats())
+
+
+@app.route('/batcher/stats', methods=['GET', 'OPTIONS'])
+def batcher_stats():
+    if request.method == 'OPTIONS':
+        return '', 204
+    return jsonify(_BATCHER.stats() if _BATCHER else {"enabled": False})
+
+
+
+def _admin_authorized() -> bool:
+    token = os.environ.get("ADMIN_TOKEN")
+    return bool(token) and request.headers.get("X-Admin-Token") == token
+
+
+def _require_admin():
+    # sin ADMIN_TOKEN las rutas de administración quedan desactivadas
+    if not os.environ.get("ADMIN_TOKEN"):
+        return jsonify({"error": "Rutas de administración desactivadas (define ADMIN_TOKEN)"}), 403
+    if not _admin_authorized():
+        return jsonify({"error": "No autorizado"}), 401
+    return None
+
+
+@app.route('/admin/models/reload', methods=['POST', 'OPTIONS'])
+def reload_models():
+    if request.method == 'OPTIONS':
+        return '', 204
+    denied = _require_admin()
+    if denied:
+        return denied
+    data = request.get_json(silent=True) or {}
+    try:
+        # la versión nueva se carga completa antes de reemplazar a la actual
+        _MODELS.load(data.get("version"))
+    except Exception as e:
+        return jsonify({**_MODELS.status(), "error": str(e)}), 400
+    return jsonify(_MODELS.status())
+
+@app.route('/admin/profiles', methods=['GET', 'POST', 'DELETE', 'OPTIONS'])
+def admin_profiles():
+    """GET: fases agregadas, top de funciones y perfiles guardados (?route= filtra).
+    POST: cambia el muestreo en caliente, ``{"rate": 0.01, "mode": "sample"}``.
+    DELETE: descarta los perfiles guardados."""
+    if request.method == 'OPTIONS':
+        return '', 204
+    denied = _require_admin()
+    if denied:
+        return denied
+    if request.method == 'DELETE':
+        _PROFILER.clear()
+    elif request.method == 'POST':
+        data = request.get_json(silent=True) or {}
+        try:
+            if "rate" in data:
+                _PROFILER.rate = max(0.0, min(1.0, float(data["rate"])))
+        except (TypeError, ValueError):
+            return jsonify({"error": "'rate' debe ser un número entre 0 y 1"}), 400
+        if "mode" in data:
+            if data["mode"] not in PROFILE_MODES:
+                return jsonify({"error": f"'mode' debe ser uno de {list(PROFILE_MODES)}"}), 400
+            _PROFILER.mode = data["mode"]
+    return jsonify(_PROFILER.summary(request.args.get("route")))
+
+
+@app.route('/admin/profiles/collapsed', methods=['GET', 'OPTIONS'])
+def admin_profiles_collapsed():
+    """Pilas colapsadas de todos los perfiles guardados, para flamegraph.pl o speedscope."""
+    if request.method == 'OPTIONS':
+        return '', 204
+    denied = _require_admin()
+    if denied:
+        return denied
+    return _PROFILER.collapsed(request.args.get("route")), 200, {'Content-Type': 'text/plain; charset=utf-8'}
+
+
+@app.route('/admin/profiles/<int:profile_id>', methods=['GET', 'OPTIONS'])
+def admin_profile(profile_id):
+    """Un perfil (id de la cabecera X-Profile-Id); ``?format=collapsed`` devuelve sus pilas."""
+    if request.method == 'OPTIONS':
+        return '', 204
+    denied = _require_admin()
+    if denied:
+        return denied
+    profile = _PROFILER.get(profile_id)
+    if profile is None:
+        return jsonify({"error": f"Perfil {profile_id} no encontrado"}), 404
+    if request.args.get("format") == "collapsed":
+        return profile.collapsed(), 200, {'Content-Type': 'text/plain; charset=utf-8'}
+    return jsonify(profile.to_dict())
+
+# Cache LRU delante de los modelos (PREDICT_CACHE_SIZE=0 la desactiva)
+_PREDICTION_CACHE = PredictionCache(
+    maxsize=int(os.environ.get("PREDICT_CACHE_SIZE", "4096")),
+    ttl=float(os.environ.get("PREDICT_CACHE_TTL", "0")),
+)
+
+
+# (versión, tipo) -> si la forma canónica sirve como clave de cache para ese modelo
+_CANONICAL_KEYS: Dict[tuple, bool] = {}
+
+
+def _canonical_keys(version: str, kind: str, modelo) -> bool:
+    canonica = _CANONICAL_KEYS.get((version, kind))
+    if canonica is None:
+        canonica = _CANONICAL_KEYS[(version, kind)] = orden_indiferente(modelo)
+    return canonica
+
+
+def _predict(kind: str, entradas: List[Entrada]) -> List[str]:
+    """Predice con cache: solo las entradas no vistas llegan al modelo, en una sola llamada.
+
+    El modelo recibe ``entrada.texto``; la clave es la forma canónica si el
+    vectorizador no depende del orden ni de mayúsculas, si no el propio texto."""
+    version, modelos = _MODELS.snapshot(lazy=_MODEL_LOAD == "lazy")
+    modelo = modelos[kind]
+    canonica = _canonical_keys(version, kind, modelo)
+    resultados: List = [None] * len(entradas)
+    pendientes: Dict[str, List[int]] = {}
+    textos: Dict[str, str] = {}
+    for i, entrada in enumerate(entradas):
+        clave = entrada.canonica if canonica else entrada.texto
+        pred = _PREDICTION_CACHE.get((version, kind, clave))
+        if pred is None:
+            pendientes.setdefault(clave, []).append(i)
+            textos.setdefault(clave, entrada.texto)
+        else:
+            resultados[i] = pred
+    if pendientes:
+        claves = list(pendientes.keys())
+        nuevas = [textos[c] for c in claves]
+        if _BATCHER and len(nuevas) < _BATCHER.max_batch:
+            # peticiones pequeñas: se combinan con las de otros clientes concurrentes
+            futures = _BATCHER.submit((version, kind), modelo, nuevas)
+            preds = [f.result(timeout=_INFERENCE.timeout) for f in futures]
+        else:
+            preds = _INFERENCE.run(modelo.predict, nuevas)
+        for clave, pred in zip(claves, preds):
+            pred = str(pred)
+            _PREDICTION_CACHE.set((version, kind, clave), pred)
+            for i in pendientes[clave]:
+                resultados[i] = pred
+    return resultados
+
+
+# Índice de vecinos para el modo top-k: NN_INDEX (artefacto de ``nn_index.py build``)
+# o, si no existe, se construye en segundo plano desde NN_INDEX_DATA
+_NN_INDEX_PATH = os.environ.get("NN_INDEX", os.path.join(os.environ.get("MODEL_DIR", "."), "nn_index.npz"))
+_NN_INDEX_DATA = os.environ.get("NN_INDEX_DATA", os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                                "tables_train.json"))
+_NN_TOP_K_MAX = int(os.environ.get("NN_TOP_K_MAX", "20"))
+_NN: Dict[str, object] = {"index": None, "error": None}
+
+
+def _load_neighbour_index():
+    try:
+        start = time.perf_counter()
+        from nn_index import NeighbourIndex
+
+        if os.path.exists(_NN_INDEX_PATH):
+            index = NeighbourIndex.load(_NN_INDEX_PATH)
+        else:
+            from train import iter_examples
+            index = NeighbourIndex.build(iter_examples(Path(_NN_INDEX_DATA)))
+        _NN["index"] = index
+        _STARTUP.record("nn_index", time.perf_counter() - start)
+        logging.info("Índice de vecinos listo en %.2fs: %s", time.perf_counter() - start, index.stats())
+    except Exception as e:  # el resto del servicio sigue funcionando sin top-k
+        _NN["error"] = str(e)
+        logging.exception("No se pudo cargar el índice de vecinos")
+
+
+threading.Thread(target=_load_neighbour_index, name="nn-index", daemon=True).start()
+
+
+def _top_k(data: Dict):
+    """``top_k`` del cuerpo acotado a [1, NN_TOP_K_MAX], o None si no se pidió."""
+    if data.get("top_k") is None:
+        return None
+    try:
+        return max(1, min(_NN_TOP_K_MAX, int(data["top_k"])))
+    except (TypeError, ValueError):
+        return None
+
+
+def _neighbours(kind: str, entrada: str, k: int):
+    index = _NN["index"]
+    if index is None:
+        raise ModelNotReady(_NN["error"] or "Índice de vecinos cargando")
+    return index.query(kind, entrada, k)
+
+
+@app.route('/cache/stats', methods=['GET', 'OPTIONS'])
+def cache_stats():
+    if request.method == 'OPTIONS':
+        return '', 204
+    return jsonify(_PREDICTION_CACHE.stats())
+
+
+_METRICS.add_collector("predict_cache", _PREDICTION_CACHE.stats)
+_METRICS.add_collector("inference", _INFERENCE.stats)
+_METRICS.add_collector("models", lambda: {"ready": int(_MODELS.ready), "load_seconds": _MODELS.load_seconds or 0})
+_METRICS.add_collector("payload_log", lambda: {"dropped": _PAYLOAD_LOG.dropped})
+_METRICS.add_collector("profiler", lambda: {"rate": _PROFILER.rate, "profiled_total": _PROFILER.total})
+_METRICS.add_collector("nn_index", lambda: {
+    f"{kind}_{key}": value
+    for kind, st in (_NN["index"].stats() if _NN["index"] else {}).items() for key, value in st.items()
+})
+if _BATCHER:
+    _METRICS.register_histogram("batcher_batch_size", _BATCHER.batch_sizes)
+    _METRICS.register_histogram("batcher_queue_wait_seconds", _BATCHER.queue_wait)
+    _METRICS.register_histogram("batcher_predict_seconds", _BATCHER.predict_latency)
+
+
+@app.route('/metrics', methods=['GET', 'OPTIONS'])
+def metrics():
+    if request.method == 'OPTIONS':
+        return '', 204
+    if request.args.get("format") == "json":
+        return jsonify(_METRICS.snapshot())
+    return _METRICS.render_prometheus(), 200, {'Content-Type': 'text/plain; version=0.0.4'}
 
 @app.route('/predict/atributos', methods=['POST', 'OPTIONS'])
 def predict_atributos():
@@ -56,21 +458,168 @@ def predict_atributos():
         "tabla": "cliente",
         "tablas_existentes": [
             {"nombre": "producto", "atributos": ["id", "nombre", "precio"]}
+        ],
+        "top_k": 5   (opcional)
+    }
+    Devuelve {"atributos": [...], "tier": "exact" | "model"}. Con "top_k" añade
+    "candidatos": [{"atributos": [...], "score": 0.83}, ...] ordenados por
+    similitud con los ejemplos de entrenamiento.
+    """
+    with _stage("parse"):
+        data = request.json or {}
+    k = _top_k(data)
+    with _stage("features"):
+        tabla = data.get("tabla", "")
+        tablas = data.get("tablas_existentes", [])
+        # los vecinos siempre la necesitan; si no, solo se construye si el nombre no se conoce
+        entrada = consulta_atributos(tabla, tablas) if k else None
+    with _stage("predict"):
+        atributos, tier = _tiered_atributos([(tabla, tablas, entrada)])[0]
+        vecinos = _neighbours("atributos", entrada.canonica, k) if k else None
+    with _stage("serialize"):
+        # Devuelve como lista de atributos y el nivel que respondió ("exact" o "model")
+        resp = {"atributos": atributos, "tier": tier}
+        if vecinos is not None:
+            resp["candidatos"] = [{"atributos": salida.split(), "score": round(score, 4)}
+                                  for salida, score in vecinos]
+        return jsonify(resp)
+
+@app.route('/predict/atributos/batch', methods=['POST', 'OPTIONS'])
+def predict_atributos_batch():
+    if request.method == 'OPTIONS':
+        return '', 204
+    """
+    Espera JSON:
+    {
+        "items": [
+            {"id": "c1", "tabla": "cliente"},
+            {"id": "c2", "tabla": "producto", "tablas_existentes": [...]}
+        ],
+        "tablas_existentes": [
+            {"nombre": "cliente", "atributos": []},
+            {"nombre": "producto", "atributos": ["id", "nombre", "precio"]}
         ]
     }
+    Si un item no trae "tablas_existentes" se usa el diagrama compartido
+    sin la propia tabla, así el cliente envía el diagrama una sola vez.
+    Devuelve {"resultados": {"c1": {"atributos": [...], "tier": "exact"}, ...}}
     """
-    data = request.json or {}
-    tabla = data.get("tabla", "")
-    existentes = " ".join(
-        t["nombre"] + " " + " ".join(t["atributos"])
-        for t in data.get("tablas_existentes", [])
+    with _stage("parse"):
+        data = request.json or {}
+    if not isinstance(data, dict):
+        return jsonify({"error": "El cuerpo debe ser un objeto JSON"}), 400
+    items = data.get("items") or []
+    if not isinstance(items, list):
+        return jsonify({"error": "'items' debe ser una lista"}), 400
+    _METRICS.histogram("batch_items", SIZE_BUCKETS, route=_route_label()).observe(len(items))
+
+    with _stage("features"):
+        try:
+            ids, consultas = _batch_consultas(data, items)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+    with _stage("predict"):
+        # Consulta exacta y, para el resto, una sola llamada vectorizada al modelo
+        preds = _tiered_atributos(consultas)
+    with _stage("serialize"):
+        resultados = {i: {"atributos": attrs, "tier": tier} for i, (attrs, tier) in zip(ids, preds)}
+        return jsonify({"resultados": resultados})
+
+
+def _validar_tablas(tablas, donde: str) -> None:
+    """ValueError si ``tablas`` no es una lista de {"nombre": str, "atributos": [...]}."""
+    if not isinstance(tablas, list):
+        raise ValueError(f"{donde} debe ser una lista de objetos")
+    for i, t in enumerate(tablas):
+        if not isinstance(t, dict):
+            raise ValueError(f"{donde}: la tabla {i} debe ser un objeto")
+        if not isinstance(t.get("nombre"), str):
+            raise ValueError(f"{donde}: la tabla {i} necesita 'nombre' (texto)")
+        if not isinstance(t.get("atributos"), list):
+            raise ValueError(f"{donde}: la tabla {i} necesita 'atributos' (lista)")
+
+
+def _batch_consultas(data: Dict, items: List) -> tuple:
+    """ids y (tabla, tablas_existentes, None) de cada item de un batch; la Entrada
+    la construye ``_tiered_atributos`` solo para los que llegan al modelo.
+
+    Lanza ValueError si un item o una tabla no tiene la forma esperada o si
+    dos items comparten id.
+    """
+    diagrama = data.get("tablas_existentes") or []
+    _validar_tablas(diagrama, "'tablas_existentes'")
+    ids: List[str] = []
+    vistos = set()
+    # nombres normalizados una vez: excluir la propia tabla no repite la normalización por item
+    normalizados = [_normalize_name(t["nombre"]) for t in diagrama]
+    consultas: List[tuple] = []
+    for idx, item in enumerate(items):
+        item = item or {}
+        if not isinstance(item, dict):
+            raise ValueError(f"El item {idx} debe ser un objeto")
+        tabla = item.get("tabla", "")
+        if "tablas_existentes" in item:
+            tablas = item.get("tablas_existentes") or []
+            _validar_tablas(tablas, f"'tablas_existentes' del item {idx}")
+        else:
+            propia = _normalize_name(str(tabla))
+            tablas = [t for t, n in zip(diagrama, normalizados) if n != propia]
+        item_id = str(item.get("id", idx))
+        if item_id in vistos:
+            raise ValueError(f"id duplicado en el batch: {item_id!r}")
+        vistos.add(item_id)
+        ids.append(item_id)
+        consultas.append((tabla, tablas, None))
+    return ids, consultas
+
+
+# Streaming SSE: cada STREAM_CHUNK clases se predicen juntas y se emiten en cuanto
+# están; como mucho STREAM_BUFFER eventos esperan a un cliente lento
+_STREAM_CHUNK = max(1, int(os.environ.get("STREAM_CHUNK", "8")))
+_STREAM_BUFFER = int(os.environ.get("STREAM_BUFFER", "32"))
+
+
+def _sse_response(produce) -> Response:
+    return Response(
+        stream_events(produce, max_buffer=_STREAM_BUFFER),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
-    entrada = tabla + " " + existentes
-    logging.info(f"Predict A: entrada='{entrada[:200]}'")
-    pred = modelo_atributos.predict([entrada])[0]
-    # Devuelve como lista de atributos
-    atributos = pred.split()
-    return jsonify({"atributos": atributos})
+
+
+@app.route('/predict/atributos/batch/stream', methods=['POST', 'OPTIONS'])
+def predict_atributos_batch_stream():
+    if request.method == 'OPTIONS':
+        return '', 204
+    """
+    Mismo cuerpo que /predict/atributos/batch. Responde text/event-stream con un
+    evento por item en cuanto se calcula:
+        event: atributos
+        data: {"id": "c1", "atributos": [...], "tier": "exact"}
+    y un evento final "done" con el total.
+    """
+    data = request.json or {}
+    if not isinstance(data, dict):
+        return jsonify({"error": "El cuerpo debe ser un objeto JSON"}), 400
+    items = data.get("items") or []
+    if not isinstance(items, list):
+        return jsonify({"error": "'items' debe ser una lista"}), 400
+    _METRICS.histogram("batch_items", SIZE_BUCKETS, route=_route_label()).observe(len(items))
+    try:
+        ids, consultas = _batch_consultas(data, items)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    def produce(emit, cancelled):
+        for start in range(0, len(consultas), _STREAM_CHUNK):
+            if cancelled.is_set():
+                return
+            preds = _tiered_atributos(consultas[start:start + _STREAM_CHUNK])
+            for i, (attrs, tier) in zip(ids[start:], preds):
+                emit("atributos", {"id": i, "atributos": attrs, "tier": tier})
+        emit("done", {"total": len(consultas)})
+
+    return _sse_response(produce)
 
 @app.route('/predict/relacion', methods=['POST', 'OPTIONS'])
 def predict_relacion():
@@ -82,24 +631,248 @@ def predict_relacion():
         "tablas_existentes": [
             {"nombre": "cliente", "atributos": ["id", "nombre"]},
             {"nombre": "producto", "atributos": ["id", "nombre", "precio"]}
-        ]
+        ],
+        "top_k": 5   (opcional)
+    }
+    Con "top_k" añade "candidatos": [{"tabla_sugerida": ..., "atributos": [...], "score": ...}]
+    """
+    with _stage("parse"):
+        data = request.json or {}
+    with _stage("features"):
+        tablas = data.get("tablas_existentes", [])
+        entrada = consulta_relacion(tablas)
+    k = _top_k(data)
+    with _stage("predict"):
+        tabla_sugerida, atributos, tier = _tiered_relacion(tablas, entrada)
+        vecinos = _neighbours("relacion", entrada.canonica, k) if k else None
+    with _stage("serialize"):
+        resp = {"tabla_sugerida": tabla_sugerida, "atributos": atributos, "tier": tier}
+        if vecinos is not None:
+            resp["candidatos"] = []
+            for salida, score in vecinos:
+                partes = salida.split()
+                resp["candidatos"].append({"tabla_sugerida": partes[0] if partes else "",
+                                           "atributos": partes[1:], "score": round(score, 4)})
+        return jsonify(resp)
+
+@app.route('/predict/relaciones', methods=['POST', 'OPTIONS'])
+def predict_relaciones():
+    if request.method == 'OPTIONS':
+        return '', 204
+    """
+    Espera JSON:
+    {
+        "tablas_existentes": [
+            {"nombre": "orden", "atributos": ["id", "fecha", "cliente_id"]},
+            {"nombre": "producto", "atributos": ["id", "nombre", "precio"]}
+        ],
+        "top_n": 10   (opcional)
     }
+    Puntúa todas las parejas de tablas a la vez y devuelve las tablas intermedias
+    que faltan: {"relaciones": [{"tablas": ["orden", "producto"],
+    "tabla_sugerida": "pedido_item", "atributos": [...], "score": 1.2, "tier": "exact"}]}
+    """
+    with _stage("parse"):
+        data = request.json or {}
+    tablas = [t for t in (data.get("tablas_existentes") or []) if isinstance(t, dict)]
+    try:
+        top_n = max(1, min(_RELACIONES_TOP_N_MAX, int(data.get("top_n", 10) or 10)))
+    except (TypeError, ValueError):
+        return jsonify({"error": "'top_n' debe ser un entero"}), 400
+    _METRICS.histogram("diagram_tables", SIZE_BUCKETS, route=_route_label()).observe(len(tablas))
+    from relations import discover_relations
+
+    with _stage("predict"):
+        lang = _LOOKUP.language(t.get("nombre", "") for t in tablas)
+        relaciones = discover_relations(
+            tablas, _normalize_name, _LOOKUP.relaciones_conocidas(), top_n,
+            date_attr="date" if lang == "en" else "fecha",
+        )
+    with _stage("serialize"):
+        return jsonify({"relaciones": relaciones})
+
+
+_RELACIONES_TOP_N_MAX = int(os.environ.get("RELACIONES_TOP_N_MAX", "100"))
+
+# ---- Sesiones: sugerencias incrementales por proyecto ----
+_SESSIONS = SessionStore(
+    idle_seconds=float(os.environ.get("SESSION_IDLE_SECONDS", "1800")),
+    max_sessions=int(os.environ.get("SESSION_MAX", "1000")),
+)
+_METRICS.add_collector("sessions", _SESSIONS.stats)
+
+
+@app.errorhandler(SessionError)
+def _session_error(e):
+    return jsonify({"error": str(e)}), 400
+
+
+def _get_session(project_id: str):
+    session = _SESSIONS.get(project_id)
+    if session is None:
+        return None, (jsonify({"error": f"No hay sesión para el proyecto '{project_id}'"}), 404)
+    return session, None
+
+
+@app.route('/session/<project_id>', methods=['GET', 'PUT', 'DELETE', 'OPTIONS'])
+def session_resource(project_id):
+    if request.method == 'OPTIONS':
+        return '', 204
+    """
+    PUT crea (o reemplaza) la sesión con el diagrama completo:
+    {"tablas_existentes": [{"nombre": "cliente", "atributos": ["id", "nombre"]}]}
     """
+    if request.method == 'PUT':
+        data = request.json or {}
+        session = _SESSIONS.create(project_id, data.get("tablas_existentes") or [])
+        return jsonify(session.describe()), 201
+    if request.method == 'DELETE':
+        if not _SESSIONS.delete(project_id):
+            return jsonify({"error": f"No hay sesión para el proyecto '{project_id}'"}), 404
+        return '', 204
+    session, error = _get_session(project_id)
+    if error:
+        return error
+    return jsonify(session.describe())
+
+
+@app.route('/session/<project_id>/delta', methods=['POST', 'OPTIONS'])
+def session_delta(project_id):
+    if request.method == 'OPTIONS':
+        return '', 204
+    """
+    Espera JSON:
+    {"ops": [
+        {"op": "add_table", "nombre": "pago", "atributos": ["id", "monto"]},
+        {"op": "remove_table", "nombre": "carrito"},
+        {"op": "rename_table", "nombre": "orden", "nuevo": "pedido"},
+        {"op": "add_attribute", "tabla": "pago", "atributo": "fecha"},
+        {"op": "remove_attribute", "tabla": "pago", "atributo": "monto"},
+        {"op": "rename_attribute", "tabla": "pago", "atributo": "fecha", "nuevo": "fecha_pago"}
+    ]}
+    Las operaciones se aplican en orden; si una falla, las anteriores quedan aplicadas.
+    """
+    session, error = _get_session(project_id)
+    if error:
+        return error
     data = request.json or {}
-    existentes = " ".join(
-        t["nombre"] + " " + " ".join(t["atributos"])
-        for t in data.get("tablas_existentes", [])
-    )
-    logging.info(f"Predict B: existentes='{existentes[:200]}'")
-    pred = modelo_relacion.predict([existentes])[0]
-    partes = pred.split()
-    tabla_sugerida = partes[0]
-    atributos = partes[1:]
-    return jsonify({"tabla_sugerida": tabla_sugerida, "atributos": atributos})
+    ops = (data.get("ops") if isinstance(data, dict) else data) or []
+    if not isinstance(data, dict) or not isinstance(ops, list) or not all(isinstance(op, dict) for op in ops):
+        return jsonify({"error": "'ops' debe ser una lista de objetos"}), 400
+    with session.lock:
+        for i, op in enumerate(ops):
+            try:
+                session.apply(op)
+            except (SessionError, KeyError, TypeError, AttributeError) as e:
+                return jsonify({"error": f"Operación {i}: {e}", "aplicadas": i, **session.describe()}), 400
+    return jsonify(session.describe())
+
+
+def _session_predict(kind: str, session, tablas: List[str] = None) -> List[tuple]:
+    """(predicción, tier) por tabla pedida (una sola para "relacion").
+
+    Mismo orden que las rutas sin sesión: consulta exacta, cache y, solo para
+    lo que falte, las filas incrementales de la sesión."""
+    version, modelos = _MODELS.snapshot(lazy=_MODEL_LOAD == "lazy")
+    modelo = modelos[kind]
+    # clave de la sesión (id + contador de ediciones): construir el texto del diagrama
+    # en cada petición costaría O(tablas), justo lo que la sesión evita
+    usar_cache = _PREDICTION_CACHE.enabled
+    nombres = [canonical_name(t) for t in tablas] if kind == "atributos" else [None]
+    resultados: List = [None] * len(nombres)
+    pendientes: List[int] = []
+    claves: Dict[int, tuple] = {}
+    with session.lock:
+        for i, nombre in enumerate(nombres):
+            if _EXACT_LOOKUP_ENABLED:
+                if kind == "atributos":
+                    atributos = _LOOKUP.atributos(nombre, (t for t in session.tables if t != nombre))
+                    encontrada = None if atributos is None else " ".join(atributos)
+                else:
+                    encontrada = _LOOKUP.relacion(session.tables)
+                    encontrada = None if encontrada is None else " ".join([encontrada[0]] + list(encontrada[1]))
+                if encontrada is not None:
+                    resultados[i] = (encontrada, "exact")
+                    continue
+            if usar_cache:
+                claves[i] = session.cache_key(nombre)
+                pred = _PREDICTION_CACHE.get((version, kind, claves[i]))
+                if pred is not None:
+                    resultados[i] = (pred, "model")
+                    continue
+            pendientes.append(i)
+        if pendientes:
+            if kind == "atributos":
+                X, entradas = session.features_atributos((version, kind), modelo, [nombres[i] for i in pendientes])
+            else:
+                X, entradas = session.features_relacion((version, kind), modelo)
+    exactas = sum(1 for r in resultados if r is not None and r[1] == "exact")
+    _count_tier(kind, "exact", exactas)
+    _count_tier(kind, "model", len(nombres) - exactas)
+    if not pendientes:
+        return resultados
+    if X is None:
+        # modelo no descomponible: el texto canónico de la sesión va por ``_predict``
+        preds = _predict(kind, [Entrada(e, e) for e in entradas])
+    else:
+        preds = [str(p) for p in _INFERENCE.run(modelo.steps[-1][1].predict, X)]
+    for i, pred in zip(pendientes, preds):
+        if i in claves:
+            _PREDICTION_CACHE.set((version, kind, claves[i]), pred)
+    for i, pred in zip(pendientes, preds):
+        resultados[i] = (pred, "model")
+    return resultados
+
+
+@app.route('/session/<project_id>/predict/atributos', methods=['POST', 'OPTIONS'])
+def session_predict_atributos(project_id):
+    if request.method == 'OPTIONS':
+        return '', 204
+    """
+    Espera JSON: {"tabla": "cliente"} o {"tablas": ["cliente", "producto"]}
+    Las tablas existentes son las de la sesión (sin la propia tabla).
+    """
+    session, error = _get_session(project_id)
+    if error:
+        return error
+    with _stage("parse"):
+        data = request.json or {}
+    if "tablas" in data:
+        tablas = [str(t) for t in data.get("tablas") or []]
+    else:
+        tablas = [str(data.get("tabla", ""))]
+    with _stage("predict"):
+        preds = _session_predict("atributos", session, tablas)
+    with _stage("serialize"):
+        if "tablas" in data:
+            return jsonify({"resultados": {t: {"atributos": p.split(), "tier": tier}
+                                           for t, (p, tier) in zip(tablas, preds)}})
+        return jsonify({"atributos": preds[0][0].split(), "tier": preds[0][1]})
+
+
+@app.route('/session/<project_id>/predict/relacion', methods=['POST', 'OPTIONS'])
+def session_predict_relacion(project_id):
+    if request.method == 'OPTIONS':
+        return '', 204
+    session, error = _get_session(project_id)
+    if error:
+        return error
+    with _stage("predict"):
+        pred, tier = _session_predict("relacion", session)[0]
+    with _stage("serialize"):
+        partes = pred.split()
+        return jsonify({"tabla_sugerida": partes[0] if partes else "", "atributos": partes[1:], "tier": tier})
 
 # ---- Sugerir clases (entidades) usando vocabulario de dominios + modelo de atributos ----
-def _normalize_name(n: str) -> str:
-    return re.sub(r"\s+", "", n.strip().lower())
+_normalize_name = normalize_name
+
+
+# Vocabulario de dominios y consulta exacta: del artefacto precompilado (DOMAIN_VOCAB,
+# ``domain_vocab.py build``) en una sola lectura o, si no está o quedó obsoleto,
+# importando el generador como antes. Se descarta si no se construyó con LOOKUP_DATA.
+_DOMAIN_VOCAB_PATH = os.environ.get("DOMAIN_VOCAB", os.path.join(os.environ.get("MODEL_DIR", "."),
+                                                                  "domain_vocab.json"))
+_LOOKUP_DATA = os.environ.get("LOOKUP_DATA", _NN_INDEX_DATA)
 
 
 def _collect_domain_entities() -> Dict[str, List[str]]:
@@ -107,40 +880,170 @@ def _collect_domain_entities() -> Dict[str, List[str]]:
         from generate_training_examples import DOMAINS  # type: ignore
     except Exception:
         return {}
-    mapping: Dict[str, List[str]] = {}
-    for d in DOMAINS:
-        names = set()
-        for lang_key in ("ES", "EN", "es", "en"):
-            entities = (d.get("entities", {}) or {}).get(lang_key, {}) or {}
-            for k in entities.keys():
-                names.add(_normalize_name(k))
-        mapping[d.get("key", "misc")] = sorted(list(names))
-    return mapping
+    return collect_domain_entities(DOMAINS, _normalize_name)
+
+
+with _STARTUP.phase("domain_vocab"):
+    _VOCAB = DomainVocab.load(_DOMAIN_VOCAB_PATH, _normalize_name, Path(_LOOKUP_DATA))
+    if _VOCAB is not None:
+        _DOMAIN_ENTITIES = _VOCAB.domain_entities
+        _VOCAB_SOURCE = {"path": _DOMAIN_VOCAB_PATH, "built_at": _VOCAB.built_at, "model": _VOCAB.model}
+    else:
+        _DOMAIN_ENTITIES = _collect_domain_entities()
+        _VOCAB_SOURCE = None
+# índice invertido entidad -> dominios + autómata para el título, construido una vez
+with _STARTUP.phase("domain_index"):
+    _DOMAIN_INDEX = DomainIndex(_DOMAIN_ENTITIES)
+
+
+# Consulta exacta por nombre normalizado antes de los modelos (PREDICT_EXACT_LOOKUP=0 la
+# desactiva). Se construye con DOMAINS al importar y se completa en segundo plano con las
+# salidas de LOOKUP_DATA (por defecto el mismo corpus que el índice de vecinos).
+_EXACT_LOOKUP_ENABLED = os.environ.get("PREDICT_EXACT_LOOKUP", "1") != "0"
+
+
+def _build_lookup(examples=()) -> ExactLookup:
+    try:
+        from generate_training_examples import DOMAINS, SUPPORT_TABLES  # type: ignore
+    except Exception:
+        DOMAINS, SUPPORT_TABLES = [], {}
+    return ExactLookup.build(_normalize_name, DOMAINS, SUPPORT_TABLES, examples)
+
+
+def _load_lookup_examples():
+    global _LOOKUP
+    try:
+        if os.path.exists(_LOOKUP_DATA):
+            from train import iter_examples
+            _LOOKUP = _build_lookup(iter_examples(Path(_LOOKUP_DATA)))
+            logging.info("Consulta exacta lista: %s", _LOOKUP.stats())
+    except Exception:
+        logging.exception("No se pudieron añadir los ejemplos a la consulta exacta")
+
+
+if _VOCAB is not None:
+    # el artefacto ya incluye las salidas del corpus
+    _LOOKUP = _VOCAB.lookup
+else:
+    with _STARTUP.phase("exact_lookup"):
+        _LOOKUP = _build_lookup()
+    if _EXACT_LOOKUP_ENABLED:
+        threading.Thread(target=_load_lookup_examples, name="exact-lookup", daemon=True).start()
+
+
+def _count_tier(kind: str, tier: str, n: int = 1) -> None:
+    if n:
+        _METRICS.counter("predict_tier_total", kind=kind, tier=tier).inc(n)
+
+
+def _tier_stats() -> Dict[str, float]:
+    out: Dict[str, float] = dict(_LOOKUP.stats())
+    for kind in ("atributos", "relacion"):
+        exact = _METRICS.counter("predict_tier_total", kind=kind, tier="exact").value
+        model = _METRICS.counter("predict_tier_total", kind=kind, tier="model").value
+        out[f"{kind}_hit_ratio"] = exact / (exact + model) if exact + model else 0.0
+    return out
+
+
+_METRICS.add_collector("exact_lookup", _tier_stats)
 
 
-_DOMAIN_ENTITIES = _collect_domain_entities()
+def _tiered_atributos(consultas: List[tuple]) -> List[tuple]:
+    """(tabla, tablas_existentes, Entrada o None) -> (atributos, tier). Los nombres
+    conocidos se responden desde la consulta exacta; el resto va al modelo en una
+    sola llamada. Las Entradas que falten se construyen solo para esos, en una
+    fase "features" anidada: con un diagrama grande es el grueso del trabajo."""
+    resultados: List = [None] * len(consultas)
+    pendientes: List[int] = []
+    entradas: List[Entrada] = []
+    for i, (tabla, tablas, entrada) in enumerate(consultas):
+        atributos = None
+        if _EXACT_LOOKUP_ENABLED:
+            atributos = _LOOKUP.atributos(tabla, (t.get("nombre", "") for t in tablas))
+        if atributos is not None:
+            resultados[i] = (list(atributos), "exact")
+        else:
+            pendientes.append(i)
+    _count_tier("atributos", "exact", len(consultas) - len(pendientes))
+    _count_tier("atributos", "model", len(pendientes))
+    if pendientes:
+        with _stage("features"):
+            for i in pendientes:
+                tabla, tablas, entrada = consultas[i]
+                entradas.append(entrada if entrada is not None else consulta_atributos(tabla, tablas))
+        for i, pred in zip(pendientes, _predict("atributos", entradas)):
+            resultados[i] = (pred.split(), "model")
+    return resultados
+
+
+def _tiered_relacion(tablas: List[Dict], entrada: Entrada) -> tuple:
+    """(tabla_sugerida, atributos, tier) para un diagrama."""
+    encontrada = _LOOKUP.relacion(t.get("nombre", "") for t in tablas) if _EXACT_LOOKUP_ENABLED else None
+    if encontrada is not None:
+        _count_tier("relacion", "exact")
+        return encontrada[0], list(encontrada[1]), "exact"
+    _count_tier("relacion", "model")
+    partes = _predict("relacion", [entrada])[0].split()
+    return partes[0], partes[1:], "model"
 
 
 @app.route('/suggest/classes', methods=['POST', 'OPTIONS'])
 def suggest_classes():
     if request.method == 'OPTIONS':
         return '', 204
+    with _stage("parse"):
+        data = request.json or {}
+    with _stage("features"):
+        nombres, tablas = _class_suggestions(data)
+        consultas = [(n, tablas, None) for n in nombres]
+
+    with _stage("predict"):
+        try:
+            # consulta exacta o, si el nombre no se conoce, el modelo en una sola llamada
+            preds = _tiered_atributos(consultas)
+        except Exception:
+            preds = [([], "model")] * len(nombres)
+        out = [{"name": n, "attributes": attrs, "tier": tier} for n, (attrs, tier) in zip(nombres, preds)]
+
+    with _stage("serialize"):
+        return jsonify(out)
+
+
+@app.route('/suggest/classes/stream', methods=['POST', 'OPTIONS'])
+def suggest_classes_stream():
+    if request.method == 'OPTIONS':
+        return '', 204
+    """
+    Mismo cuerpo que /suggest/classes. Emite un evento "class" por clase sugerida:
+        event: class
+        data: {"name": "Producto", "attributes": [...], "tier": "exact"}
+    y un evento final "done".
+    """
     data = request.json or {}
+    nombres, tablas = _class_suggestions(data)
+
+    def produce(emit, cancelled):
+        for start in range(0, len(nombres), _STREAM_CHUNK):
+            if cancelled.is_set():
+                return
+            chunk = nombres[start:start + _STREAM_CHUNK]
+            consultas = [(n, tablas, None) for n in chunk]
+            for n, (attrs, tier) in zip(chunk, _tiered_atributos(consultas)):
+                emit("class", {"name": n, "attributes": attrs, "tier": tier})
+        emit("done", {"total": len(nombres)})
+
+    return _sse_response(produce)
+
+
+def _class_suggestions(data: Dict) -> tuple:
+    """Clases sugeridas (nombre para mostrar) y el diagrama existente como tablas."""
     title = str(data.get('project_title', '') or '')
     existing = [str(x) for x in (data.get('existing_classes') or [])]
     max_items = int(data.get('max', 6) or 6)
-
     existing_norm = {_normalize_name(x) for x in existing}
 
     # score dominios por coincidencias con existentes y con palabras del título
-    scores = []
-    tnorm = _normalize_name(title)
-    for key, ents in _DOMAIN_ENTITIES.items():
-        score = 0
-        score += sum(1 for e in ents if e in existing_norm)
-        score += sum(1 for e in ents if e in tnorm)
-        scores.append((score, key))
-    scores.sort(reverse=True)
+    scores = _DOMAIN_INDEX.top_domains(existing_norm, _normalize_name(title), k=1)
     chosen_key = scores[0][1] if scores else None
 
     suggestions: List[str] = []
@@ -154,21 +1057,30 @@ def suggest_classes():
     def pretty(name_norm: str) -> str:
         return name_norm[:1].upper() + name_norm[1:]
 
-    out = []
-    for s in suggestions:
-        tabla_name = pretty(s)
-        try:
-            # usa el modelo entrenado para proponer atributos
-            existentes_payload = [{"nombre": n, "atributos": []} for n in existing]
-            existentes_str = " ".join(x["nombre"] for x in existentes_payload)
-            entrada = tabla_name + " " + existentes_str
-            pred = modelo_atributos.predict([entrada])[0]
-            attrs = [a for a in str(pred).split() if a]
-        except Exception:
-            attrs = []
-        out.append({"name": tabla_name, "attributes": attrs})
+    return [pretty(s) for s in suggestions], [{"nombre": n, "atributos": []} for n in existing]
+
+
+@app.route('/suggest/domains', methods=['POST', 'OPTIONS'])
+def suggest_domains():
+    if request.method == 'OPTIONS':
+        return '', 204
+    """
+    Espera JSON: {"project_title": "...", "existing_classes": ["Cliente"], "k": 3}
+    Devuelve los k dominios mejor puntuados: [{"key": "ecommerce", "score": 2}, ...]
+    """
+    data = request.json or {}
+    if not isinstance(data, dict):
+        return jsonify({"error": "El cuerpo debe ser un objeto JSON"}), 400
+    title = str(data.get('project_title', '') or '')
+    existing = [str(x) for x in (data.get('existing_classes') or [])]
+    try:
+        k = max(1, int(data.get('k', 3) or 3))
+    except (TypeError, ValueError):
+        return jsonify({"error": "'k' debe ser un entero"}), 400
+    ranked = _DOMAIN_INDEX.top_domains({_normalize_name(x) for x in existing}, _normalize_name(title), k=k)
+    return jsonify([{"key": key, "score": score} for score, key in ranked])
 
-    return jsonify(out)
+_STARTUP.mark("app_ready")
 
 if __name__ == '__main__':
     try:
@@ -0,0 +1,66 @@
+"""Punto de entrada ASGI del servicio Predict.
+
+    uvicorn asgi:application --host 0.0.0.0 --port 5000
+
+Las rutas de Flask se sirven a través de a2wsgi en un pool de hilos; la
+inferencia pasa además por el ejecutor acotado de ``app.py``, que rechaza
+con 503 + Retry-After cuando su cola está llena. ``/health`` y ``/ready`` se
+responden directamente en el event loop, así siguen respondiendo aunque
+todos los hilos estén ocupados con predicciones.
+"""
+import json
+import os
+
+from a2wsgi import WSGIMiddleware
+
+from app import app as flask_app, _CORS_HEADERS as _FLASK_CORS_HEADERS, _INFERENCE, _MODELS
+
+# hilos WSGI por encima de la capacidad del ejecutor: el rechazo lo decide
+# la cola de inferencia y no la falta de hilos para atender la petición
+_WSGI_THREADS = int(os.environ.get(
+    "ASGI_WSGI_THREADS", str(_INFERENCE.max_workers + _INFERENCE.max_queue + 4)
+))
+_wsgi_app = WSGIMiddleware(flask_app, workers=_WSGI_THREADS)
+
+# misma política que las respuestas de Flask (``add_cors``)
+_CORS_HEADERS = [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in _FLASK_CORS_HEADERS.items()]
+
+
+async def _send_json(send, status: int, payload) -> None:
+    body = json.dumps(payload).encode("utf-8")
+    headers = [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+    await send({"type": "http.response.start", "status": status, "headers": headers + _CORS_HEADERS})
+    await send({"type": "http.response.body", "body": body})
+
+
+async def _lifespan(receive, send) -> None:
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            _INFERENCE.shutdown()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def application(scope, receive, send):
+    if scope["type"] == "lifespan":
+        await _lifespan(receive, send)
+        return
+    if scope["type"] == "http" and scope.get("method") == "GET":
+        path = scope.get("path")
+        if path == "/health":
+            await _send_json(send, 200, {"status": "ok", "ready": _MODELS.ready, "version": _MODELS.version})
+            return
+        if path == "/ready":
+            status = _MODELS.status()
+            await _send_json(send, 200 if status["ready"] else 503, status)
+            return
+    await _wsgi_app(scope, receive, send)
+
+
+if __name__ == '__main__':
+    import uvicorn
+
+    uvicorn.run(application, host='0.0.0.0', port=int(os.environ.get("PORT", "5000")))
@@ -0,0 +1,52 @@
+"""Velocidad del generador de ejemplos sintéticos.
+
+Compara ``generate_example`` llamado N veces, ``generate_batch(N)`` y el
+camino del CLI (``_generate_chunk``: lote + línea canónica), en ejemplos
+por segundo y en un solo proceso.
+
+    python benchmarks/bench_generator.py --count 100000
+"""
+import argparse
+import random
+import time
+from typing import Callable, Dict
+
+import common  # noqa: F401  (añade Predict/ al sys.path)
+import generate_training_examples as gen
+
+
+def measure(fn: Callable[[int], object], count: int, repeat: int) -> Dict[str, float]:
+    fn(min(count, 1000))
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(count)
+        best = min(best, time.perf_counter() - t0)
+    return {"seconds": best, "per_second": count / best}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del generador de ejemplos")
+    parser.add_argument("--count", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    cases = {
+        "generate_example x N": lambda n: [gen.generate_example() for _ in range(n)],
+        "generate_batch(N)": lambda n: gen.generate_batch(n, args.seed),
+        "lines (_generate_chunk)": lambda n: gen._generate_chunk((args.seed, n)),
+    }
+    results = {name: measure(fn, args.count, args.repeat) for name, fn in cases.items()}
+    base = results["generate_example x N"]["per_second"]
+    header = f"{'scenario':<28} {'n':>8} {'best s':>9} {'examples/s':>12} {'speedup':>8}"
+    print(header)
+    print("-" * len(header))
+    for name, r in results.items():
+        print(f"{name:<28} {args.count:>8} {r['seconds']:>9.3f} {r['per_second']:>12.0f} "
+              f"{r['per_second'] / base:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
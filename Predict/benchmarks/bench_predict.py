@@ -0,0 +1,249 @@
+"""Benchmark y prueba de carga del servicio Predict.
+
+Genera diagramas realistas (vocabulario de DOMAINS) de 5, 50 y 500 tablas
+y mide latencia p50/p95/p99 y peticiones por segundo de cada ruta, con el
+test client de Flask o contra un servidor local con concurrencia.
+
+Con nombres del vocabulario casi todo lo responde la consulta exacta; los
+escenarios ``/unknown`` usan nombres fuera de él (``cliente_ext``) para medir
+el camino del modelo. La columna "exact %" es la mezcla de tiers de cada
+escenario; ``--no-exact`` desactiva la consulta exacta (PREDICT_EXACT_LOOKUP=0).
+
+    python benchmarks/bench_predict.py
+    python benchmarks/bench_predict.py --mode server --concurrency 8
+    python benchmarks/bench_predict.py --names unknown
+    python benchmarks/bench_predict.py --save-baseline benchmarks/baseline.json
+    python benchmarks/bench_predict.py --compare benchmarks/baseline.json --tolerance 0.25
+
+Si no hay modelos (``modelo_tablas*.pkl`` o ``models/CURRENT``) se entrena
+un modelo sustituto rápido con ``train.py`` sobre tables_train.json, para
+que el benchmark mida el mismo camino de código.
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+from common import (PREDICT_DIR, VOCABULARY, compare, make_diagram, print_table, save_json, summarize,
+                    unknown_name)
+
+Scenario = Tuple[str, str, Callable[[int], Dict]]
+
+
+def build_scenarios(sizes: List[int], routes: List[str], names: List[str]) -> List[Scenario]:
+    """(nombre, ruta, fábrica de payload por número de petición).
+
+    ``names``: "known" (vocabulario de DOMAINS) y/o "unknown" (nombres fuera de
+    él, con sufijo ``/unknown`` en el nombre del escenario)."""
+    scenarios: List[Scenario] = []
+    for variant in names:
+        unknown = variant == "unknown"
+        suffix = "/unknown" if unknown else ""
+        tables = [unknown_name(name) if unknown else name for name, _ in VOCABULARY]
+        for n in sizes:
+            diagram = make_diagram(n, seed=n, unknown=unknown)
+            class_names = [t["nombre"] for t in diagram]
+            if "atributos" in routes:
+                scenarios.append((
+                    f"atributos/{n}{suffix}", "/predict/atributos",
+                    lambda i, d=diagram, t=tables: {"tabla": t[i % len(t)], "tablas_existentes": d},
+                ))
+            if "batch" in routes:
+                scenarios.append((
+                    f"atributos_batch/{n}{suffix}", "/predict/atributos/batch",
+                    lambda i, d=diagram: {
+                        "items": [{"id": str(k), "tabla": t["nombre"]} for k, t in enumerate(d)],
+                        "tablas_existentes": d,
+                    },
+                ))
+            if "relacion" in routes:
+                scenarios.append((
+                    f"relacion/{n}{suffix}", "/predict/relacion",
+                    lambda i, d=diagram: {"tablas_existentes": d[i % len(d):] + d[:i % len(d)]},
+                ))
+            if "classes" in routes:
+                scenarios.append((
+                    f"suggest_classes/{n}{suffix}", "/suggest/classes",
+                    lambda i, c=class_names: {"project_title": f"proyecto {i}", "existing_classes": c},
+                ))
+    return scenarios
+
+
+def tier_counts(app_module) -> Dict[str, float]:
+    """Respuestas acumuladas por tier (consulta exacta / modelo) de todas las rutas."""
+    return {
+        tier: sum(app_module._METRICS.counter("predict_tier_total", kind=kind, tier=tier).value
+                  for kind in ("atributos", "relacion"))
+        for tier in ("exact", "model")
+    }
+
+
+def ensure_models(app_module, data_path: Path) -> str:
+    """Usa los modelos reales si existen; si no, instala un sustituto entrenado al vuelo."""
+    try:
+        app_module._MODELS.resolve()
+    except FileNotFoundError:
+        pass
+    else:
+        version, _ = app_module._MODELS.snapshot(lazy=True)
+        return version
+    from train import KINDS, fit_model
+
+    models = {kind: fit_model(data_path, kind, epochs=2)[0] for kind in KINDS}
+    app_module._MODELS.install(models, version="stand-in")
+    return "stand-in"
+
+
+def run_client(app, route: str, payload_for: Callable[[int], Dict], requests: int, max_seconds: float,
+               warmup: int) -> Dict[str, float]:
+    client = app.test_client()
+    for i in range(warmup):
+        client.post(route, json=payload_for(i))
+    latencies: List[float] = []
+    started = time.perf_counter()
+    for i in range(requests):
+        t0 = time.perf_counter()
+        resp = client.post(route, json=payload_for(warmup + i))
+        latencies.append(time.perf_counter() - t0)
+        if resp.status_code != 200:
+            raise RuntimeError(f"{route} -> {resp.status_code}: {resp.get_data(as_text=True)[:200]}")
+        if time.perf_counter() - started > max_seconds:
+            break
+    return summarize(latencies, time.perf_counter() - started)
+
+
+def _post(url: str, body: bytes) -> float:
+    req = urllib.request.Request(url, data=body, headers={"Content-Type": "application/json"}, method="POST")
+    t0 = time.perf_counter()
+    try:
+        with urllib.request.urlopen(req, timeout=120) as resp:
+            resp.read()
+    except urllib.error.HTTPError as e:
+        raise RuntimeError(f"{url} -> {e.code}") from e
+    return time.perf_counter() - t0
+
+
+def run_server(base_url: str, route: str, payload_for: Callable[[int], Dict], requests: int,
+               max_seconds: float, warmup: int, concurrency: int) -> Dict[str, float]:
+    url = base_url + route
+    bodies = [json.dumps(payload_for(i)).encode("utf-8") for i in range(warmup + requests)]
+    for body in bodies[:warmup]:
+        _post(url, body)
+    deadline = time.perf_counter() + max_seconds
+    latencies: List[float] = []
+    lock = threading.Lock()
+
+    def worker(body: bytes) -> None:
+        if time.perf_counter() > deadline:
+            return
+        lat = _post(url, body)
+        with lock:
+            latencies.append(lat)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(worker, bodies[warmup:]))
+    return summarize(latencies, time.perf_counter() - started)
+
+
+def start_server(app) -> Tuple[str, Callable[[], None]]:
+    from werkzeug.serving import make_server
+
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return f"http://127.0.0.1:{server.server_port}", server.shutdown
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del servicio Predict")
+    parser.add_argument("--mode", choices=["client", "server", "both"], default="client")
+    parser.add_argument("--sizes", default="5,50,500", help="Tamaños de diagrama (tablas)")
+    parser.add_argument("--routes", default="atributos,batch,relacion,classes",
+                        help="Subconjunto de: atributos,batch,relacion,classes")
+    parser.add_argument("--names", default="known,unknown",
+                        help="Nombres de tabla: known (vocabulario), unknown (fuera de él) o ambos")
+    parser.add_argument("--no-exact", action="store_true",
+                        help="Desactiva la consulta exacta: todo va al modelo")
+    parser.add_argument("--requests", type=int, default=50, help="Peticiones medidas por escenario")
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--max-seconds", type=float, default=10.0, help="Tope de tiempo por escenario")
+    parser.add_argument("--concurrency", type=int, default=4, help="Clientes concurrentes (modo server)")
+    parser.add_argument("--cache", action="store_true", help="Mantiene activa la cache de predicciones")
+    parser.add_argument("--model-dir", default=str(PREDICT_DIR), help="MODEL_DIR para el registro")
+    parser.add_argument("--output", default=None, help="Escribe los resultados en JSON")
+    parser.add_argument("--save-baseline", default=None, help="Guarda los resultados como línea base")
+    parser.add_argument("--compare", default=None, help="Compara con una línea base guardada")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Regresión tolerada (0.25 = 25%%)")
+    args = parser.parse_args()
+
+    # configuración del servicio antes de importarlo
+    os.environ.setdefault("MODEL_LOAD", "lazy")
+    os.environ["MODEL_DIR"] = args.model_dir
+    if not args.cache:
+        os.environ["PREDICT_CACHE_SIZE"] = "0"
+    if args.no_exact:
+        os.environ["PREDICT_EXACT_LOOKUP"] = "0"
+    import logging
+    import app as app_module
+
+    logging.getLogger().setLevel(logging.WARNING)
+    version = ensure_models(app_module, PREDICT_DIR / "tables_train.json")
+    print(f"Model version: {version}")
+
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    routes = [r.strip() for r in args.routes.split(",") if r.strip()]
+    names = [v.strip() for v in args.names.split(",") if v.strip()]
+    scenarios = build_scenarios(sizes, routes, names)
+    modes = ["client", "server"] if args.mode == "both" else [args.mode]
+
+    results: Dict[str, Dict[str, float]] = {}
+    for mode in modes:
+        stop = None
+        if mode == "server":
+            base_url, stop = start_server(app_module.app)
+        try:
+            for name, route, payload_for in scenarios:
+                before = tier_counts(app_module)
+                if mode == "client":
+                    r = run_client(app_module.app, route, payload_for, args.requests, args.max_seconds, args.warmup)
+                else:
+                    r = run_server(base_url, route, payload_for, args.requests, args.max_seconds,
+                                   args.warmup, args.concurrency)
+                after = tier_counts(app_module)
+                exact, model = after["exact"] - before["exact"], after["model"] - before["model"]
+                if exact + model:
+                    r["exact_ratio"] = exact / (exact + model)
+                results[f"{mode}:{name}"] = r
+        finally:
+            if stop:
+                stop()
+
+    print_table(results)
+    report = {"model_version": version, "results": results}
+    if args.output:
+        save_json(Path(args.output), report)
+    if args.save_baseline:
+        save_json(Path(args.save_baseline), report)
+        print(f"Baseline saved to {args.save_baseline}")
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        problems = compare(results, baseline.get("results", {}), args.tolerance)
+        if problems:
+            print("\nREGRESSIONS:")
+            for p in problems:
+                print(f"  {p}")
+            sys.exit(1)
+        print(f"\nNo regressions against {args.compare} (tolerance {args.tolerance:.0%})")
+
+
+if __name__ == "__main__":
+    main()
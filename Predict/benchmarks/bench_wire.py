@@ -0,0 +1,86 @@
+"""Coste de parsear y serializar un diagrama grande con cada formato.
+
+Mide, dentro de un contexto de petición de Flask, ``request.json`` de un
+batch de N tablas y la respuesta con ``jsonify``: JSON de la librería
+estándar (proveedor por defecto de Flask), el proveedor rápido (orjson),
+msgpack y la forma interning. La forma interning gana en bytes de la
+petición, no en tiempo: su expansión es más lenta que parsear la forma
+normal con orjson o msgpack.
+
+    python benchmarks/bench_wire.py --tables 500
+"""
+import argparse
+import json
+import os
+import time
+from typing import Callable, Dict
+
+from common import make_diagram, print_table, summarize
+
+os.environ.setdefault("MODEL_LOAD", "lazy")
+
+
+def measure(fn: Callable[[], None], repeat: int) -> Dict[str, float]:
+    fn()
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - t0)
+    return summarize(latencies, time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de formatos de payload")
+    parser.add_argument("--tables", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    import logging
+    from flask.json.provider import DefaultJSONProvider
+    import app as app_module
+    import wire
+
+    logging.getLogger().setLevel(logging.WARNING)
+    app = app_module.app
+    diagram = make_diagram(args.tables, seed=args.tables)
+    payload = {
+        "items": [{"id": str(i), "tabla": t["nombre"]} for i, t in enumerate(diagram)],
+        "tablas_existentes": diagram,
+    }
+    response = {"resultados": {str(i): {"atributos": t["atributos"], "tier": "model"} for i, t in enumerate(diagram)}}
+    fast = app.json
+    stdlib = DefaultJSONProvider(app)
+
+    def roundtrip(body: bytes, content_type: str, accept: str, provider) -> Callable[[], None]:
+        def run():
+            app.json = provider
+            with app.test_request_context("/predict/atributos/batch", method="POST", data=body,
+                                          content_type=content_type, headers={"Accept": accept}):
+                app_module.request.json
+                provider.response(response).get_data()
+        return run
+
+    body_json = json.dumps(payload).encode("utf-8")
+    body_interned = json.dumps(wire.intern_payload(payload)).encode("utf-8")
+    cases = {
+        "stdlib json": roundtrip(body_json, "application/json", "application/json", stdlib),
+        "fast json": roundtrip(body_json, "application/json", "application/json", fast),
+        "fast json interned": roundtrip(body_interned, "application/json", "application/json", fast),
+    }
+    if wire.msgpack is not None:
+        body_msgpack = wire.msgpack.packb(payload)
+        cases["msgpack"] = roundtrip(body_msgpack, "application/msgpack", "application/msgpack", fast)
+        cases["msgpack interned"] = roundtrip(wire.msgpack.packb(wire.intern_payload(payload)),
+                                              "application/msgpack", "application/msgpack", fast)
+    try:
+        results = {f"{name}/{args.tables}": measure(fn, args.repeat) for name, fn in cases.items()}
+    finally:
+        app.json = fast
+    print(f"request bytes: json {len(body_json)}, interned {len(body_interned)}")
+    print_table(results)
+
+
+if __name__ == "__main__":
+    main()
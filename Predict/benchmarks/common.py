@@ -0,0 +1,126 @@
+"""Utilidades compartidas por los benchmarks del servicio Predict."""
+import json
+import random
+import statistics
+import sys
+from pathlib import Path
+from typing import Dict, List, Optional
+
+PREDICT_DIR = Path(__file__).resolve().parent.parent
+if str(PREDICT_DIR) not in sys.path:
+    sys.path.insert(0, str(PREDICT_DIR))
+
+from generate_training_examples import DOMAINS, SUPPORT_TABLES  # noqa: E402
+
+
+def _vocabulary() -> List[tuple]:
+    """Todas las tablas (nombre, atributos) que conoce el generador, sin repetir nombres."""
+    seen = {}
+    for domain in DOMAINS:
+        for section in ("entities", "support"):
+            for tables in (domain.get(section) or {}).values():
+                for name, attrs in tables.items():
+                    seen.setdefault(name, attrs)
+    for tables in SUPPORT_TABLES.values():
+        for name, attrs in tables.items():
+            seen.setdefault(name, attrs)
+    return sorted(seen.items())
+
+
+VOCABULARY = _vocabulary()
+
+
+def unknown_name(name: str) -> str:
+    # nombre fuera del vocabulario: no lo resuelve la consulta exacta del servicio
+    return f"{name}_ext"
+
+
+def make_diagram(n_tables: int, seed: int = 0, unknown: bool = False) -> List[Dict]:
+    """Diagrama realista de ``n_tables`` tablas con el vocabulario de DOMAINS.
+
+    Si se piden más tablas que nombres hay en el vocabulario, se repiten con
+    sufijo numérico (``cliente_2``) como ocurre en diagramas grandes reales.
+    Con ``unknown`` todos los nombres pasan por ``unknown_name``.
+    """
+    rng = random.Random(seed)
+    pool = list(VOCABULARY)
+    rng.shuffle(pool)
+    tables = []
+    for i in range(n_tables):
+        name, attrs = pool[i % len(pool)]
+        rnd = i // len(pool)
+        if rnd:
+            name = f"{name}_{rnd + 1}"
+        if unknown:
+            name = unknown_name(name)
+        attrs = list(attrs)
+        if rng.random() < 0.3:
+            other = pool[rng.randrange(len(pool))][0]
+            attrs.append(f"{other}_id")
+        tables.append({"nombre": name, "atributos": attrs})
+    return tables
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, max(0, int(round(q * (len(ordered) - 1)))))
+    return ordered[idx]
+
+
+def summarize(latencies: List[float], elapsed: float) -> Dict[str, float]:
+    """Latencias en segundos -> resumen en milisegundos y peticiones por segundo."""
+    return {
+        "requests": len(latencies),
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "mean_ms": (statistics.fmean(latencies) * 1000) if latencies else 0.0,
+        "rps": (len(latencies) / elapsed) if elapsed > 0 else 0.0,
+    }
+
+
+def print_table(results: Dict[str, Dict[str, float]]) -> None:
+    # columna de tiers solo si algún escenario la trae (proporción de respuestas por consulta exacta)
+    tiers = any("exact_ratio" in r for r in results.values())
+    header = f"{'scenario':<44} {'n':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'req/s':>9}"
+    if tiers:
+        header += f" {'exact %':>8}"
+    print(header)
+    print("-" * len(header))
+    for name, r in results.items():
+        line = (
+            f"{name:<44} {r['requests']:>6} {r['p50_ms']:>9.2f} {r['p95_ms']:>9.2f} "
+            f"{r['p99_ms']:>9.2f} {r['rps']:>9.1f}"
+        )
+        if tiers:
+            line += f" {r['exact_ratio'] * 100:>8.1f}" if "exact_ratio" in r else f" {'-':>8}"
+        print(line)
+
+
+def save_json(path: Path, data) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open("w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+
+
+def compare(
+    results: Dict[str, Dict[str, float]],
+    baseline: Dict[str, Dict[str, float]],
+    tolerance: float,
+    latency_key: str = "p95_ms",
+) -> List[str]:
+    """Regresiones respecto a la línea base: latencia o throughput peor que ``tolerance``."""
+    problems = []
+    for name, base in baseline.items():
+        cur: Optional[Dict[str, float]] = results.get(name)
+        if cur is None:
+            continue
+        if base.get(latency_key) and cur[latency_key] > base[latency_key] * (1 + tolerance):
+            problems.append(
+                f"{name}: {latency_key} {cur[latency_key]:.2f} > {base[latency_key]:.2f} (+{tolerance:.0%})"
+            )
+        if base.get("rps") and cur["rps"] < base["rps"] * (1 - tolerance):
+            problems.append(f"{name}: rps {cur['rps']:.1f} < {base['rps']:.1f} (-{tolerance:.0%})")
+    return problems
@@ -0,0 +1,307 @@
+"""Compresión de los modelos de atributos y de relación.
+
+Cada worker carga los dos pipelines completos; los pesos del clasificador
+son una matriz densa float64 de ``clases x n_features`` aunque la mayoría
+de las features hasheadas nunca aparecen en el entrenamiento. ``compress``
+crea una versión nueva en ``models/<version>/`` con el mismo
+HashingVectorizer y un ``SparseLinearClassifier``:
+
+- poda de pesos: se anulan los ``prune_fraction`` pesos no nulos de menor
+  magnitud (0 = solo se descartan los que ya son cero);
+- poda de clases: fuera las salidas vistas menos de ``min_class_count``
+  veces en el entrenamiento (``class_counts`` de metadata.json);
+- pesos float32 en una matriz CSR ``n_features x clases``.
+
+Los artefactos siguen siendo pipelines de sklearn guardados con joblib y
+con los mismos nombres de fichero, así que el registro (y ``app.py``)
+carga una versión comprimida igual que una normal. El informe de
+verificación (``compression_report.json``) compara con el original la
+coincidencia de predicciones, la latencia y la memoria::
+
+    python compress.py --from-version v2 --version v2-compressed --data tables_train.json
+    python compress.py --from-version v2 --version v2-c --prune-fraction 0.5 --min-class-count 2 --set-current
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import scipy.sparse as sp
+from sklearn.base import BaseEstimator, ClassifierMixin
+
+from model_registry import MODEL_FILES, ModelRegistry, _load_artifact
+from train import KINDS, iter_texts
+
+PREDICT_DIR = Path(__file__).resolve().parent
+
+
+class SparseLinearClassifier(ClassifierMixin, BaseEstimator):
+    """``predict(X) = classes_[argmax(X @ coef + intercept)]`` con ``coef`` CSR float32.
+
+    ``row_sum_coef`` añade ``sum(X[i]) * row_sum_coef`` a cada fila: con él,
+    los pesos de MultinomialNB se guardan relativos al de una feature no vista
+    (que pasan a ser cero) sin cambiar la decisión.
+    """
+
+    def __init__(self, classes: np.ndarray, coef: sp.csr_matrix, intercept: np.ndarray,
+                 row_sum_coef: Optional[np.ndarray] = None):
+        # mismos nombres que los parámetros: get_params() de sklearn los lee así
+        self.classes = self.classes_ = np.asarray(classes)
+        self.coef = coef
+        self.intercept = np.asarray(intercept, dtype=np.float32)
+        self.row_sum_coef = None if row_sum_coef is None else np.asarray(row_sum_coef, dtype=np.float32)
+
+    @classmethod
+    def from_estimator(cls, clf: Any, keep_classes: Optional[np.ndarray] = None,
+                       prune_fraction: float = 0.0) -> "SparseLinearClassifier":
+        """Desde un SGDClassifier o MultinomialNB ajustado; ``keep_classes`` es una máscara sobre ``clf.classes_``."""
+        classes = np.asarray(clf.classes_)
+        row_sum = None
+        if hasattr(clf, "coef_"):
+            W = np.asarray(clf.coef_, dtype=np.float64)
+            b = np.asarray(clf.intercept_, dtype=np.float64)
+        elif hasattr(clf, "feature_log_prob_"):
+            flp = np.asarray(clf.feature_log_prob_, dtype=np.float64)
+            # el mínimo de cada clase es el peso de una feature no vista
+            row_sum = flp.min(axis=1)
+            W = flp - row_sum[:, None]
+            b = np.asarray(clf.class_log_prior_, dtype=np.float64)
+        else:
+            raise TypeError(f"{type(clf).__name__} no es un clasificador lineal soportado")
+
+        # en binario hay una sola fila de pesos: no se pueden quitar clases
+        if keep_classes is not None and W.shape[0] == len(classes) and keep_classes.sum() >= 2:
+            classes, W, b = classes[keep_classes], W[keep_classes], b[keep_classes]
+            if row_sum is not None:
+                row_sum = row_sum[keep_classes]
+
+        if prune_fraction > 0:
+            magnitude = np.abs(W)
+            nonzero = magnitude[magnitude > 0]
+            if nonzero.size:
+                W = np.where(magnitude < np.quantile(nonzero, prune_fraction), 0.0, W)
+        coef = sp.csr_matrix(W.T.astype(np.float32))
+        coef.eliminate_zeros()
+        return cls(classes, coef, b, row_sum)
+
+    def decision_function(self, X) -> np.ndarray:
+        # X en float32: si no, scipy convertiría los pesos a float64 en cada llamada
+        X = sp.csr_matrix(X, dtype=np.float32)
+        scores = (X @ self.coef).toarray()
+        scores += self.intercept
+        if self.row_sum_coef is not None:
+            scores += np.asarray(X.sum(axis=1), dtype=np.float32) * self.row_sum_coef
+        return scores
+
+    def predict(self, X) -> np.ndarray:
+        scores = self.decision_function(X)
+        if scores.shape[1] == 1:
+            return self.classes_[(scores[:, 0] > 0).astype(np.intp)]
+        return self.classes_[scores.argmax(axis=1)]
+
+    def fit(self, X, y):
+        # tiene que existir: check_is_fitted (y con él Pipeline.predict) rechaza objetos sin ``fit``
+        raise TypeError("SparseLinearClassifier no se entrena: se construye con from_estimator "
+                        "desde un clasificador ya ajustado")
+
+    def __sklearn_is_fitted__(self) -> bool:
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        n_features, n_classes = self.coef.shape
+        return {
+            "classes": int(len(self.classes_)),
+            "n_features": int(n_features),
+            "nonzero_weights": int(self.coef.nnz),
+            "density": round(self.coef.nnz / max(1, n_features * n_classes), 6),
+            "features_used": int(np.count_nonzero(np.diff(self.coef.indptr))),
+        }
+
+
+def compress_model(model: Any, class_counts: Optional[Dict[str, int]] = None, min_class_count: int = 1,
+                   prune_fraction: float = 0.0):
+    """Pipeline (vectorizador, clasificador) -> pipeline con ``SparseLinearClassifier``."""
+    from sklearn.pipeline import Pipeline
+
+    steps = getattr(model, "steps", None)
+    if not steps or len(steps) != 2:
+        raise TypeError("Se esperaba un pipeline (vectorizador, clasificador)")
+    (vec_name, vectorizer), (_, clf) = steps
+    keep = None
+    if class_counts and min_class_count > 1:
+        keep = np.array([class_counts.get(str(c), 0) >= min_class_count for c in clf.classes_])
+    sparse_clf = SparseLinearClassifier.from_estimator(clf, keep, prune_fraction)
+    return Pipeline([(vec_name, vectorizer), ("sparselinearclassifier", sparse_clf)])
+
+
+# ---- informe de verificación ----
+def _agreement(original: Any, compressed: Any, texts: List[str], expected: List[str]) -> Dict[str, Any]:
+    a = [str(p) for p in original.predict(texts)]
+    b = [str(p) for p in compressed.predict(texts)]
+    n = len(texts)
+    return {
+        "examples": n,
+        "agreement": round(sum(x == y for x, y in zip(a, b)) / n, 6),
+        "accuracy_original": round(sum(x == y for x, y in zip(a, expected)) / n, 6),
+        "accuracy_compressed": round(sum(x == y for x, y in zip(b, expected)) / n, 6),
+    }
+
+
+_RSS_SCRIPT = """
+import json, os, sys
+from pathlib import Path
+sys.path.insert(0, sys.argv[1])
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.linear_model import SGDClassifier
+from sklearn.naive_bayes import MultinomialNB
+from sklearn.pipeline import Pipeline
+import compress
+from model_registry import _load_artifact
+
+def rss():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+texts = json.loads(sys.stdin.read())
+before = rss()
+model = _load_artifact(Path(sys.argv[2]), sys.argv[3] or None)
+model.predict(texts)
+print(json.dumps(rss() - before))
+"""
+
+
+def _rss_delta(path: Path, mmap_mode: Optional[str], texts: List[str]) -> Optional[int]:
+    """RSS que añade cargar el artefacto y predecir ``texts``, medido en un proceso aparte."""
+    try:
+        out = subprocess.run(
+            [sys.executable, "-c", _RSS_SCRIPT, str(PREDICT_DIR), str(path), mmap_mode or ""],
+            input=json.dumps(texts), capture_output=True, text=True, check=True, timeout=300,
+        )
+        return int(out.stdout.strip().splitlines()[-1])
+    except (subprocess.SubprocessError, ValueError, OSError):
+        return None
+
+
+def verification_report(originals: Dict[str, Any], compressed: Dict[str, Any], data: Path, samples: int,
+                        paths: Dict[str, Path], compressed_paths: Dict[str, Path]) -> Dict[str, Any]:
+    from evaluate import model_cost
+
+    cost_original = model_cost(originals, data, samples, paths)
+    cost_compressed = model_cost(compressed, data, samples, compressed_paths)
+    report: Dict[str, Any] = {}
+    for kind in KINDS:
+        pairs = []
+        for entrada, salida in iter_texts(data, kind):
+            pairs.append((entrada, salida))
+            if len(pairs) >= samples:
+                break
+        if not pairs:
+            continue
+        texts = [e for e, _ in pairs]
+        report[kind] = {
+            "predictions": _agreement(originals[kind], compressed[kind], texts, [s for _, s in pairs]),
+            "original": cost_original.get(kind),
+            "compressed": cost_compressed.get(kind),
+            "rss_bytes": {
+                form: {"load": _rss_delta(p[kind], None, texts), "mmap": _rss_delta(p[kind], "r", texts)}
+                for form, p in (("original", paths), ("compressed", compressed_paths))
+            },
+        }
+    return report
+
+
+def compress(base_dir: str, version: str, source_version: Optional[str] = None, data: Optional[Path] = None,
+             prune_fraction: float = 0.0, min_class_count: int = 1, samples: int = 2000,
+             set_current: bool = False) -> Path:
+    import joblib
+
+    registry = ModelRegistry(base_dir, mmap_mode=None)
+    source, paths = registry.resolve(source_version)
+    # los .pkl heredados no tienen metadata.json (ni class_counts)
+    meta_path = registry.models_dir / source / "metadata.json"
+    source_meta = json.loads(meta_path.read_text(encoding="utf-8")) if meta_path.exists() else {}
+    target = registry.models_dir / version
+    target.mkdir(parents=True, exist_ok=True)
+
+    originals, compressed, compressed_paths, info = {}, {}, {}, {}
+    for kind, path in paths.items():
+        originals[kind] = _load_artifact(path, None)
+        model_meta = (source_meta.get("models") or {}).get(kind) or {}
+        class_counts = model_meta.get("class_counts")
+        if min_class_count > 1 and not class_counts:
+            print(f"[{kind}] metadata.json sin class_counts: no se podan clases")
+        compressed[kind] = compress_model(originals[kind], class_counts, min_class_count, prune_fraction)
+        compressed_paths[kind] = target / (MODEL_FILES[kind] + ".joblib")
+        # sin compresión de joblib: los arrays del CSR se pueden mapear en memoria
+        joblib.dump(compressed[kind], compressed_paths[kind], compress=0)
+        info[kind] = compressed[kind].steps[-1][1].stats()
+        print(f"[{kind}] {info[kind]}")
+
+    metadata = {
+        **source_meta,
+        "version": version,
+        "compressed_at": datetime.now().isoformat(timespec="seconds"),
+        "compression": {
+            "source_version": source,
+            "prune_fraction": prune_fraction,
+            "min_class_count": min_class_count,
+            "models": info,
+        },
+    }
+    for kind, model_meta in (metadata.get("models") or {}).items():
+        kept = {str(c) for c in compressed[kind].steps[-1][1].classes_} if kind in compressed else None
+        if kept is not None and model_meta.get("class_counts"):
+            model_meta["class_counts"] = {c: n for c, n in model_meta["class_counts"].items() if c in kept}
+            model_meta["classes"] = len(model_meta["class_counts"])
+    (target / "metadata.json").write_text(json.dumps(metadata, indent=2, ensure_ascii=False), encoding="utf-8")
+
+    if data is not None and data.exists():
+        report = {
+            "source_version": source,
+            "version": version,
+            "data": str(data),
+            "prune_fraction": prune_fraction,
+            "min_class_count": min_class_count,
+            "models": verification_report(originals, compressed, data, samples, paths, compressed_paths),
+        }
+        (target / "compression_report.json").write_text(json.dumps(report, indent=2, sort_keys=True),
+                                                         encoding="utf-8")
+        for kind, r in report["models"].items():
+            print(f"[{kind}] agreement {r['predictions']['agreement']:.4f}, "
+                  f"p50 {r['original']['latency_ms']['p50']} -> {r['compressed']['latency_ms']['p50']} ms, "
+                  f"arrays {r['original']['memory']['array_bytes']} -> {r['compressed']['memory']['array_bytes']} B, "
+                  f"RSS {r['rss_bytes']['original']['load']} -> {r['rss_bytes']['compressed']['load']} B")
+    if set_current:
+        (registry.models_dir / "CURRENT").write_text(version + "\n", encoding="utf-8")
+    return target
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Comprime los modelos de una versión (pesos dispersos float32)")
+    parser.add_argument("--dir", default=os.environ.get("MODEL_DIR", "."), help="Directorio base de modelos")
+    parser.add_argument("--from-version", default=None, help="Versión de origen (por defecto la activa o los .pkl)")
+    parser.add_argument("--version", required=True, help="Nombre de la versión comprimida")
+    parser.add_argument("--data", default="tables_train.json", help="Ejemplos para el informe de verificación")
+    parser.add_argument("--prune-fraction", type=float, default=0.0,
+                        help="Fracción de los pesos no nulos de menor magnitud que se anulan")
+    parser.add_argument("--min-class-count", type=int, default=1, help="Descarta salidas vistas menos veces")
+    parser.add_argument("--samples", type=int, default=2000, help="Ejemplos por modelo en el informe")
+    parser.add_argument("--set-current", action="store_true", help="Marca la versión como activa")
+    args = parser.parse_args()
+
+    target = compress(args.dir, args.version, args.from_version, Path(args.data), args.prune_fraction,
+                      args.min_class_count, args.samples, args.set_current)
+    print(f"Compressed models saved to {target}")
+
+
+if __name__ == "__main__":
+    # desde el módulo importado: los artefactos deben referenciar
+    # compress.SparseLinearClassifier y no __main__.SparseLinearClassifier
+    import compress
+
+    compress.main()
@@ -0,0 +1,288 @@
+"""Formato columnar del corpus de entrenamiento con cadenas internadas.
+
+tables_train.json repite miles de veces los mismos nombres (``id``,
+``nombre``, ``fecha``...) y hay que parsearlo entero. Este formato guarda
+un vocabulario de cadenas y, por columnas, arrays de enteros con offsets,
+en ficheros binarios que se leen con ``numpy.memmap``: acceso aleatorio a
+cualquier ejemplo y memoria constante sea cual sea el tamaño del corpus.
+
+Un directorio ``<nombre>.columnar/`` con::
+
+    meta.json          formato y tamaños
+    vocab.json         lista de cadenas (los ids apuntan aquí)
+    kind.u8            0 = atributos, 1 = relación (uno por ejemplo)
+    tabla.i32          tabla pedida (-1 en relación)
+    ex_tables.i64      offsets de cada ejemplo en las tablas existentes (n + 1)
+    table_name.i32     nombre de cada tabla existente
+    table_attrs.i64    offsets de cada tabla en attrs.i32 (tablas + 1)
+    attrs.i32          atributos de las tablas existentes
+    out_name.i32       tabla sugerida (-1 en atributos)
+    out_attrs.i64      offsets de cada ejemplo en out_values.i32 (n + 1)
+    out_values.i32     atributos de salida
+
+    python dataset.py convert --data tables_train.json --out tables_train.columnar
+    python dataset.py info --data tables_train.columnar
+"""
+import argparse
+import json
+import random
+import time
+from array import array
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+
+FORMAT_VERSION = 1
+KIND_ATRIBUTOS = 0
+KIND_RELACION = 1
+
+# fichero -> (dtype numpy, código de array.array)
+_COLUMNS = {
+    "kind.u8": ("<u1", "B"),
+    "tabla.i32": ("<i4", "i"),
+    "ex_tables.i64": ("<i8", "q"),
+    "table_name.i32": ("<i4", "i"),
+    "table_attrs.i64": ("<i8", "q"),
+    "attrs.i32": ("<i4", "i"),
+    "out_name.i32": ("<i4", "i"),
+    "out_attrs.i64": ("<i8", "q"),
+    "out_values.i32": ("<i4", "i"),
+}
+
+
+def _column_sizes(meta: Dict) -> Dict[str, int]:
+    """Elementos de cada columna que cubre ``meta.json``."""
+    n, t = meta["examples"], meta["tables"]
+    return {
+        "kind.u8": n, "tabla.i32": n, "ex_tables.i64": n + 1,
+        "table_name.i32": t, "table_attrs.i64": t + 1, "attrs.i32": meta["attrs"],
+        "out_name.i32": n, "out_attrs.i64": n + 1, "out_values.i32": meta["out_values"],
+    }
+
+
+def is_columnar(path: Path) -> bool:
+    return Path(path).is_dir() and (Path(path) / "meta.json").exists()
+
+
+class ColumnarWriter:
+    """Escribe (o amplía) un corpus columnar en streaming, volcando cada ``flush_every`` ejemplos."""
+
+    def __init__(self, path: Path, flush_every: int = 10_000):
+        self.path = Path(path)
+        self.flush_every = flush_every
+        self.path.mkdir(parents=True, exist_ok=True)
+        if is_columnar(self.path):
+            meta = json.loads((self.path / "meta.json").read_text(encoding="utf-8"))
+            if meta.get("format") != FORMAT_VERSION:
+                raise ValueError(f"{self.path}: formato {meta.get('format')} no soportado")
+            self.vocab: List[str] = json.loads((self.path / "vocab.json").read_text(encoding="utf-8"))
+            self.examples, self.tables = meta["examples"], meta["tables"]
+            self.attrs, self.out_values = meta["attrs"], meta["out_values"]
+            # un append interrumpido deja cadenas y bytes más allá de meta.json: se descartan
+            # antes de seguir escribiendo, o los nuevos ejemplos quedarían detrás de la basura
+            n_vocab = meta.get("vocab", len(self.vocab))
+            if len(self.vocab) < n_vocab:
+                raise ValueError(f"{self.path}: vocab.json tiene {len(self.vocab)} cadenas y meta.json {n_vocab}")
+            del self.vocab[n_vocab:]
+            fresh = False
+        else:
+            self.vocab = []
+            self.examples = self.tables = self.attrs = self.out_values = 0
+            fresh = True
+        self._ids: Dict[str, int] = {s: i for i, s in enumerate(self.vocab)}
+        self._files = {name: (self.path / name).open("wb" if fresh else "ab") for name in _COLUMNS}
+        if not fresh:
+            for name, size in _column_sizes(meta).items():
+                f = self._files[name]
+                expected = size * np.dtype(_COLUMNS[name][0]).itemsize
+                if f.seek(0, 2) < expected:
+                    self._close_files()
+                    raise ValueError(f"{self.path / name}: faltan bytes respecto a meta.json")
+                f.truncate(expected)
+        self._buf = {name: array(code) for name, (_, code) in _COLUMNS.items()}
+        if fresh:
+            # los offsets empiezan en 0
+            for name in ("ex_tables.i64", "table_attrs.i64", "out_attrs.i64"):
+                self._buf[name].append(0)
+        self._pending = 0
+
+    def _id(self, s) -> int:
+        s = str(s)
+        i = self._ids.get(s)
+        if i is None:
+            i = self._ids[s] = len(self.vocab)
+            self.vocab.append(s)
+        return i
+
+    def add(self, example: Dict) -> None:
+        inp, out = example["input"], example["output"]
+        b = self._buf
+        for t in inp.get("tablas_existentes") or []:
+            b["table_name.i32"].append(self._id(t["nombre"]))
+            for a in t.get("atributos") or []:
+                b["attrs.i32"].append(self._id(a))
+                self.attrs += 1
+            b["table_attrs.i64"].append(self.attrs)
+            self.tables += 1
+        b["ex_tables.i64"].append(self.tables)
+        if "tabla" in inp:
+            b["kind.u8"].append(KIND_ATRIBUTOS)
+            b["tabla.i32"].append(self._id(inp["tabla"]))
+            b["out_name.i32"].append(-1)
+            salida = out
+        else:
+            b["kind.u8"].append(KIND_RELACION)
+            b["tabla.i32"].append(-1)
+            b["out_name.i32"].append(self._id(out["tabla_sugerida"]))
+            salida = out["atributos"]
+        for a in salida:
+            b["out_values.i32"].append(self._id(a))
+            self.out_values += 1
+        b["out_attrs.i64"].append(self.out_values)
+        self.examples += 1
+        self._pending += 1
+        if self._pending >= self.flush_every:
+            self.flush()
+
+    def extend(self, examples: Iterable[Dict]) -> None:
+        for ex in examples:
+            self.add(ex)
+
+    def flush(self) -> None:
+        for name, buf in self._buf.items():
+            if buf:
+                self._files[name].write(buf.tobytes())
+                del buf[:]
+            self._files[name].flush()
+        self._pending = 0
+        # meta.json al final: un corte a mitad de escritura deja el corpus anterior legible
+        (self.path / "vocab.json").write_text(json.dumps(self.vocab, ensure_ascii=False), encoding="utf-8")
+        meta = {"format": FORMAT_VERSION, "examples": self.examples, "tables": self.tables,
+                "attrs": self.attrs, "out_values": self.out_values, "vocab": len(self.vocab)}
+        (self.path / "meta.json").write_text(json.dumps(meta), encoding="utf-8")
+
+    def _close_files(self) -> None:
+        for f in self._files.values():
+            f.close()
+
+    def close(self) -> None:
+        self.flush()
+        self._close_files()
+
+    def __enter__(self) -> "ColumnarWriter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class ColumnarDataset:
+    """Lector por ``numpy.memmap``: ``len``, acceso aleatorio y mini-lotes barajados."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.meta = json.loads((self.path / "meta.json").read_text(encoding="utf-8"))
+        if self.meta.get("format") != FORMAT_VERSION:
+            raise ValueError(f"{self.path}: formato {self.meta.get('format')} no soportado")
+        self.vocab: List[str] = json.loads((self.path / "vocab.json").read_text(encoding="utf-8"))
+        # se mapean solo los elementos que cubre meta.json (un append interrumpido no se ve)
+        self._cols = {name: self._map(name, _COLUMNS[name][0], size)
+                      for name, size in _column_sizes(self.meta).items()}
+
+    def _map(self, name: str, dtype: str, size: int) -> np.ndarray:
+        if size == 0:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(self.path / name, dtype=dtype, mode="r", shape=(size,))
+
+    def __len__(self) -> int:
+        return self.meta["examples"]
+
+    def _strings(self, ids: np.ndarray) -> List[str]:
+        vocab = self.vocab
+        return [vocab[i] for i in ids.tolist()]
+
+    def __getitem__(self, i: int) -> Dict:
+        c = self._cols
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        t0, t1 = int(c["ex_tables.i64"][i]), int(c["ex_tables.i64"][i + 1])
+        offsets = c["table_attrs.i64"][t0:t1 + 1].tolist()
+        names = self._strings(c["table_name.i32"][t0:t1])
+        tablas = [
+            {"nombre": names[k], "atributos": self._strings(c["attrs.i32"][offsets[k]:offsets[k + 1]])}
+            for k in range(t1 - t0)
+        ]
+        salida = self._strings(c["out_values.i32"][int(c["out_attrs.i64"][i]):int(c["out_attrs.i64"][i + 1])])
+        if c["kind.u8"][i] == KIND_ATRIBUTOS:
+            return {"input": {"tabla": self.vocab[int(c["tabla.i32"][i])], "tablas_existentes": tablas},
+                    "output": salida}
+        return {"input": {"tablas_existentes": tablas},
+                "output": {"tabla_sugerida": self.vocab[int(c["out_name.i32"][i])], "atributos": salida}}
+
+    def iter_examples(self) -> Iterator[Dict]:
+        for i in range(len(self)):
+            yield self[i]
+
+    def iter_batches(self, batch_size: int, shuffle: bool = True, seed: Optional[int] = None,
+                     block_size: int = 1 << 16) -> Iterator[List[Dict]]:
+        """Mini-lotes de ejemplos. Al barajar se permutan bloques y los índices dentro
+        de cada bloque, así la memoria es O(block_size) y no O(len)."""
+        rng = np.random.default_rng(seed)
+        n = len(self)
+        blocks = np.arange(0, n, block_size)
+        if shuffle:
+            rng.shuffle(blocks)
+        batch: List[Dict] = []
+        for start in blocks.tolist():
+            idx = np.arange(start, min(n, start + block_size))
+            if shuffle:
+                rng.shuffle(idx)
+            for i in idx.tolist():
+                batch.append(self[i])
+                if len(batch) >= batch_size:
+                    yield batch
+                    batch = []
+        if batch:
+            yield batch
+
+    def info(self) -> Dict:
+        kinds = np.bincount(np.asarray(self._cols["kind.u8"]), minlength=2) if len(self) else [0, 0]
+        size = sum(p.stat().st_size for p in self.path.iterdir() if p.is_file())
+        return {**self.meta, "atributos": int(kinds[0]), "relacion": int(kinds[1]), "bytes": size}
+
+
+def convert(src: Path, dst: Path) -> ColumnarDataset:
+    from train import iter_examples
+
+    with ColumnarWriter(dst) as writer:
+        writer.extend(iter_examples(src))
+    return ColumnarDataset(dst)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Corpus columnar de ejemplos de entrenamiento")
+    sub = parser.add_subparsers(dest="command", required=True)
+    c = sub.add_parser("convert", help="Convierte un .json/.jsonl a formato columnar (añade si ya existe)")
+    c.add_argument("--data", default="tables_train.json")
+    c.add_argument("--out", default="tables_train.columnar")
+    i = sub.add_parser("info", help="Resumen de un corpus columnar")
+    i.add_argument("--data", default="tables_train.columnar")
+    i.add_argument("--sample", type=int, default=0, help="Muestra N ejemplos al azar")
+    args = parser.parse_args()
+
+    if args.command == "convert":
+        start = time.perf_counter()
+        ds = convert(Path(args.data), Path(args.out))
+        print(f"Converted in {time.perf_counter() - start:.2f}s: {ds.info()} -> {args.out}")
+    else:
+        ds = ColumnarDataset(Path(args.data))
+        print(json.dumps(ds.info(), indent=2))
+        for k in random.sample(range(len(ds)), min(args.sample, len(ds))):
+            print(json.dumps(ds[k], ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
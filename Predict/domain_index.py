@@ -0,0 +1,97 @@
+"""Índice de dominios para /suggest/classes.
+
+Se construye una vez al arrancar a partir de ``{dominio: [entidades]}``:
+un índice invertido entidad -> dominios y un autómata Aho-Corasick con
+todos los nombres de entidad, de modo que puntuar los dominios es una sola
+pasada sobre las clases existentes y el título, independiente del número
+de dominios del vocabulario.
+"""
+from collections import Counter, deque
+from typing import Dict, Iterable, List, Set, Tuple
+
+
+class AhoCorasick:
+    """Autómata de búsqueda simultánea de muchos patrones en un texto."""
+
+    def __init__(self, patterns: Iterable[str]):
+        self.patterns: List[str] = []
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[int]] = [[]]
+        for p in patterns:
+            if p:
+                self._add(p)
+        self._build()
+
+    def _add(self, pattern: str) -> None:
+        node = 0
+        for ch in pattern:
+            nxt = self._goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            node = nxt
+        self._out[node].append(len(self.patterns))
+        self.patterns.append(pattern)
+
+    def _build(self) -> None:
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in self._goto[node].items():
+                queue.append(nxt)
+                f = self._fail[node]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                self._fail[nxt] = self._goto[f].get(ch, 0)
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def find(self, text: str) -> Set[str]:
+        """Patrones distintos que aparecen como subcadena de ``text``."""
+        found: Set[int] = set()
+        node = 0
+        goto, fail, out = self._goto, self._fail, self._out
+        for ch in text:
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if out[node]:
+                found.update(out[node])
+        return {self.patterns[i] for i in found}
+
+
+class DomainIndex:
+    def __init__(self, domain_entities: Dict[str, List[str]]):
+        self.domain_entities = domain_entities
+        self.entity_domains: Dict[str, List[str]] = {}
+        for key, ents in domain_entities.items():
+            for e in set(ents):
+                self.entity_domains.setdefault(e, []).append(key)
+        self.automaton = AhoCorasick(sorted(self.entity_domains))
+        # desempate igual que el ranking original: (score, key) descendente
+        self._keys_desc = sorted(domain_entities, reverse=True)
+
+    def scores(self, existing_norm: Set[str], title_norm: str) -> Counter:
+        counts: Counter = Counter()
+        for e in existing_norm:
+            for key in self.entity_domains.get(e, ()):
+                counts[key] += 1
+        for e in self.automaton.find(title_norm):
+            for key in self.entity_domains[e]:
+                counts[key] += 1
+        return counts
+
+    def top_domains(self, existing_norm: Set[str], title_norm: str, k: int = 1) -> List[Tuple[int, str]]:
+        """Los ``k`` mejores dominios como ``(score, key)``; rellena con dominios sin coincidencias."""
+        counts = self.scores(existing_norm, title_norm)
+        ranked = sorted(((score, key) for key, score in counts.items()), reverse=True)[:k]
+        if len(ranked) < k:
+            for key in self._keys_desc:
+                if key not in counts:
+                    ranked.append((0, key))
+                    if len(ranked) >= k:
+                        break
+        return ranked
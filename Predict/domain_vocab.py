@@ -0,0 +1,188 @@
+"""Vocabulario de dominios precompilado para un arranque rápido.
+
+Sin este artefacto el servicio importa ``generate_training_examples`` al
+arrancar (construye todos los ``DOMAINS``), normaliza y ordena los nombres
+y recorre tables_train.json para la consulta exacta. ``build`` hace ese
+trabajo una vez y lo guarda en un único JSON versionado con las cadenas
+internadas: entidades por dominio, tablas de la consulta exacta y los
+metadatos del modelo activo. El servicio lo carga con una sola lectura.
+
+    python domain_vocab.py build --data tables_train.json --out domain_vocab.json
+
+El artefacto guarda el hash del generador y el de los datos de la consulta
+exacta: si ``generate_training_examples.py`` o ese fichero cambian (o el
+artefacto está corrupto), ``load`` lo descarta y el servicio vuelve al
+camino lento hasta que se reconstruya.
+"""
+import argparse
+import hashlib
+import json
+import logging
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from features import normalize_name
+from lookup import ExactLookup
+
+FORMAT_VERSION = 1
+GENERATOR_PATH = Path(__file__).resolve().parent / "generate_training_examples.py"
+
+try:
+    import orjson as _json_fast
+except ImportError:  # opcional
+    _json_fast = None
+
+
+def _sha256(path: Path) -> Optional[str]:
+    try:
+        return hashlib.sha256(path.read_bytes()).hexdigest()
+    except OSError:
+        return None
+
+
+def collect_domain_entities(domains: List[Dict], normalize: Callable[[str], str]) -> Dict[str, List[str]]:
+    """Entidades (ES y EN) de cada dominio, normalizadas y ordenadas."""
+    mapping: Dict[str, List[str]] = {}
+    for d in domains:
+        names = set()
+        for lang_key in ("ES", "EN", "es", "en"):
+            entities = (d.get("entities", {}) or {}).get(lang_key, {}) or {}
+            for k in entities.keys():
+                names.add(normalize(k))
+        mapping[d.get("key", "misc")] = sorted(list(names))
+    return mapping
+
+
+class DomainVocab:
+    def __init__(self, domain_entities: Dict[str, List[str]], lookup: ExactLookup,
+                 model: Optional[Dict[str, Any]] = None, built_at: Optional[str] = None,
+                 data_sha256: Optional[str] = None):
+        self.domain_entities = domain_entities
+        self.lookup = lookup
+        self.model = model
+        self.built_at = built_at
+        self.data_sha256 = data_sha256
+
+    @classmethod
+    def build(cls, examples=(), model_dir: Optional[Path] = None,
+              data_path: Optional[Path] = None) -> "DomainVocab":
+        """``data_path``: fichero del que salen ``examples``; se guarda su hash."""
+        from generate_training_examples import DOMAINS, SUPPORT_TABLES
+
+        lookup = ExactLookup.build(normalize_name, DOMAINS, SUPPORT_TABLES, examples)
+        return cls(collect_domain_entities(DOMAINS, normalize_name), lookup, _model_metadata(model_dir),
+                   datetime.now().isoformat(timespec="seconds"),
+                   _sha256(Path(data_path)) if data_path is not None else None)
+
+    def to_payload(self) -> Dict[str, Any]:
+        strings: List[str] = []
+        index: Dict[str, int] = {}
+
+        def ref(s: str) -> int:
+            i = index.get(s)
+            if i is None:
+                i = index[s] = len(strings)
+                strings.append(s)
+            return i
+
+        tables = self.lookup.export()
+        return {
+            "format": FORMAT_VERSION,
+            "built_at": self.built_at,
+            "generator_sha256": _sha256(GENERATOR_PATH),
+            "data_sha256": self.data_sha256,
+            "model": self.model,
+            "domains": {key: [ref(n) for n in names] for key, names in self.domain_entities.items()},
+            "atributos": [[ref(k), lang, [ref(a) for a in attrs]] for k, lang, attrs in tables["atributos"]],
+            "relaciones": [[[ref(n) for n in names], ref(nombre), [ref(a) for a in attrs]]
+                           for names, nombre, attrs in tables["relaciones"]],
+            "strings": strings,
+        }
+
+    @classmethod
+    def from_payload(cls, payload: Dict[str, Any], normalize: Callable[[str], str]) -> "DomainVocab":
+        s = payload["strings"]
+        lookup = ExactLookup.from_export(normalize, {
+            "atributos": [[s[k], lang, [s[a] for a in attrs]] for k, lang, attrs in payload["atributos"]],
+            "relaciones": [[[s[n] for n in names], s[nombre], [s[a] for a in attrs]]
+                           for names, nombre, attrs in payload["relaciones"]],
+        })
+        domains = {key: [s[i] for i in ids] for key, ids in payload["domains"].items()}
+        return cls(domains, lookup, payload.get("model"), payload.get("built_at"), payload.get("data_sha256"))
+
+    def save(self, path: Path) -> None:
+        Path(path).write_text(json.dumps(self.to_payload(), ensure_ascii=False, separators=(",", ":")),
+                              encoding="utf-8")
+
+    @classmethod
+    def load(cls, path: Path, normalize: Callable[[str], str] = normalize_name,
+             data_path: Optional[Path] = None) -> Optional["DomainVocab"]:
+        """El artefacto, o None si no existe, está corrupto, es de otro formato o
+        del generador anterior, o si ``data_path`` existe y no es el fichero con el
+        que se construyó. Nunca lanza: el servicio lo llama al importarse."""
+        try:
+            raw = Path(path).read_bytes()
+        except OSError:
+            return None
+        try:
+            payload = _json_fast.loads(raw) if _json_fast else json.loads(raw)
+            if not isinstance(payload, dict):
+                raise ValueError(f"se esperaba un objeto JSON, no {type(payload).__name__}")
+            if payload.get("format") != FORMAT_VERSION:
+                logging.warning("%s: formato %s no soportado, se ignora", path, payload.get("format"))
+                return None
+            if payload.get("generator_sha256") != _sha256(GENERATOR_PATH):
+                logging.warning("%s no corresponde al generador actual; reconstrúyelo con domain_vocab.py build",
+                                path)
+                return None
+            data_sha256 = _sha256(Path(data_path)) if data_path is not None else None
+            if data_sha256 is not None and payload.get("data_sha256") != data_sha256:
+                logging.warning("%s no corresponde a %s; reconstrúyelo con domain_vocab.py build", path, data_path)
+                return None
+            return cls.from_payload(payload, normalize)
+        except (ValueError, TypeError, KeyError, IndexError, AttributeError) as e:
+            # JSON inválido (también UnicodeDecodeError y orjson.JSONDecodeError) o estructura inesperada
+            logging.warning("%s está corrupto (%s), se ignora; reconstrúyelo con domain_vocab.py build", path, e)
+            return None
+
+
+def _model_metadata(model_dir: Optional[Path]) -> Optional[Dict[str, Any]]:
+    if model_dir is None:
+        return None
+    from model_registry import ModelRegistry
+
+    registry = ModelRegistry(str(model_dir))
+    try:
+        version, paths = registry.resolve()
+    except FileNotFoundError:
+        return None
+    meta_path = registry.models_dir / version / "metadata.json"
+    metadata = json.loads(meta_path.read_text(encoding="utf-8")) if meta_path.exists() else {}
+    return {"version": version, "metadata": metadata}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompila el vocabulario de dominios del servicio")
+    sub = parser.add_subparsers(dest="command", required=True)
+    b = sub.add_parser("build", help="Genera el artefacto")
+    b.add_argument("--data", default="tables_train.json", help="Ejemplos para la consulta exacta (.json o .jsonl)")
+    b.add_argument("--model-dir", default=".", help="MODEL_DIR del que tomar los metadatos del modelo")
+    b.add_argument("--out", default="domain_vocab.json")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        from train import iter_examples
+
+        start = time.perf_counter()
+        data = Path(args.data)
+        vocab = DomainVocab.build(iter_examples(data) if data.exists() else (), Path(args.model_dir),
+                                  data if data.exists() else None)
+        vocab.save(Path(args.out))
+        print(f"Vocab built in {time.perf_counter() - start:.2f}s: {vocab.lookup.stats()}, "
+              f"{len(vocab.domain_entities)} domains -> {args.out}")
+
+
+if __name__ == "__main__":
+    main()
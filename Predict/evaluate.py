@@ -0,0 +1,394 @@
+"""Evaluación offline de una versión de modelos: calidad y coste de inferencia.
+
+Dos modos:
+
+- holdout (por defecto): carga los artefactos de una versión (``models/<version>/``
+  o los ``.pkl`` heredados) y los evalúa sobre la parte de test del corpus.
+  La versión tiene que haberse entrenado sin esa parte (``train.py --holdout``,
+  anotado en su ``metadata.json``); si no, se niega a evaluar salvo con
+  ``--allow-overlap``, y entonces el informe lo marca (``split.train_overlap``).
+- k-fold (``--folds K``): entrena con ``train.fit_model`` sobre K-1 partes y
+  evalúa sobre la restante, para comparar recetas de entrenamiento.
+
+El reparto es determinista (hash del ejemplo), así dos versiones se miden
+siempre sobre los mismos ejemplos. Los folds, o los trozos del test en modo
+holdout, se ejecutan en paralelo en un pool de procesos.
+
+Métricas de atributos: precisión/recall/F1 del conjunto de atributos (micro)
+y coincidencia exacta. De relación: acierto del nombre de la tabla sugerida
+y F1 de sus atributos. Todas desglosadas por dominio y por idioma (es/en).
+Además: latencia por ejemplo (p50/p95/p99), throughput por lotes y memoria
+del modelo. El informe es JSON con claves ordenadas, para poder hacer diff:
+
+    python train.py --data tables_train.json --version v2 --holdout 0.2
+    python evaluate.py --data tables_train.json --version v2 --output reports/v2.json
+    python evaluate.py --folds 5 --algo nb --output reports/nb.json
+    python evaluate.py --version v3 --compare reports/v2.json
+"""
+import argparse
+import json
+import os
+import pickle
+import statistics
+import sys
+import tempfile
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from features import example_texts, normalize_name
+from generate_training_examples import DOMAINS, SUPPORT_TABLES, canonical_line, fingerprint
+from model_registry import ModelRegistry, _load_artifact
+from train import KINDS, fit_model, iter_examples
+
+_PREDICT_CHUNK = 1024
+_COUNT_KEYS = ("n", "tp", "fp", "fn", "exact", "name_ok")
+
+
+# ---- dominio e idioma de cada ejemplo ----
+def _name_index() -> Dict[str, Counter]:
+    """nombre normalizado -> votos de dominio ("domain:...") e idioma ("lang:...")."""
+    index: Dict[str, Counter] = {}
+    for d in DOMAINS:
+        for section in ("entities", "support"):
+            for lang, tables in (d.get(section) or {}).items():
+                for name in tables or {}:
+                    index.setdefault(normalize_name(name), Counter()).update([f"domain:{d['key']}", f"lang:{lang}"])
+        for lang, relations in (d.get("relations") or {}).items():
+            for name, _, _ in relations or []:
+                index.setdefault(normalize_name(name), Counter()).update([f"domain:{d['key']}", f"lang:{lang}"])
+    for lang, tables in SUPPORT_TABLES.items():
+        for name in tables:
+            index.setdefault(normalize_name(name), Counter())[f"lang:{lang}"] += 1
+    return index
+
+
+_NAMES = _name_index()
+
+
+def example_groups(example: Dict) -> List[str]:
+    """Grupos del desglose: "all", el dominio y el idioma más votados por los nombres."""
+    inp = example["input"]
+    names = [t.get("nombre", "") for t in inp.get("tablas_existentes") or []]
+    if "tabla" in inp:
+        names.append(inp["tabla"])
+    votes: Counter = Counter()
+    for n in names:
+        votes.update(_NAMES.get(normalize_name(str(n)), ()))
+    groups = ["all"]
+    for prefix in ("domain:", "lang:"):
+        best = [(c, g) for g, c in votes.items() if g.startswith(prefix)]
+        groups.append(max(best)[1] if best else prefix + "unknown")
+    return groups
+
+
+# ---- reparto determinista ----
+def _bucket(example: Dict, modulo: int) -> int:
+    return fingerprint(canonical_line(example)) % modulo
+
+
+def _split_examples(data: Path, part: int, parts: int, test: bool, holdout: float = 0.0) -> Iterator[Dict]:
+    """Ejemplos de un fold (``parts`` > 1) o del test/train de un holdout."""
+    for ex in iter_examples(data):
+        if holdout:
+            in_test = _bucket(ex, 10_000) < holdout * 10_000
+            # en holdout los trozos del test se reparten entre procesos con otro hash
+            if test and in_test and (parts == 1 or _bucket(ex, 7_919) % parts == part):
+                yield ex
+            elif not test and not in_test:
+                yield ex
+        elif (_bucket(ex, parts) == part) == test:
+            yield ex
+
+
+def _held_out(split: Optional[Dict], test_fraction: float) -> bool:
+    """True si el modelo no vio el test: se entrenó con ``train.py --holdout`` y una
+    fracción >= ``test_fraction`` (el test son los cubos más bajos del mismo hash)."""
+    return bool(split) and split.get("mode") == "holdout" and split.get("test_fraction", 0.0) >= test_fraction
+
+
+# ---- métricas ----
+def _empty_counts() -> Dict[str, Dict[str, Dict[str, int]]]:
+    return {kind: {} for kind in KINDS}
+
+
+def _add(counts: Dict, kind: str, groups: List[str], **values: int) -> None:
+    for g in groups:
+        row = counts[kind].setdefault(g, dict.fromkeys(_COUNT_KEYS, 0))
+        for k, v in values.items():
+            row[k] += v
+
+
+def _merge(a: Dict, b: Dict) -> Dict:
+    for kind, groups in b.items():
+        for g, row in groups.items():
+            target = a.setdefault(kind, {}).setdefault(g, dict.fromkeys(_COUNT_KEYS, 0))
+            for k, v in row.items():
+                target[k] += v
+    return a
+
+
+def _score(row: Dict[str, int], kind: str) -> Dict[str, float]:
+    tp, fp, fn, n = row["tp"], row["fp"], row["fn"], row["n"]
+    precision = tp / (tp + fp) if tp + fp else 0.0
+    recall = tp / (tp + fn) if tp + fn else 0.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    out = {"examples": n, "precision": round(precision, 4), "recall": round(recall, 4), "f1": round(f1, 4),
+           "exact_match": round(row["exact"] / n, 4) if n else 0.0}
+    if kind == "relacion":
+        out["name_accuracy"] = round(row["name_ok"] / n, 4) if n else 0.0
+    return out
+
+
+def evaluate_models(models: Dict[str, Any], examples: Iterator[Dict]) -> Dict:
+    """Predice en lotes y acumula conteos por tipo y grupo."""
+    counts = _empty_counts()
+    pending: Dict[str, List[Tuple[str, str, List[str]]]] = {kind: [] for kind in KINDS}
+
+    def flush(kind: str) -> None:
+        batch = pending[kind]
+        if not batch:
+            return
+        preds = models[kind].predict([e for e, _, _ in batch])
+        for (_, salida, groups), pred in zip(batch, preds):
+            gold, got = salida.split(), str(pred).split()
+            name_ok = 0
+            if kind == "relacion":
+                name_ok = int(bool(gold) and bool(got) and gold[0] == got[0])
+                gold, got = gold[1:], got[1:]
+            g, p = set(gold), set(got)
+            _add(counts, kind, groups, n=1, tp=len(g & p), fp=len(p - g), fn=len(g - p),
+                 exact=int(g == p), name_ok=name_ok)
+        pending[kind] = []
+
+    for ex in examples:
+        try:
+            kind, entrada, salida = example_texts(ex)
+        except (KeyError, TypeError):
+            continue
+        pending[kind].append((entrada, salida, example_groups(ex)))
+        if len(pending[kind]) >= _PREDICT_CHUNK:
+            flush(kind)
+    for kind in KINDS:
+        flush(kind)
+    return counts
+
+
+# ---- tareas del pool ----
+def _holdout_task(args: Tuple) -> Dict:
+    data, base_dir, version, holdout, part, parts = args
+    _, paths = ModelRegistry(base_dir).resolve(version)
+    models = {kind: _load_artifact(path, "r" if path.suffix == ".joblib" else None) for kind, path in paths.items()}
+    return {"counts": evaluate_models(models, _split_examples(Path(data), part, parts, True, holdout))}
+
+
+def _fold_task(args: Tuple) -> Dict:
+    data, fold, folds, params, keep_model = args
+    data = Path(data)
+    start = time.perf_counter()
+    models = {kind: fit_model(lambda: _split_examples(data, fold, folds, False), kind, **params)[0]
+              for kind in KINDS}
+    train_seconds = time.perf_counter() - start
+    counts = evaluate_models(models, _split_examples(data, fold, folds, True))
+    result = {"fold": fold, "counts": counts, "training_seconds": round(train_seconds, 3)}
+    if keep_model:
+        # el proceso principal mide latencia y memoria de este modelo sin competir con otros folds
+        fd, path = tempfile.mkstemp(suffix=".pkl")
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump(models, f)
+        result["model_path"] = path
+    return result
+
+
+# ---- coste de inferencia ----
+def _array_bytes(obj: Any, seen: Optional[set] = None) -> int:
+    """Bytes de los arrays numpy/scipy alcanzables desde ``obj`` (coeficientes, clases...)."""
+    seen = seen if seen is not None else set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    if isinstance(obj, np.ndarray):
+        return int(obj.nbytes)
+    if hasattr(obj, "data") and hasattr(obj, "indices") and hasattr(obj, "indptr"):
+        return sum(_array_bytes(getattr(obj, a), seen) for a in ("data", "indices", "indptr"))
+    if isinstance(obj, dict):
+        return sum(_array_bytes(v, seen) for v in obj.values())
+    if isinstance(obj, (list, tuple)):
+        return sum(_array_bytes(v, seen) for v in obj)
+    if hasattr(obj, "__dict__"):
+        return _array_bytes(vars(obj), seen)
+    return 0
+
+
+def model_cost(models: Dict[str, Any], data: Path, samples: int, paths: Optional[Dict[str, Path]] = None) -> Dict:
+    entradas: Dict[str, List[str]] = {kind: [] for kind in KINDS}
+    for ex in iter_examples(data):
+        try:
+            kind, entrada, _ = example_texts(ex)
+        except (KeyError, TypeError):
+            continue
+        if len(entradas[kind]) < samples:
+            entradas[kind].append(entrada)
+        if all(len(v) >= samples for v in entradas.values()):
+            break
+    report: Dict[str, Dict] = {}
+    for kind, model in models.items():
+        batch = entradas[kind]
+        if not batch:
+            continue
+        model.predict(batch[:1])  # calentamiento
+        lat = []
+        for e in batch:
+            t0 = time.perf_counter()
+            model.predict([e])
+            lat.append(time.perf_counter() - t0)
+        lat.sort()
+        t0 = time.perf_counter()
+        model.predict(batch)
+        batch_seconds = time.perf_counter() - t0
+        report[kind] = {
+            "latency_ms": {
+                "p50": round(lat[len(lat) // 2] * 1000, 4),
+                "p95": round(lat[min(len(lat) - 1, int(len(lat) * 0.95))] * 1000, 4),
+                "p99": round(lat[min(len(lat) - 1, int(len(lat) * 0.99))] * 1000, 4),
+                "mean": round(statistics.fmean(lat) * 1000, 4),
+            },
+            "batch_examples_per_second": round(len(batch) / batch_seconds, 1) if batch_seconds else None,
+            "memory": {
+                "array_bytes": _array_bytes(model),
+                "pickle_bytes": len(pickle.dumps(model, protocol=pickle.HIGHEST_PROTOCOL)),
+                "file_bytes": paths[kind].stat().st_size if paths and kind in paths else None,
+            },
+        }
+    return report
+
+
+# ---- informe ----
+def build_report(counts: Dict) -> Dict:
+    results: Dict[str, Dict] = {}
+    for kind, groups in counts.items():
+        by_domain = {g.split(":", 1)[1]: _score(r, kind) for g, r in sorted(groups.items()) if g.startswith("domain:")}
+        by_lang = {g.split(":", 1)[1]: _score(r, kind) for g, r in sorted(groups.items()) if g.startswith("lang:")}
+        results[kind] = {
+            "overall": _score(groups.get("all", dict.fromkeys(_COUNT_KEYS, 0)), kind),
+            "by_domain": by_domain,
+            "by_language": by_lang,
+        }
+    return results
+
+
+def compare(report: Dict, baseline: Dict) -> List[str]:
+    """Diferencias de las métricas globales y de latencia respecto a otro informe."""
+    lines = []
+    for kind in KINDS:
+        cur = report["results"].get(kind, {}).get("overall", {})
+        old = baseline.get("results", {}).get(kind, {}).get("overall", {})
+        for metric in ("precision", "recall", "f1", "exact_match", "name_accuracy"):
+            if metric in cur and metric in old:
+                lines.append(f"{kind}.{metric}: {old[metric]:.4f} -> {cur[metric]:.4f} ({cur[metric] - old[metric]:+.4f})")
+        cur_lat = report.get("cost", {}).get(kind, {}).get("latency_ms", {}).get("p50")
+        old_lat = baseline.get("cost", {}).get(kind, {}).get("latency_ms", {}).get("p50")
+        if cur_lat is not None and old_lat is not None:
+            lines.append(f"{kind}.latency_p50_ms: {old_lat:.3f} -> {cur_lat:.3f}")
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evalúa una versión de modelos (calidad y coste)")
+    parser.add_argument("--data", default="tables_train.json", help="Ejemplos (.json, .jsonl o columnar)")
+    parser.add_argument("--dir", default=".", help="MODEL_DIR con models/<version>/ o los .pkl heredados")
+    parser.add_argument("--version", default=None, help="Versión a evaluar (por defecto la activa)")
+    parser.add_argument("--holdout", type=float, default=0.2, help="Fracción de test en modo holdout")
+    parser.add_argument("--allow-overlap", action="store_true",
+                        help="(holdout) evalúa aunque el modelo se entrenara con el test; el informe lo marca")
+    parser.add_argument("--folds", type=int, default=0, help="K-fold: entrena y evalúa K modelos")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Procesos del pool")
+    parser.add_argument("--latency-samples", type=int, default=200, help="Ejemplos para medir latencia")
+    parser.add_argument("--algo", choices=["sgd", "nb"], default="sgd", help="(k-fold) clasificador")
+    parser.add_argument("--n-features", type=int, default=2 ** 14, help="(k-fold) dimensión de features")
+    parser.add_argument("--epochs", type=int, default=10, help="(k-fold) pasadas sobre el corpus")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="Escribe el informe JSON aquí")
+    parser.add_argument("--compare", default=None, help="Informe anterior con el que comparar")
+    args = parser.parse_args()
+
+    data = Path(args.data)
+    started = time.perf_counter()
+    workers = max(1, args.workers)
+    report: Dict[str, Any] = {"data": str(data)}
+
+    if args.folds > 1:
+        params = {"algo": args.algo, "n_features": args.n_features, "epochs": args.epochs, "seed": args.seed}
+        tasks = [(str(data), f, args.folds, params, f == 0) for f in range(args.folds)]
+        with ProcessPoolExecutor(max_workers=min(workers, args.folds)) as pool:
+            folds = list(pool.map(_fold_task, tasks))
+        counts = _empty_counts()
+        for r in folds:
+            _merge(counts, r["counts"])
+        model_path = folds[0].pop("model_path")
+        with open(model_path, "rb") as f:
+            models = pickle.load(f)
+        os.unlink(model_path)
+        report["split"] = {"mode": "kfold", "folds": args.folds, "params": params}
+        report["folds"] = [{"fold": r["fold"], "training_seconds": r["training_seconds"],
+                            "results": {k: v["overall"] for k, v in build_report(r["counts"]).items()}}
+                           for r in folds]
+        report["cost"] = model_cost(models, data, args.latency_samples)
+    else:
+        registry = ModelRegistry(args.dir)
+        version, paths = registry.resolve(args.version)
+        metadata_path = registry.models_dir / version / "metadata.json"
+        metadata = json.loads(metadata_path.read_text(encoding="utf-8")) if metadata_path.exists() else None
+        model_split = (metadata or {}).get("split")
+        overlap = not _held_out(model_split, args.holdout)
+        if overlap and not args.allow_overlap:
+            parser.error(f"la versión {version} se entrenó con ejemplos del test (split: {model_split}); "
+                         f"reentrena con train.py --holdout {args.holdout} o usa --allow-overlap")
+        parts = workers
+        tasks = [(str(data), args.dir, args.version, args.holdout, p, parts) for p in range(parts)]
+        if parts == 1:
+            shards = [_holdout_task(tasks[0])]
+        else:
+            with ProcessPoolExecutor(max_workers=parts) as pool:
+                shards = list(pool.map(_holdout_task, tasks))
+        counts = _empty_counts()
+        for r in shards:
+            _merge(counts, r["counts"])
+        models = {kind: _load_artifact(path, None) for kind, path in paths.items()}
+        report["model"] = {
+            "version": version,
+            "paths": {k: str(p) for k, p in paths.items()},
+            "metadata": metadata.get("params") if metadata is not None else None,
+        }
+        report["split"] = {"mode": "holdout", "test_fraction": args.holdout, "model_split": model_split,
+                           "train_overlap": overlap}
+        if overlap:
+            print(f"WARNING: {version} was trained on the test split; holdout scores are optimistic",
+                  file=sys.stderr)
+        report["cost"] = model_cost(models, data, args.latency_samples, paths)
+
+    report["results"] = build_report(counts)
+    report["evaluation_seconds"] = round(time.perf_counter() - started, 3)
+
+    text = json.dumps(report, ensure_ascii=False, indent=2, sort_keys=True)
+    if args.output:
+        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.output).write_text(text + "\n", encoding="utf-8")
+        print(f"Report written to {args.output}")
+    else:
+        print(text)
+    for kind in KINDS:
+        overall = report["results"].get(kind, {}).get("overall", {})
+        print(f"[{kind}] {overall}", file=sys.stderr)
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text(encoding="utf-8"))
+        for line in compare(report, baseline):
+            print(line, file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""Construcción del texto de entrada/salida de los modelos.
+
+Compartido por el servicio (``app.py``) y el entrenamiento (``train.py``) para
+que ambos vean exactamente la misma forma canónica del diagrama.
+"""
+import re
+from typing import Any, Dict, List, NamedTuple, Tuple
+
+
+def canonical_name(n: str) -> str:
+    # minúsculas y espacios colapsados: el vectorizador produce los mismos tokens
+    return " ".join(str(n).lower().split())
+
+
+def normalize_name(n: str) -> str:
+    # clave de búsqueda por nombre: sin espacios y en minúsculas
+    return re.sub(r"\s+", "", n.strip().lower())
+
+
+def canonical_tablas(tablas: List[Dict]) -> List[Tuple[str, Tuple[str, ...]]]:
+    """Forma canónica del diagrama: nombres normalizados y tablas ordenadas."""
+    return sorted(
+        (canonical_name(t["nombre"]), tuple(canonical_name(a) for a in t["atributos"]))
+        for t in tablas
+    )
+
+
+def tablas_texto(tablas: List[Dict]) -> str:
+    return " ".join(
+        nombre + " " + " ".join(atributos)
+        for nombre, atributos in canonical_tablas(tablas)
+    )
+
+
+def entrada_atributos(tabla: str, tablas: List[Dict]) -> str:
+    return canonical_name(tabla) + " " + tablas_texto(tablas)
+
+
+def entrada_relacion(tablas: List[Dict]) -> str:
+    return tablas_texto(tablas)
+
+
+class Entrada(NamedTuple):
+    """Entrada de una predicción del servicio.
+
+    ``texto`` es lo que recibe el modelo, construido como lo hacía el servicio
+    original (orden y mayúsculas del cliente), y ``canonica`` la forma
+    canónica, que solo sirve de clave de cache cuando el vectorizador del
+    modelo no depende del orden ni de las mayúsculas (ver ``orden_indiferente``).
+    """
+    texto: str
+    canonica: str
+
+
+def _texto_original(tablas: List[Dict]) -> str:
+    return " ".join(
+        str(t["nombre"]) + " " + " ".join(str(a) for a in t["atributos"])
+        for t in tablas
+    )
+
+
+def consulta_atributos(tabla: str, tablas: List[Dict]) -> Entrada:
+    return Entrada(str(tabla) + " " + _texto_original(tablas), entrada_atributos(tabla, tablas))
+
+
+def consulta_relacion(tablas: List[Dict]) -> Entrada:
+    return Entrada(_texto_original(tablas), entrada_relacion(tablas))
+
+
+def orden_indiferente(model: Any) -> bool:
+    """True si el modelo da lo mismo para ``texto`` y ``canonica``: pipeline cuyo
+    primer paso es un vectorizador de unigramas de palabras en minúsculas
+    (Hashing/Count/TfidfVectorizer). Los .pkl heredados con n-gramas o sensibles
+    a mayúsculas devuelven False y la cache usa el texto tal cual."""
+    steps = getattr(model, "steps", None)
+    vectorizer = steps[0][1] if steps else None
+    get_params = getattr(vectorizer, "get_params", None)
+    if get_params is None or type(vectorizer).__name__ not in ("HashingVectorizer", "CountVectorizer",
+                                                               "TfidfVectorizer"):
+        return False
+    params = get_params()
+    return (params.get("analyzer") == "word" and tuple(params.get("ngram_range") or ()) == (1, 1)
+            and bool(params.get("lowercase")) and params.get("preprocessor") is None
+            and params.get("tokenizer") is None and params.get("stop_words") is None
+            and params.get("token_pattern") == r"(?u)\b\w\w+\b")
+
+
+def example_texts(example: Dict) -> Tuple[str, str, str]:
+    """Devuelve (tipo, entrada, salida) de un ejemplo de tables_train.json.
+
+    El tipo es "atributos" (ejemplos con "tabla") o "relacion"; la salida es
+    la etiqueta que predice el modelo: atributos separados por espacios, con
+    la tabla sugerida delante en el caso de relación.
+    """
+    inp = example["input"]
+    out = example["output"]
+    tablas = inp.get("tablas_existentes") or []
+    if "tabla" in inp:
+        return "atributos", entrada_atributos(inp["tabla"], tablas), " ".join(out)
+    salida = " ".join([out["tabla_sugerida"]] + list(out["atributos"]))
+    return "relacion", entrada_relacion(tablas), salida
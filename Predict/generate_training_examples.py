@@ -1,9 +1,15 @@
 import json
 import random
 import argparse
+import gc
+import hashlib
+from contextlib import contextmanager
 from datetime import datetime
+from multiprocessing import Pool
 from pathlib import Path
 
+import numpy as np
+
 # Seed for reproducibility across runs (change to None to fully randomize)
 random.seed()
 
@@ -221,6 +227,47 @@ def choose_domain():
     return random.choice(DOMAINS)
 
 
+class _Pool:
+    """Tablas de un dominio e idioma precalculadas una sola vez.
+
+    ``tables`` es el pool de ``build_existing_tables`` (entidades, support del
+    dominio y SUPPORT_TABLES, en ese orden) y ``positions`` dónde aparece cada
+    nombre, para excluir la tabla principal sin reconstruir el pool.
+    """
+
+    def __init__(self, domain, lang):
+        self.entities = list(domain["entities"][lang].items())
+        support = list(domain.get("support", {}).get(lang, {}).items())
+        self.tables = self.entities + support + list(SUPPORT_TABLES[lang].items())
+        self.positions = {}
+        for i, (name, _) in enumerate(self.tables):
+            self.positions.setdefault(name, []).append(i)
+        # excluded[e]: posiciones con el mismo nombre que la entidad e (generate_batch)
+        self.excluded = np.zeros((len(self.entities), len(self.tables)), dtype=bool)
+        for e, (name, _) in enumerate(self.entities):
+            self.excluded[e, self.positions[name]] = True
+        self.enrich = GENERIC_ENRICH_ES if lang == ES else GENERIC_ENRICH_EN
+        # relaciones con sus tablas relacionadas ya resueltas (entidades, support, SUPPORT_TABLES)
+        lookup = {}
+        for name, attrs in self.tables[::-1]:
+            lookup[name] = attrs
+        self.relations = []
+        for name, attrs, related in domain.get("relations", {}).get(lang, []):
+            resolved = [(r, lookup[r]) for r in related if r in lookup]
+            self.relations.append((name, attrs, resolved, {r for r, _ in resolved}))
+
+
+_POOLS = {}
+
+
+def _pool(domain, lang) -> _Pool:
+    key = (domain["key"], lang)
+    pool = _POOLS.get(key)
+    if pool is None:
+        pool = _POOLS[key] = _Pool(domain, lang)
+    return pool
+
+
 def add_optional_enrichment(attrs, lang):
     enrich = GENERIC_ENRICH_ES if lang == ES else GENERIC_ENRICH_EN
     # 0-2 extra generic attributes
@@ -229,33 +276,35 @@ def add_optional_enrichment(attrs, lang):
     return attrs + extras
 
 
-def build_existing_tables(domain, lang, primary_table_name=None):
-    tables = []
-    # Prefer pulling 1-3 related tables from domain entities/support
-    domain_tables = list(domain["entities"][lang].items())
-    support_tables = list(domain.get("support", {}).get(lang, {}).items())
-
-    # Always consider global SUPPORT_TABLES as well
-    global_support = list(SUPPORT_TABLES[lang].items())
-
-    # Candidate pools (avoid primary table duplication)
-    def filtered(pool):
-        return [item for item in pool if item[0] != primary_table_name]
+def _sample_tables(pool: _Pool, excluded=()):
+    """1-3 tablas distintas del pool al azar, sin las posiciones ``excluded``.
 
-    pool = filtered(domain_tables) + filtered(support_tables) + filtered(global_support)
+    Equivale a barajar el pool filtrado y tomar las primeras, pero es O(k):
+    se sortean índices y se descartan los excluidos o repetidos.
+    """
+    m = len(pool.tables)
+    n = random.randint(1, min(3, m - len(excluded)))
+    seen = set(excluded)
+    picked = []
+    while len(picked) < n:
+        i = random.randrange(m)
+        if i not in seen:
+            seen.add(i)
+            picked.append(pool.tables[i])
+    return picked
 
-    random.shuffle(pool)
-    n = random.randint(1, min(3, len(pool)))
-    selected = pool[:n]
 
-    for name, attrs in selected:
-        tables.append({"nombre": name, "atributos": attrs[:]})
-    return tables
+def build_existing_tables(domain, lang, primary_table_name=None):
+    # Prefer pulling 1-3 related tables from domain entities/support and global SUPPORT_TABLES
+    pool = _pool(domain, lang)
+    excluded = pool.positions.get(primary_table_name, ())
+    return [{"nombre": name, "atributos": attrs[:]} for name, attrs in _sample_tables(pool, excluded)]
 
 
 def generate_type_A(domain, lang):
     # Entity definition based on a chosen entity from domain
-    entity_name, attrs = random.choice(list(domain["entities"][lang].items()))
+    pool = _pool(domain, lang)
+    entity_name, attrs = random.choice(pool.entities)
     output_attrs = add_optional_enrichment(attrs[:], lang)
     existing = build_existing_tables(domain, lang, primary_table_name=entity_name)
     return {
@@ -266,47 +315,29 @@ def generate_type_A(domain, lang):
 
 def generate_type_B(domain, lang):
     # Relation suggestion: pick from domain relations when possible, otherwise synthesize using two random entities
-    relations = domain.get("relations", {}).get(lang, [])
-    if relations:
-        name, attrs, related = random.choice(relations)
+    pool = _pool(domain, lang)
+    if pool.relations:
+        name, attrs, related, related_names = random.choice(pool.relations)
         output = {"tabla_sugerida": name, "atributos": add_optional_enrichment(attrs[:], lang)}
         # Build existing tables from related names plus one extra random
-        existing = []
-        for rname in related:
-            # resolve attributes for this related name
-            attrs_map = domain["entities"][lang]
-            if rname in attrs_map:
-                existing.append({"nombre": rname, "atributos": attrs_map[rname][:]})
-            else:
-                # try support tables
-                sup_map = domain.get("support", {}).get(lang, {})
-                global_sup = SUPPORT_TABLES[lang]
-                if rname in sup_map:
-                    existing.append({"nombre": rname, "atributos": sup_map[rname][:]})
-                elif rname in global_sup:
-                    existing.append({"nombre": rname, "atributos": global_sup[rname][:]})
+        existing = [{"nombre": rname, "atributos": rattrs[:]} for rname, rattrs in related]
         # maybe add one more random table
-        maybe_extra = build_existing_tables(domain, lang)
-        for t in maybe_extra:
-            if all(t["nombre"] != e["nombre"] for e in existing):
-                existing.append(t)
+        for t_name, t_attrs in _sample_tables(pool):
+            if t_name not in related_names:
+                existing.append({"nombre": t_name, "atributos": t_attrs[:]})
                 break
         return {"input": {"tablas_existentes": existing}, "output": output}
 
     # Fallback: synthesize relation between two random entities
-    entities = list(domain["entities"][lang].items())
+    entities = pool.entities
     if len(entities) < 2:
         return generate_type_A(domain, lang)
-    (a_name, _), (b_name, _) = random.sample(entities, 2)
-    if lang == ES:
-        sugg_name = f"{a_name}_{b_name}_rel"
-        attrs = ["id", f"{a_name}_id", f"{b_name}_id", "fecha"]
-    else:
-        sugg_name = f"{a_name}_{b_name}_rel"
-        attrs = ["id", f"{a_name}_id", f"{b_name}_id", "date"]
+    (a_name, a_attrs), (b_name, b_attrs) = random.sample(entities, 2)
+    sugg_name = f"{a_name}_{b_name}_rel"
+    attrs = ["id", f"{a_name}_id", f"{b_name}_id", "fecha" if lang == ES else "date"]
     existing = [
-        {"nombre": a_name, "atributos": domain["entities"][lang][a_name][:]},
-        {"nombre": b_name, "atributos": domain["entities"][lang][b_name][:]},
+        {"nombre": a_name, "atributos": a_attrs[:]},
+        {"nombre": b_name, "atributos": b_attrs[:]},
     ]
     return {
         "input": {"tablas_existentes": existing},
@@ -323,6 +354,126 @@ def generate_example():
     return generate_type_B(domain, lang)
 
 
+def _first_k(rng, n_rows: int, m: int, k: int, excluded=None):
+    """Para cada fila, ``k`` índices distintos de ``range(m)`` en orden aleatorio
+    (claves aleatorias + argpartition); los ``excluded`` (máscara n_rows x m) van al final."""
+    keys = rng.random((n_rows, m))
+    if excluded is not None:
+        keys[excluded] = 2.0
+    k = min(k, m)
+    part = np.argpartition(keys, k - 1, axis=1)[:, :k] if k < m else np.tile(np.arange(m), (n_rows, 1))
+    order = np.argsort(np.take_along_axis(keys, part, axis=1), axis=1)
+    return np.take_along_axis(part, order, axis=1)
+
+
+@contextmanager
+def _gc_paused():
+    # los ejemplos no forman ciclos: sin pausar el GC, cada pasada recorre
+    # todos los ya generados y domina el coste de un lote
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def generate_batch(n: int, seed=None):
+    """Genera ``n`` ejemplos de una vez con la misma distribución que ``generate_example``.
+
+    Todas las decisiones aleatorias (dominio, idioma, tipo, entidad, relación,
+    tablas existentes y enriquecimiento) se sortean con NumPy en arrays por
+    grupo dominio/idioma; Python solo ensambla los diccionarios.
+    """
+    with _gc_paused():
+        return _generate_batch(n, seed)
+
+
+def _generate_batch(n: int, seed=None):
+    rng = np.random.default_rng(seed)
+    domain_idx = rng.integers(len(DOMAINS), size=n)
+    lang_es = rng.random(n) < 0.5
+    type_a = rng.random(n) < 0.6
+    n_extras = rng.integers(0, 3, size=n)
+    out = [None] * n
+
+    for d, domain in enumerate(DOMAINS):
+        for lang, es in ((ES, True), (EN, False)):
+            rows = np.flatnonzero((domain_idx == d) & (lang_es == es))
+            if rows.size == 0:
+                continue
+            pool = _pool(domain, lang)
+            m = len(pool.tables)
+            enrich = pool.enrich
+            picked = _first_k(rng, rows.size, len(enrich), 2).tolist()
+            extras = [[enrich[i] for i in picked[p][:k]] for p, k in enumerate(n_extras[rows].tolist())]
+            # sin relaciones (o sin 2 entidades para sintetizarla) el tipo B cae en el A
+            a_mask = type_a[rows] | (not pool.relations and len(pool.entities) < 2)
+
+            a_pos = np.flatnonzero(a_mask)
+            if a_pos.size:
+                ent = rng.integers(len(pool.entities), size=a_pos.size)
+                excluded = pool.excluded[ent]
+                counts = rng.integers(1, np.minimum(3, m - excluded.sum(axis=1)) + 1)
+                picks = _first_k(rng, a_pos.size, m, 3, excluded).tolist()
+                for r, p, e, pick, c in zip(rows[a_pos].tolist(), a_pos.tolist(), ent.tolist(), picks,
+                                            counts.tolist()):
+                    name, attrs = pool.entities[e]
+                    out[r] = {
+                        "input": {
+                            "tabla": name,
+                            "tablas_existentes": [
+                                {"nombre": pool.tables[i][0], "atributos": pool.tables[i][1][:]} for i in pick[:c]
+                            ],
+                        },
+                        "output": attrs + extras[p],
+                    }
+
+            b_pos = np.flatnonzero(~a_mask)
+            if not b_pos.size:
+                continue
+            if pool.relations:
+                rel = rng.integers(len(pool.relations), size=b_pos.size).tolist()
+                counts = rng.integers(1, min(3, m) + 1, size=b_pos.size).tolist()
+                picks = _first_k(rng, b_pos.size, m, 3).tolist()
+                for r, p, k, pick, c in zip(rows[b_pos].tolist(), b_pos.tolist(), rel, picks, counts):
+                    name, attrs, related, related_names = pool.relations[k]
+                    existing = [{"nombre": rn, "atributos": ra[:]} for rn, ra in related]
+                    for i in pick[:c]:
+                        t_name, t_attrs = pool.tables[i]
+                        if t_name not in related_names:
+                            existing.append({"nombre": t_name, "atributos": t_attrs[:]})
+                            break
+                    out[r] = {"input": {"tablas_existentes": existing},
+                              "output": {"tabla_sugerida": name, "atributos": attrs + extras[p]}}
+            else:
+                pairs = _first_k(rng, b_pos.size, len(pool.entities), 2).tolist()
+                date = "fecha" if lang == ES else "date"
+                for r, p, (ia, ib) in zip(rows[b_pos].tolist(), b_pos.tolist(), pairs):
+                    (a_name, a_attrs), (b_name, b_attrs) = pool.entities[ia], pool.entities[ib]
+                    out[r] = {
+                        "input": {"tablas_existentes": [{"nombre": a_name, "atributos": a_attrs[:]},
+                                                        {"nombre": b_name, "atributos": b_attrs[:]}]},
+                        "output": {"tabla_sugerida": f"{a_name}_{b_name}_rel",
+                                   "atributos": ["id", f"{a_name}_id", f"{b_name}_id", date] + extras[p]},
+                    }
+    return out
+
+
+# mismo resultado que json.dumps(..., sort_keys=True, ensure_ascii=False) sin crear un encoder por línea
+_CANONICAL = json.JSONEncoder(ensure_ascii=False, sort_keys=True).encode
+
+
+def canonical_line(example) -> str:
+    return _CANONICAL(example)
+
+
+def fingerprint(line: str) -> int:
+    """Huella de 64 bits de un ejemplo serializado (mucho más compacta que el string)."""
+    return int.from_bytes(hashlib.blake2b(line.encode("utf-8"), digest_size=8).digest(), "little")
+
+
 def load_json(path: Path):
     if not path.exists() or path.stat().st_size == 0:
         return []
@@ -335,40 +486,138 @@ def save_json(path: Path, data):
         json.dump(data, f, ensure_ascii=False, indent=2)
 
 
+def scan_jsonl(path: Path, seen=None) -> int:
+    """Cuenta los ejemplos de un JSONL existente y, si se pide, registra sus huellas."""
+    if not path.exists():
+        return 0
+    total = 0
+    with path.open("r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            total += 1
+            if seen is not None:
+                seen.add(fingerprint(canonical_line(json.loads(line))))
+    return total
+
+
+def _generate_chunk(task):
+    """Genera ``count`` ejemplos serializados; con semilla es determinista (apto para workers)."""
+    seed, count = task
+    with _gc_paused():
+        return [canonical_line(ex) for ex in _generate_batch(count, seed)]
+
+
+def iter_generated(count: int, workers: int = 1, seed=None, chunk_size: int = 10_000):
+    """Produce lotes de ejemplos serializados repartiendo el trabajo en ``workers`` procesos.
+
+    Cada lote usa la semilla ``seed + índice`` (o ninguna si ``seed`` es None),
+    así la misma invocación reproduce el mismo corpus.
+    """
+    if seed is None and workers > 1:
+        # los procesos hijos heredan el estado de random: sin semilla generarían lo mismo
+        seed = random.randrange(2 ** 32)
+    chunk_size = max(1, min(chunk_size, -(-count // max(1, workers))))
+    tasks = []
+    remaining = count
+    while remaining > 0:
+        n = min(chunk_size, remaining)
+        tasks.append((None if seed is None else seed + len(tasks), n))
+        remaining -= n
+    if workers <= 1:
+        for task in tasks:
+            yield _generate_chunk(task)
+        return
+    with Pool(processes=workers) as pool:
+        yield from pool.imap(_generate_chunk, tasks)
+
+
+def generate_lines(count: int, seen=None, workers: int = 1, seed=None, chunk_size: int = 10_000):
+    """Itera hasta ``count`` ejemplos nuevos, descartando duplicados si se pasa ``seen``."""
+    added = 0
+    tries = 0
+    max_tries = count * 10
+    round_idx = 0
+    while added < count and tries < max_tries:
+        pending = count - added
+        # cada ronda usa semillas distintas para no repetir los mismos lotes
+        round_seed = None if seed is None else seed + round_idx * 1_000_003
+        round_idx += 1
+        for chunk in iter_generated(pending, workers, round_seed, chunk_size):
+            for line in chunk:
+                tries += 1
+                if seen is not None:
+                    fp = fingerprint(line)
+                    if fp in seen:
+                        continue
+                    seen.add(fp)
+                yield line
+                added += 1
+                if added >= count:
+                    return
+        if seen is None:
+            return
+
+
 def main():
     parser = argparse.ArgumentParser(description="Generate and append training examples to tables_train.json")
-    parser.add_argument("--file", default="tables_train.json", help="Path to the JSON file")
+    parser.add_argument("--file", default="tables_train.json", help="Path to the JSON/JSONL file")
     parser.add_argument("--count", type=int, default=500, help="How many examples to generate")
-    parser.add_argument("--dedupe", action="store_true", help="Try to avoid duplicates by simple hashing")
+    parser.add_argument("--dedupe", action="store_true", help="Try to avoid duplicates by 64-bit hashing")
+    parser.add_argument("--format", choices=["json", "jsonl", "columnar"], default=None,
+                        help="Output format (default: jsonl for .jsonl files, columnar for .columnar "
+                             "directories, json otherwise)")
+    parser.add_argument("--workers", type=int, default=1, help="Generator processes")
+    parser.add_argument("--seed", type=int, default=None, help="Base seed; chunk i uses seed + i")
+    parser.add_argument("--chunk-size", type=int, default=10_000, help="Examples per worker task")
     args = parser.parse_args()
 
     path = Path(args.file)
-    data = load_json(path)
-
-    # Simple deduplication via a set of stringified fingerprints
-    seen = set()
-    if args.dedupe:
-        for item in data:
-            seen.add(json.dumps(item, sort_keys=True, ensure_ascii=False))
-
-    added = 0
-    tries = 0
-    max_tries = args.count * 10
-
-    while added < args.count and tries < max_tries:
-        ex = generate_example()
-        tries += 1
-        if args.dedupe:
-            fp = json.dumps(ex, sort_keys=True, ensure_ascii=False)
-            if fp in seen:
-                continue
-            seen.add(fp)
-        data.append(ex)
-        added += 1
-
-    save_json(path, data)
-
-    print(f"Added {added} examples. Total now: {len(data)}. File: {path}")
+    fmt = args.format or {".jsonl": "jsonl", ".columnar": "columnar"}.get(path.suffix, "json")
+    seen = set() if args.dedupe else None
+
+    if fmt == "columnar":
+        # cadenas internadas y arrays de enteros (ver dataset.py); también en modo append
+        from dataset import ColumnarDataset, ColumnarWriter, is_columnar
+
+        existing = 0
+        if is_columnar(path):
+            ds = ColumnarDataset(path)
+            existing = len(ds)
+            if seen is not None:
+                for item in ds.iter_examples():
+                    seen.add(fingerprint(canonical_line(item)))
+        added = 0
+        with ColumnarWriter(path) as writer:
+            for line in generate_lines(args.count, seen, args.workers, args.seed, args.chunk_size):
+                writer.add(json.loads(line))
+                added += 1
+        total = existing + added
+    elif fmt == "jsonl":
+        # modo append: los ejemplos se escriben en streaming, sin reescribir el fichero
+        existing = scan_jsonl(path, seen)
+        added = 0
+        with path.open("a", encoding="utf-8") as f:
+            for line in generate_lines(args.count, seen, args.workers, args.seed, args.chunk_size):
+                f.write(line + "\n")
+                added += 1
+        total = existing + added
+    else:
+        data = load_json(path)
+        if seen is not None:
+            for item in data:
+                seen.add(fingerprint(canonical_line(item)))
+        new_items = [
+            json.loads(line)
+            for line in generate_lines(args.count, seen, args.workers, args.seed, args.chunk_size)
+        ]
+        added = len(new_items)
+        data.extend(new_items)
+        save_json(path, data)
+        total = len(data)
+
+    print(f"Added {added} examples. Total now: {total}. File: {path}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,179 @@
+"""Ejecutor acotado para la inferencia de los modelos.
+
+Las llamadas a ``predict()`` (CPU) se ejecutan en un pool de hilos de tamaño
+fijo con una cola de espera limitada. Si la cola está llena se rechaza de
+inmediato con ``Overloaded`` para que el servicio responda 503 + Retry-After
+en lugar de acumular peticiones y dejar sin respuesta a ``/health``.
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+from metrics import Histogram, SIZE_BUCKETS
+
+
+class Overloaded(RuntimeError):
+    pass
+
+
+class InferenceExecutor:
+    def __init__(self, max_workers: int = 2, max_queue: int = 32, timeout: Optional[float] = 30.0):
+        self.max_workers = max(1, int(max_workers))
+        self.max_queue = max(0, int(max_queue))
+        self.timeout = timeout
+        self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="inference")
+        # plazas = hilos ocupados + peticiones en cola
+        self._slots = threading.BoundedSemaphore(self.max_workers + self.max_queue)
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+
+    @property
+    def saturated(self) -> bool:
+        """Sin plazas libres: permite rechazar antes de leer y parsear el cuerpo."""
+        with self._lock:
+            return self.in_flight >= self.max_workers + self.max_queue
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise Overloaded("Cola de inferencia llena")
+        with self._lock:
+            self.in_flight += 1
+        try:
+            future = self._pool.submit(fn, *args, **kwargs)
+        except Exception:
+            self._release(None)
+            raise
+        future.add_done_callback(self._release)
+        return future
+
+    def run(self, fn: Callable, *args, **kwargs) -> Any:
+        return self.submit(fn, *args, **kwargs).result(timeout=self.timeout)
+
+    def _release(self, _future) -> None:
+        with self._lock:
+            self.in_flight -= 1
+            self.completed += 1
+        self._slots.release()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "in_flight": self.in_flight,
+                "completed": self.completed,
+                "rejected": self.rejected,
+            }
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+class MicroBatcher:
+    """Agrupa predicciones concurrentes en una sola llamada a ``predict()``.
+
+    Un hilo en segundo plano junta los elementos que llegan durante
+    ``max_wait`` segundos (o hasta ``max_batch`` elementos), los agrupa por
+    modelo y ejecuta un ``predict()`` por grupo en el ``InferenceExecutor``,
+    resolviendo el ``Future`` de cada llamante.
+    """
+
+    def __init__(
+        self,
+        executor: InferenceExecutor,
+        max_wait: float = 0.002,
+        max_batch: int = 64,
+        max_pending: int = 1024,
+    ):
+        self.executor = executor
+        self.max_wait = max(0.0, max_wait)
+        self.max_batch = max(1, int(max_batch))
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max(1, int(max_pending)))
+        self.batch_sizes = Histogram(SIZE_BUCKETS)
+        self.queue_wait = Histogram()
+        self.predict_latency = Histogram()
+        self.rejected = 0
+        self._thread = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, key: Hashable, model: Any, entradas: List[str]) -> List[Future]:
+        """Encola ``entradas`` para ``model``; ``key`` identifica el modelo (versión, tipo)."""
+        futures = []
+        now = time.perf_counter()
+        for entrada in entradas:
+            future: Future = Future()
+            try:
+                self._queue.put_nowait((key, model, entrada, future, now))
+            except queue.Full:
+                self.rejected += 1
+                for f in futures:
+                    f.cancel()
+                raise Overloaded("Cola de micro-batching llena")
+            futures.append(future)
+        return futures
+
+    def _run(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.perf_counter() + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._dispatch(batch)
+
+    def _dispatch(self, batch: List[Tuple]) -> None:
+        start = time.perf_counter()
+        groups: Dict[Hashable, List[Tuple]] = {}
+        for item in batch:
+            if item[3].set_running_or_notify_cancel():
+                groups.setdefault(item[0], []).append(item)
+                self.queue_wait.observe(start - item[4])
+        for items in groups.values():
+            self.batch_sizes.observe(len(items))
+            model = items[0][1]
+            try:
+                future = self.executor.submit(self._predict, model, [it[2] for it in items])
+            except Exception as e:
+                for it in items:
+                    it[3].set_exception(e)
+                continue
+            future.add_done_callback(lambda f, items=items: self._resolve(f, items))
+
+    def _predict(self, model: Any, entradas: List[str]):
+        start = time.perf_counter()
+        try:
+            return model.predict(entradas)
+        finally:
+            self.predict_latency.observe(time.perf_counter() - start)
+
+    @staticmethod
+    def _resolve(result: Future, items: List[Tuple]) -> None:
+        error = result.exception()
+        if error is not None:
+            for it in items:
+                it[3].set_exception(error)
+            return
+        for it, pred in zip(items, result.result()):
+            it[3].set_result(pred)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_wait_ms": self.max_wait * 1000,
+            "max_batch": self.max_batch,
+            "pending": self._queue.qsize(),
+            "rejected": self.rejected,
+            "batch_size": self.batch_sizes.snapshot(),
+            "queue_wait_seconds": self.queue_wait.snapshot(),
+            "predict_seconds": self.predict_latency.snapshot(),
+        }
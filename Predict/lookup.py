@@ -0,0 +1,136 @@
+"""Tabla de consulta exacta delante de los modelos.
+
+La mayoría de las peticiones piden entidades canónicas que ya existen tal
+cual en ``DOMAINS`` o en tables_train.json (``cliente``, ``producto``,
+``order``...). Para esas no hace falta vectorizar ni predecir: se responde
+desde un diccionario por nombre normalizado construido una vez al arrancar.
+
+- atributos: nombre de tabla -> atributos, por idioma. Si un nombre existe
+  en ES y en EN con atributos distintos se elige el idioma mayoritario de
+  las tablas existentes del diagrama.
+- relación: conjunto de nombres de tablas del diagrama -> (tabla sugerida,
+  atributos), de las ``relations`` de cada dominio y de las entradas de
+  entrenamiento.
+
+Prioridad: ``entities`` de los dominios, luego ``support`` y
+``SUPPORT_TABLES``, y por último la salida más frecuente en el corpus para
+nombres que no aparecen en ``DOMAINS``.
+"""
+from collections import Counter
+from typing import Callable, Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+from features import example_texts
+
+LANGS = ("es", "en")
+
+
+class ExactLookup:
+    def __init__(self, normalize: Callable[[str], str]):
+        self.normalize = normalize
+        self._atributos: Dict[str, Dict[str, List[str]]] = {}
+        self._relaciones: Dict[FrozenSet[str], Tuple[str, List[str]]] = {}
+        self._lang: Dict[str, set] = {lang: set() for lang in LANGS}
+
+    @classmethod
+    def build(cls, normalize: Callable[[str], str], domains: Iterable[Dict],
+              support_tables: Optional[Dict[str, Dict]] = None,
+              examples: Iterable[Dict] = ()) -> "ExactLookup":
+        lookup = cls(normalize)
+        domains = list(domains)
+        for section in ("entities", "support"):
+            for d in domains:
+                for lang, tables in (d.get(section) or {}).items():
+                    for nombre, attrs in (tables or {}).items():
+                        lookup._add_atributos(lang, nombre, attrs)
+        for lang, tables in (support_tables or {}).items():
+            for nombre, attrs in tables.items():
+                lookup._add_atributos(lang, nombre, attrs)
+        for d in domains:
+            for lang, relations in (d.get("relations") or {}).items():
+                for nombre, attrs, related in relations or []:
+                    lookup._relaciones.setdefault(lookup._key(related), (nombre, list(attrs)))
+        lookup._add_examples(examples)
+        return lookup
+
+    def _key(self, nombres: Iterable[str]) -> FrozenSet[str]:
+        return frozenset(self.normalize(str(n)) for n in nombres)
+
+    def _add_atributos(self, lang: str, nombre: str, attrs: List[str]) -> None:
+        lang = lang.lower()
+        key = self.normalize(nombre)
+        self._lang.setdefault(lang, set()).add(key)
+        self._atributos.setdefault(key, {}).setdefault(lang, list(attrs))
+
+    def _add_examples(self, examples: Iterable[Dict]) -> None:
+        """Salida más frecuente del corpus para entradas que DOMAINS no cubre."""
+        atributos: Dict[str, Counter] = {}
+        relaciones: Dict[FrozenSet[str], Counter] = {}
+        for ex in examples:
+            try:
+                kind, _, salida = example_texts(ex)
+                inp = ex["input"]
+                nombres = [t["nombre"] for t in inp.get("tablas_existentes") or []]
+            except (KeyError, TypeError):
+                continue
+            if kind == "atributos":
+                key = self.normalize(str(inp["tabla"]))
+                if key not in self._atributos:
+                    atributos.setdefault(key, Counter())[salida] += 1
+            else:
+                key = self._key(nombres)
+                if key and key not in self._relaciones:
+                    relaciones.setdefault(key, Counter())[salida] += 1
+        for key, counts in atributos.items():
+            self._atributos[key] = {"": counts.most_common(1)[0][0].split()}
+        for key, counts in relaciones.items():
+            partes = counts.most_common(1)[0][0].split()
+            if partes:
+                self._relaciones[key] = (partes[0], partes[1:])
+
+    def export(self) -> Dict[str, list]:
+        """Tablas en forma serializable, con los nombres ya normalizados."""
+        return {
+            "atributos": [[key, lang, attrs] for key, by_lang in self._atributos.items()
+                          for lang, attrs in by_lang.items()],
+            "relaciones": [[sorted(key), nombre, attrs] for key, (nombre, attrs) in self._relaciones.items()],
+        }
+
+    @classmethod
+    def from_export(cls, normalize: Callable[[str], str], data: Dict[str, list]) -> "ExactLookup":
+        lookup = cls(normalize)
+        for key, lang, attrs in data["atributos"]:
+            lookup._atributos.setdefault(key, {})[lang] = attrs
+            if lang:
+                lookup._lang.setdefault(lang, set()).add(key)
+        for names, nombre, attrs in data["relaciones"]:
+            lookup._relaciones[frozenset(names)] = (nombre, attrs)
+        return lookup
+
+    def language(self, nombres: Iterable[str]) -> Optional[str]:
+        """Idioma mayoritario de un diagrama según los nombres conocidos."""
+        votes = Counter()
+        for n in nombres:
+            key = self.normalize(str(n))
+            for lang in LANGS:
+                if key in self._lang.get(lang, ()):
+                    votes[lang] += 1
+        return votes.most_common(1)[0][0] if votes else None
+
+    def atributos(self, tabla: str, existentes: Iterable[str] = ()) -> Optional[List[str]]:
+        by_lang = self._atributos.get(self.normalize(str(tabla)))
+        if not by_lang:
+            return None
+        if len(by_lang) > 1:
+            lang = self.language(existentes)
+            if lang in by_lang:
+                return by_lang[lang]
+        return next(iter(by_lang.values()))
+
+    def relacion(self, existentes: Iterable[str]) -> Optional[Tuple[str, List[str]]]:
+        return self._relaciones.get(self._key(existentes))
+
+    def relaciones_conocidas(self) -> Dict[FrozenSet[str], Tuple[str, List[str]]]:
+        return self._relaciones
+
+    def stats(self) -> Dict[str, int]:
+        return {"atributos_entries": len(self._atributos), "relacion_entries": len(self._relaciones)}
@@ -0,0 +1,209 @@
+"""Métricas en proceso del servicio Predict."""
+import bisect
+import logging
+import queue
+import random
+import threading
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+# segundos: de 0.1 ms a 10 s
+LATENCY_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+    0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024)
+
+
+class Histogram:
+    """Histograma de buckets fijos; ``observe`` es O(log buckets) y seguro entre hilos."""
+
+    def __init__(self, buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.buckets: List[float] = sorted(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[idx] += 1
+            self.count += 1
+            self.sum += value
+
+    def quantile(self, q: float) -> float:
+        """Estimación por el límite superior del bucket que contiene el cuantil.
+
+        Los valores por encima del último bucket se reportan como ese límite.
+        """
+        with self._lock:
+            counts = list(self._counts)
+            total = self.count
+        if not total:
+            return 0.0
+        rank = q * total
+        acc = 0
+        for i, c in enumerate(counts):
+            acc += c
+            if acc >= rank:
+                return self.buckets[min(i, len(self.buckets) - 1)]
+        return self.buckets[-1]
+
+    def cumulative(self) -> List[int]:
+        with self._lock:
+            counts = list(self._counts)
+        out = []
+        acc = 0
+        for c in counts:
+            acc += c
+            out.append(acc)
+        return out
+
+    def snapshot(self) -> Dict[str, Any]:
+        cumulative = self.cumulative()
+        count = cumulative[-1]
+        return {
+            "count": count,
+            "sum": self.sum,
+            "mean": (self.sum / count) if count else 0.0,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+            "buckets": {str(le): n for le, n in zip(self.buckets, cumulative)},
+        }
+
+
+class Counter:
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1) -> None:
+        with self._lock:
+            self.value += amount
+
+
+def _label_str(labels: Tuple[Tuple[str, str], ...], extra: str = "") -> str:
+    parts = [f'{k}="{v}"' for k, v in labels]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class MetricsRegistry:
+    """Contadores e histogramas con etiquetas, exportables en formato Prometheus o JSON."""
+
+    def __init__(self):
+        self._counters: Dict[Tuple[str, Tuple], Counter] = {}
+        self._histograms: Dict[Tuple[str, Tuple], Histogram] = {}
+        self._collectors: List[Tuple[str, Callable[[], Dict[str, Any]]]] = []
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, **labels: str) -> Counter:
+        key = (name, tuple(sorted(labels.items())))
+        metric = self._counters.get(key)
+        if metric is None:
+            with self._lock:
+                metric = self._counters.setdefault(key, Counter())
+        return metric
+
+    def histogram(self, name: str, buckets: Sequence[float] = LATENCY_BUCKETS, **labels: str) -> Histogram:
+        key = (name, tuple(sorted(labels.items())))
+        metric = self._histograms.get(key)
+        if metric is None:
+            with self._lock:
+                metric = self._histograms.setdefault(key, Histogram(buckets))
+        return metric
+
+    def register_histogram(self, name: str, histogram: Histogram, **labels: str) -> None:
+        """Publica un histograma creado fuera del registro (p. ej. el del micro-batcher)."""
+        with self._lock:
+            self._histograms[(name, tuple(sorted(labels.items())))] = histogram
+
+    def add_collector(self, prefix: str, fn: Callable[[], Dict[str, Any]]) -> None:
+        """Publica como gauges los valores numéricos que devuelva ``fn`` en cada lectura."""
+        self._collectors.append((prefix, fn))
+
+    def _collected(self) -> Dict[str, Dict[str, Any]]:
+        out = {}
+        for prefix, fn in self._collectors:
+            try:
+                out[prefix] = fn()
+            except Exception:
+                out[prefix] = {}
+        return out
+
+    def snapshot(self) -> Dict[str, Any]:
+        counters: Dict[str, List] = {}
+        for (name, labels), c in sorted(self._counters.items()):
+            counters.setdefault(name, []).append({"labels": dict(labels), "value": c.value})
+        histograms: Dict[str, List] = {}
+        for (name, labels), h in sorted(self._histograms.items()):
+            histograms.setdefault(name, []).append({"labels": dict(labels), **h.snapshot()})
+        return {"counters": counters, "histograms": histograms, **self._collected()}
+
+    def render_prometheus(self) -> str:
+        lines: List[str] = []
+        typed = set()
+        for (name, labels), c in sorted(self._counters.items()):
+            if name not in typed:
+                lines.append(f"# TYPE {name} counter")
+                typed.add(name)
+            lines.append(f"{name}{_label_str(labels)} {c.value}")
+        for (name, labels), h in sorted(self._histograms.items()):
+            if name not in typed:
+                lines.append(f"# TYPE {name} histogram")
+                typed.add(name)
+            cumulative = h.cumulative()
+            for le, n in zip(list(h.buckets) + ["+Inf"], cumulative):
+                le_label = 'le="%s"' % le
+                lines.append(f"{name}_bucket{_label_str(labels, le_label)} {n}")
+            lines.append(f"{name}_sum{_label_str(labels)} {h.sum}")
+            lines.append(f"{name}_count{_label_str(labels)} {cumulative[-1]}")
+        for prefix, values in self._collected().items():
+            for key, value in sorted(values.items()):
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                lines.append(f"# TYPE {prefix}_{key} gauge")
+                lines.append(f"{prefix}_{key} {value}")
+        return "\n".join(lines) + "\n"
+
+
+class SampledPayloadLogger:
+    """Log de payloads para depuración: muestreado y escrito desde un hilo aparte.
+
+    El hilo de la petición solo decide si muestrea y encola los bytes crudos;
+    decodificar, truncar y escribir el log ocurre en segundo plano. Si la
+    cola está llena el registro se descarta.
+    """
+
+    def __init__(self, rate: float = 0.0, max_bytes: int = 2048, max_queue: int = 1000,
+                 logger: Optional[logging.Logger] = None):
+        self.rate = max(0.0, min(1.0, rate))
+        self.max_bytes = max_bytes
+        self.dropped = 0
+        self._logger = logger or logging.getLogger("predict.payload")
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max_queue)
+        self._thread: Optional[threading.Thread] = None
+        if self.rate > 0:
+            self._thread = threading.Thread(target=self._run, name="payload-logger", daemon=True)
+            self._thread.start()
+
+    def maybe_log(self, method: str, path: str, get_body: Callable[[], bytes]) -> None:
+        """``get_body`` solo se invoca si la petición sale en la muestra."""
+        if self.rate <= 0 or random.random() >= self.rate:
+            return
+        body = get_body() or b""
+        try:
+            self._queue.put_nowait((method, path, body[: self.max_bytes], len(body)))
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self) -> None:
+        while True:
+            method, path, body, size = self._queue.get()
+            try:
+                text = body.decode("utf-8", errors="replace")
+                self._logger.info(f"Payload sample {method} {path} ({size} bytes): {text}")
+            except Exception:
+                pass
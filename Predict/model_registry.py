@@ -0,0 +1,231 @@
+"""Registro de modelos del servicio Predict.
+
+Carga perezosa o en segundo plano, artefactos joblib mapeados en memoria
+(los workers de gunicorn comparten páginas en lugar de duplicarlas) y
+reemplazo atómico de versión sin reiniciar el proceso.
+
+Estructura en disco (``MODEL_DIR``, por defecto el directorio actual)::
+
+    modelo_tablas.pkl                 # formato heredado
+    modelo_tablas_relacion.pkl
+    models/CURRENT                    # nombre de la versión activa
+    models/<version>/modelo_tablas.joblib
+    models/<version>/modelo_tablas_relacion.joblib
+    models/<version>/metadata.json
+
+Uso: ``python model_registry.py export --version v1 --set-current``
+convierte los ``.pkl`` heredados a una versión joblib. Las versiones que
+crea ``compress.py`` (pesos dispersos float32) usan los mismos nombres de
+fichero y se cargan igual.
+"""
+import argparse
+import json
+import logging
+import os
+import pickle
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+
+MODEL_FILES = {
+    "atributos": "modelo_tablas",
+    "relacion": "modelo_tablas_relacion",
+}
+LEGACY_VERSION = "legacy"
+
+
+class ModelNotReady(RuntimeError):
+    pass
+
+
+def _load_artifact(path: Path, mmap_mode: Optional[str]) -> Any:
+    if path.suffix == ".joblib":
+        import joblib  # diferido: no retrasa el arranque del servicio
+
+        # los arrays numpy grandes se mapean en memoria en lugar de copiarse
+        return joblib.load(path, mmap_mode=mmap_mode)
+    with path.open("rb") as f:
+        return pickle.load(f)
+
+
+class ModelRegistry:
+    def __init__(self, base_dir: str = ".", mmap_mode: Optional[str] = "r"):
+        self.base_dir = Path(base_dir)
+        self.mmap_mode = mmap_mode
+        # (version, {kind: modelo}); se reemplaza entero para que el swap sea atómico
+        self._snapshot: Optional[Tuple[str, Dict[str, Any]]] = None
+        self._load_lock = threading.RLock()
+        self._loading = False
+        # ``error``: no hay modelos por un fallo de carga; ``last_reload_error``: falló
+        # una recarga pero sigue sirviendo la versión anterior (el servicio está listo)
+        self.error: Optional[str] = None
+        self.last_reload_error: Optional[str] = None
+        self.loaded_at: Optional[float] = None
+        self.load_seconds: Optional[float] = None
+        self.paths: Dict[str, str] = {}
+
+    @property
+    def models_dir(self) -> Path:
+        return self.base_dir / "models"
+
+    @property
+    def ready(self) -> bool:
+        return self._snapshot is not None
+
+    @property
+    def version(self) -> Optional[str]:
+        snap = self._snapshot
+        return snap[0] if snap else None
+
+    def current_version(self) -> Optional[str]:
+        env_version = os.environ.get("MODEL_VERSION")
+        if env_version:
+            return env_version
+        pointer = self.models_dir / "CURRENT"
+        if pointer.exists():
+            name = pointer.read_text(encoding="utf-8").strip()
+            return name or None
+        return None
+
+    def check_version(self, version: str) -> Path:
+        """Carpeta de la versión; solo nombres simples de carpetas que existen bajo ``models/``."""
+        if not isinstance(version, str) or not version or version in (".", "..") \
+                or any(sep in version for sep in ("/", "\\", os.sep)) or ".." in version:
+            raise ValueError(f"Nombre de versión no válido: {version!r}")
+        folder = self.models_dir / version
+        if not folder.is_dir():
+            raise FileNotFoundError(f"No existe la versión '{version}' en {self.models_dir}")
+        return folder
+
+    def resolve(self, version: Optional[str] = None) -> Tuple[str, Dict[str, Path]]:
+        version = version or self.current_version()
+        folder = self.check_version(version) if version else self.base_dir
+        paths: Dict[str, Path] = {}
+        for kind, stem in MODEL_FILES.items():
+            for suffix in (".joblib", ".pkl"):
+                candidate = folder / (stem + suffix)
+                if candidate.exists():
+                    paths[kind] = candidate
+                    break
+            else:
+                raise FileNotFoundError(f"No se encontró {stem}.joblib/.pkl en {folder}")
+        return version or LEGACY_VERSION, paths
+
+    def load(self, version: Optional[str] = None) -> str:
+        """Carga una versión completa y la publica de una sola vez."""
+        with self._load_lock:
+            self._loading = True
+            start = time.perf_counter()
+            try:
+                resolved, paths = self.resolve(version)
+                models = {kind: _load_artifact(path, self.mmap_mode) for kind, path in paths.items()}
+            except Exception as e:
+                if self._snapshot is None:
+                    self.error = f"{type(e).__name__}: {e}"
+                else:
+                    self.last_reload_error = f"{type(e).__name__}: {e}"
+                logging.exception("Model load failed")
+                raise
+            finally:
+                self._loading = False
+            self._snapshot = (resolved, models)
+            self.paths = {kind: str(path) for kind, path in paths.items()}
+            self.error = self.last_reload_error = None
+            self.loaded_at = time.time()
+            self.load_seconds = time.perf_counter() - start
+            logging.info(f"Models '{resolved}' loaded in {self.load_seconds:.2f}s: {self.paths}")
+            return resolved
+
+    def install(self, models: Dict[str, Any], version: str) -> None:
+        """Publica modelos ya construidos en memoria (benchmarks, modelos de prueba)."""
+        missing = set(MODEL_FILES) - set(models)
+        if missing:
+            raise ValueError(f"Faltan modelos: {sorted(missing)}")
+        with self._load_lock:
+            self._snapshot = (version, dict(models))
+            self.paths = {kind: "<memoria>" for kind in models}
+            self.error = self.last_reload_error = None
+            self.loaded_at = time.time()
+
+    def load_in_background(self) -> threading.Thread:
+        def _run():
+            try:
+                self.load()
+            except Exception:
+                pass  # queda registrado en self.error y en el log
+        t = threading.Thread(target=_run, name="model-loader", daemon=True)
+        t.start()
+        return t
+
+    def snapshot(self, lazy: bool = False) -> Tuple[str, Dict[str, Any]]:
+        snap = self._snapshot
+        if snap is None and lazy:
+            with self._load_lock:
+                if self._snapshot is None:
+                    try:
+                        self.load()
+                    except Exception:
+                        pass
+            snap = self._snapshot
+        if snap is None:
+            raise ModelNotReady(self.error or "Modelos cargándose")
+        return snap
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "ready": self.ready,
+            "loading": self._loading,
+            "version": self.version,
+            "paths": self.paths,
+            "loaded_at": self.loaded_at,
+            "load_seconds": self.load_seconds,
+            "error": self.error,
+            "last_reload_error": self.last_reload_error,
+        }
+
+
+def export(base_dir: str, version: str, source_version: Optional[str] = None, set_current: bool = False) -> Path:
+    """Reescribe una versión existente (o los .pkl heredados) como artefactos joblib mmap-ables."""
+    import joblib
+
+    registry = ModelRegistry(base_dir, mmap_mode=None)
+    _, paths = registry.resolve(source_version)
+    target = registry.models_dir / version
+    target.mkdir(parents=True, exist_ok=True)
+    for kind, path in paths.items():
+        model = _load_artifact(path, None)
+        # sin compresión: es requisito para que joblib pueda mapear los arrays
+        joblib.dump(model, target / (MODEL_FILES[kind] + ".joblib"), compress=0)
+    metadata_path = target / "metadata.json"
+    if not metadata_path.exists():
+        metadata = {
+            "version": version,
+            "exported_at": datetime.now().isoformat(timespec="seconds"),
+            "source": {kind: str(path) for kind, path in paths.items()},
+        }
+        metadata_path.write_text(json.dumps(metadata, indent=2, ensure_ascii=False), encoding="utf-8")
+    if set_current:
+        (registry.models_dir / "CURRENT").write_text(version + "\n", encoding="utf-8")
+    return target
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Herramientas del registro de modelos")
+    sub = parser.add_subparsers(dest="command", required=True)
+    exp = sub.add_parser("export", help="Convierte modelos a artefactos joblib versionados")
+    exp.add_argument("--dir", default=os.environ.get("MODEL_DIR", "."), help="Directorio base de modelos")
+    exp.add_argument("--version", required=True, help="Nombre de la versión a crear")
+    exp.add_argument("--from-version", default=None, help="Versión de origen (por defecto la activa o los .pkl)")
+    exp.add_argument("--set-current", action="store_true", help="Marca la versión como activa")
+    args = parser.parse_args()
+
+    if args.command == "export":
+        target = export(args.dir, args.version, args.from_version, args.set_current)
+        print(f"Exported models to {target}")
+
+
+if __name__ == "__main__":
+    main()
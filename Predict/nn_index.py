@@ -0,0 +1,182 @@
+"""Índice de vecinos más cercanos sobre el corpus de entrenamiento.
+
+Cada ejemplo de tables_train.json se vectoriza una vez (HashingVectorizer +
+idf, normalizado L2) y el índice se guarda traspuesto (features x ejemplos,
+CSR): la similitud coseno de una consulta es un único producto disperso
+``q @ XT`` que solo recorre las listas de los tokens de la consulta, más
+un ``argpartition`` para el top-k. Los tokens presentes en casi todos los
+ejemplos (``id``, ``nombre``...) se excluyen (``max_df``) y, por defecto,
+los ejemplos se agregan en una fila por salida distinta, de modo que el
+coste de consulta no crece con el número de ejemplos del corpus.
+
+    python nn_index.py build --data tables_train.json --out nn_index.npz
+"""
+import argparse
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+import scipy.sparse as sp
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.preprocessing import normalize
+
+from features import example_texts
+
+N_FEATURES = 2 ** 18
+
+
+def _vectorizer(n_features: int) -> HashingVectorizer:
+    return HashingVectorizer(n_features=n_features, alternate_sign=False, norm=None)
+
+
+class KindIndex:
+    """Índice de un tipo de ejemplo ("atributos" o "relacion")."""
+
+    def __init__(self, XT: sp.csr_matrix, idf: np.ndarray, row_label: np.ndarray, labels: List[str]):
+        self.XT = XT
+        self.idf = idf
+        self.row_label = row_label
+        self.labels = labels
+        self.vectorizer = _vectorizer(XT.shape[0])
+
+    @classmethod
+    def build(cls, pairs: Iterable[Tuple[str, str]], n_features: int = N_FEATURES,
+              max_df: float = 0.5, per_example: bool = False) -> "KindIndex":
+        """Por defecto guarda una fila por salida distinta (centroide de sus ejemplos),
+        así el tamaño del índice depende del número de salidas y no del corpus;
+        ``per_example`` conserva una fila por ejemplo distinto."""
+        rows = dict.fromkeys(pairs)  # ejemplos repetidos: una sola fila
+        label_ids: Dict[str, int] = {}
+        row_label = np.fromiter(
+            (label_ids.setdefault(salida, len(label_ids)) for _, salida in rows),
+            dtype=np.int32, count=len(rows),
+        )
+        X = _vectorizer(n_features).transform([entrada for entrada, _ in rows]).tocsc()
+        n_docs = max(1, X.shape[0])
+        df = np.diff(X.indptr)
+        idf = (np.log((1 + n_docs) / (1 + df)) + 1).astype(np.float32)
+        # tokens casi universales: no discriminan y alargarían cada consulta
+        idf[df > max_df * n_docs] = 0.0
+        X = normalize(X.tocsr().multiply(idf).tocsr(), norm="l2")
+        if not per_example:
+            n_labels = len(label_ids)
+            membership = sp.csr_matrix(
+                (np.ones(len(row_label), dtype=np.float32), (row_label, np.arange(len(row_label)))),
+                shape=(n_labels, len(row_label)),
+            )
+            X = normalize(membership @ X, norm="l2")
+            row_label = np.arange(n_labels, dtype=np.int32)
+        XT = X.T.tocsr().astype(np.float32)
+        XT.eliminate_zeros()
+        return cls(XT, idf, row_label, list(label_ids))
+
+    def query(self, entrada: str, k: int = 5) -> List[Tuple[str, float]]:
+        q = self.vectorizer.transform([entrada]).multiply(self.idf).tocsr()
+        q = normalize(q, norm="l2")
+        if q.nnz == 0:
+            return []
+        scores = (q @ self.XT).tocsr()
+        if scores.nnz == 0:
+            return []
+        data, cols = scores.data, scores.indices
+        # se piden más filas que k porque varias filas pueden compartir salida
+        m = min(len(data), k * 4)
+        top = np.argpartition(-data, m - 1)[:m] if m < len(data) else np.arange(len(data))
+        top = top[np.argsort(-data[top], kind="stable")]
+        out: List[Tuple[str, float]] = []
+        seen = set()
+        for i in top:
+            label = int(self.row_label[cols[i]])
+            if label in seen:
+                continue
+            seen.add(label)
+            out.append((self.labels[label], float(data[i])))
+            if len(out) >= k:
+                break
+        return out
+
+    def to_arrays(self, prefix: str) -> Dict[str, np.ndarray]:
+        return {
+            f"{prefix}_data": self.XT.data,
+            f"{prefix}_indices": self.XT.indices,
+            f"{prefix}_indptr": self.XT.indptr,
+            f"{prefix}_shape": np.array(self.XT.shape),
+            f"{prefix}_idf": self.idf,
+            f"{prefix}_row_label": self.row_label,
+            f"{prefix}_labels": np.array(self.labels, dtype=str),
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays, prefix: str) -> "KindIndex":
+        XT = sp.csr_matrix(
+            (arrays[f"{prefix}_data"], arrays[f"{prefix}_indices"], arrays[f"{prefix}_indptr"]),
+            shape=tuple(arrays[f"{prefix}_shape"]),
+        )
+        return cls(XT, arrays[f"{prefix}_idf"], arrays[f"{prefix}_row_label"],
+                   arrays[f"{prefix}_labels"].tolist())
+
+
+class NeighbourIndex:
+    def __init__(self, kinds: Dict[str, KindIndex]):
+        self.kinds = kinds
+
+    @classmethod
+    def build(cls, examples: Iterable[Dict], n_features: int = N_FEATURES,
+              max_df: float = 0.5, per_example: bool = False) -> "NeighbourIndex":
+        # se deduplica al leer: la memoria crece con los ejemplos distintos, no con el corpus
+        pairs: Dict[str, Dict[Tuple[str, str], None]] = {}
+        for ex in examples:
+            try:
+                kind, entrada, salida = example_texts(ex)
+            except (KeyError, TypeError):
+                continue
+            pairs.setdefault(kind, {})[(entrada, salida)] = None
+        return cls({kind: KindIndex.build(p, n_features, max_df, per_example) for kind, p in pairs.items()})
+
+    def query(self, kind: str, entrada: str, k: int = 5) -> List[Tuple[str, float]]:
+        index = self.kinds.get(kind)
+        return index.query(entrada, k) if index is not None else []
+
+    def save(self, path: Path) -> None:
+        arrays: Dict[str, np.ndarray] = {"kinds": np.array(sorted(self.kinds), dtype=str)}
+        for kind, index in self.kinds.items():
+            arrays.update(index.to_arrays(kind))
+        with Path(path).open("wb") as f:
+            np.savez(f, **arrays)
+
+    @classmethod
+    def load(cls, path: Path) -> "NeighbourIndex":
+        with np.load(path, allow_pickle=False) as arrays:
+            return cls({kind: KindIndex.from_arrays(arrays, kind) for kind in arrays["kinds"].tolist()})
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        return {
+            kind: {"rows": int(index.XT.shape[1]), "labels": len(index.labels), "nnz": int(index.XT.nnz)}
+            for kind, index in self.kinds.items()
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Construye el índice de vecinos del corpus")
+    sub = parser.add_subparsers(dest="command", required=True)
+    b = sub.add_parser("build", help="Vectoriza el corpus y guarda el índice")
+    b.add_argument("--data", default="tables_train.json", help="Fichero de ejemplos (.json o .jsonl)")
+    b.add_argument("--out", default="nn_index.npz")
+    b.add_argument("--n-features", type=int, default=N_FEATURES)
+    b.add_argument("--max-df", type=float, default=0.5, help="Excluye tokens presentes en más de esta fracción")
+    b.add_argument("--per-example", action="store_true", help="Una fila por ejemplo en vez de por salida")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        from train import iter_examples
+
+        start = time.perf_counter()
+        index = NeighbourIndex.build(iter_examples(Path(args.data)), args.n_features, args.max_df,
+                                     args.per_example)
+        index.save(Path(args.out))
+        print(f"Index built in {time.perf_counter() - start:.2f}s: {index.stats()} -> {args.out}")
+
+
+if __name__ == "__main__":
+    main()
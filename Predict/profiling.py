@@ -0,0 +1,240 @@
+"""Perfilado bajo demanda de peticiones del servicio Predict.
+
+Una petición se perfila si trae la cabecera ``X-Profile`` (``sample`` o
+``cprofile``; el servicio solo la atiende con el token de administración)
+o si sale en la muestra (``rate``). Con el perfilado apagado
+el coste por petición es leer una cabecera y comparar un float.
+
+- ``sample``: un hilo muestrea cada ``interval`` segundos las pilas de todos
+  los hilos ocupados (el de la petición, el ejecutor de inferencia y el
+  micro-batcher) con ``sys._current_frames``. Da pilas colapsadas (formato
+  de flamegraph.pl / speedscope: ``a;b;c N``) y el top de funciones por
+  muestras propias. Si hay varias peticiones perfiladas a la vez, cada
+  muestra se atribuye a todas.
+- ``cprofile``: ``cProfile`` en el hilo de la petición; tiempos exactos por
+  función, pero no ve el trabajo de otros hilos y añade más sobrecarga.
+
+Cada perfil guarda además los tiempos por fase (parse, features, predict,
+serialize, log) y se conservan los ``max_profiles`` más recientes.
+"""
+import cProfile
+import itertools
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+from collections import Counter, deque
+from typing import Any, Dict, List, Optional
+
+MODES = ("sample", "cprofile")
+
+# un hilo cuya pila acaba en estos módulos está esperando (locks, colas, sockets), no trabajando
+_IDLE_FILES = {"threading.py", "queue.py", "selectors.py", "socketserver.py", "socket.py"}
+# ... o en esta función (los workers de ThreadPoolExecutor esperan en una SimpleQueue de C)
+_IDLE_FRAMES = {("thread.py", "_worker")}
+
+
+def _idle(code) -> bool:
+    base = os.path.basename(code.co_filename)
+    return base in _IDLE_FILES or (base, code.co_name) in _IDLE_FRAMES
+
+
+def _frame_label(code) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _collapse(frame) -> List[str]:
+    stack = []
+    while frame is not None:
+        stack.append(_frame_label(frame.f_code))
+        frame = frame.f_back
+    stack.reverse()
+    return stack
+
+
+class Profile:
+    """Perfil de una petición."""
+
+    def __init__(self, profile_id: int, mode: str, trigger: str, route: str, method: str):
+        self.id = profile_id
+        self.mode = mode
+        self.trigger = trigger
+        self.route = route
+        self.method = method
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        self.duration = 0.0
+        self.status: Optional[int] = None
+        self.stages: Dict[str, float] = {}
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.top: List[Dict[str, Any]] = []
+        self._cprofile: Optional[cProfile.Profile] = None
+
+    def stage(self, name: str, seconds: float) -> None:
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {n}\n" for stack, n in self.stacks.most_common())
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "id": self.id, "mode": self.mode, "trigger": self.trigger, "route": self.route,
+            "method": self.method, "status": self.status, "started_at": self.started_at,
+            "duration_ms": round(self.duration * 1000, 3),
+            "stages_ms": {k: round(v * 1000, 3) for k, v in self.stages.items()},
+            "samples": self.samples,
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {**self.summary(), "top": self.top}
+
+
+def _top_from_stacks(stacks: Counter, n: int) -> List[Dict[str, Any]]:
+    total = sum(stacks.values()) or 1
+    own: Counter = Counter()
+    inclusive: Counter = Counter()
+    for stack, count in stacks.items():
+        frames = stack.split(";")
+        own[frames[-1]] += count
+        for f in set(frames):
+            inclusive[f] += count
+    return [
+        {"function": f, "self_samples": c, "self_pct": round(100.0 * c / total, 2),
+         "total_pct": round(100.0 * inclusive[f] / total, 2)}
+        for f, c in own.most_common(n)
+    ]
+
+
+def _top_from_cprofile(prof: cProfile.Profile, n: int) -> List[Dict[str, Any]]:
+    stats = pstats.Stats(prof).stats
+    rows = sorted(stats.items(), key=lambda kv: kv[1][2], reverse=True)[:n]
+    return [
+        {"function": f"{func} ({os.path.basename(file)}:{line})", "calls": nc,
+         "self_ms": round(tt * 1000, 3), "cumulative_ms": round(ct * 1000, 3)}
+        for (file, line, func), (cc, nc, tt, ct, _) in rows
+    ]
+
+
+class RequestProfiler:
+    def __init__(self, rate: float = 0.0, mode: str = "sample", interval: float = 0.001,
+                 max_profiles: int = 50, top_n: int = 25):
+        self.rate = max(0.0, min(1.0, rate))
+        self.mode = mode if mode in MODES else "sample"
+        self.interval = interval
+        self.top_n = top_n
+        self.profiles: deque = deque(maxlen=max_profiles)
+        self.total = 0
+        self._ids = itertools.count(1)
+        self._active: Dict[int, Profile] = {}
+        self._lock = threading.Lock()
+        self._sampler: Optional[threading.Thread] = None
+        self._wake = threading.Condition(self._lock)
+
+    def wanted(self, header: Optional[str]) -> Optional[tuple]:
+        """(modo, motivo) si hay que perfilar esta petición; None en el caso habitual."""
+        if header:
+            mode = header.strip().lower()
+            return (mode if mode in MODES else self.mode), "header"
+        if self.rate and random.random() < self.rate:
+            return self.mode, "sample_rate"
+        return None
+
+    def start(self, mode: str, trigger: str, route: str, method: str) -> Profile:
+        profile = Profile(next(self._ids), mode, trigger, route, method)
+        if mode == "cprofile":
+            profile._cprofile = cProfile.Profile()
+            try:
+                profile._cprofile.enable()
+            except ValueError:
+                # ya hay otro perfilador activo en este hilo: se muestrea en su lugar
+                profile._cprofile = None
+                profile.mode = "sample"
+        if profile.mode == "sample":
+            with self._lock:
+                self._active[profile.id] = profile
+                if self._sampler is None:
+                    self._sampler = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+                    self._sampler.start()
+                self._wake.notify()
+        return profile
+
+    def finish(self, profile: Profile, status: Optional[int] = None) -> None:
+        profile.duration = time.perf_counter() - profile._start
+        if status is not None:
+            profile.status = status
+        if profile._cprofile is not None:
+            profile._cprofile.disable()
+            profile.top = _top_from_cprofile(profile._cprofile, self.top_n)
+            profile._cprofile = None
+        else:
+            with self._lock:
+                self._active.pop(profile.id, None)
+            profile.top = _top_from_stacks(profile.stacks, self.top_n)
+        with self._lock:
+            self.profiles.append(profile)
+            self.total += 1
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        while True:
+            with self._lock:
+                while not self._active:
+                    self._wake.wait()
+            stacks = [
+                ";".join(_collapse(frame)) for ident, frame in sys._current_frames().items()
+                if ident != own and not _idle(frame.f_code)
+            ]
+            with self._lock:
+                # solo los que siguen activos: ``finish`` ya no ve cambios en sus pilas
+                for profile in self._active.values():
+                    profile.samples += 1
+                    profile.stacks.update(stacks)
+            time.sleep(self.interval)
+
+    def get(self, profile_id: int) -> Optional[Profile]:
+        with self._lock:
+            for p in self.profiles:
+                if p.id == profile_id:
+                    return p
+        return None
+
+    def clear(self) -> None:
+        with self._lock:
+            self.profiles.clear()
+
+    def collapsed(self, route: Optional[str] = None) -> str:
+        """Pilas colapsadas de todos los perfiles muestreados guardados (opcionalmente de una ruta)."""
+        with self._lock:
+            profiles = [p for p in self.profiles if route is None or p.route == route]
+        total: Counter = Counter()
+        for p in profiles:
+            total.update(p.stacks)
+        return "".join(f"{stack} {n}\n" for stack, n in total.most_common())
+
+    def summary(self, route: Optional[str] = None) -> Dict[str, Any]:
+        with self._lock:
+            profiles = [p for p in self.profiles if route is None or p.route == route]
+        stages: Dict[str, Dict[str, Dict[str, float]]] = {}
+        stacks: Counter = Counter()
+        for p in profiles:
+            per_route = stages.setdefault(p.route, {})
+            for name, seconds in list(p.stages.items()) + [("total", p.duration)]:
+                agg = per_route.setdefault(name, {"count": 0, "sum_ms": 0.0, "max_ms": 0.0})
+                agg["count"] += 1
+                agg["sum_ms"] += seconds * 1000
+                agg["max_ms"] = max(agg["max_ms"], seconds * 1000)
+            stacks.update(p.stacks)
+        for per_route in stages.values():
+            for agg in per_route.values():
+                agg["mean_ms"] = round(agg["sum_ms"] / agg["count"], 3)
+                agg["sum_ms"] = round(agg["sum_ms"], 3)
+                agg["max_ms"] = round(agg["max_ms"], 3)
+        return {
+            "rate": self.rate, "mode": self.mode, "profiled_total": self.total,
+            "stages": stages,
+            "top": _top_from_stacks(stacks, self.top_n),
+            "profiles": [p.summary() for p in reversed(profiles)],
+        }
@@ -0,0 +1,123 @@
+"""Descubrimiento de relaciones entre todas las parejas de tablas de un diagrama.
+
+Todas las parejas se puntúan a la vez con matrices n x n (500 tablas son
+~125k parejas), sin bucles en Python por pareja:
+
+- similitud: coseno entre los vectores de cada tabla (nombre + atributos,
+  hashing con idf calculado dentro del diagrama para que ``id`` o
+  ``nombre`` no acerquen a todas las tablas entre sí);
+- claves foráneas: ``F[a, b] = 1`` si ``a`` tiene un atributo ``b_id``.
+  ``F @ F.T`` cuenta destinos compartidos (ambas tablas apuntan a la misma)
+  y ``F.T @ F`` detecta parejas que otra tabla ya une;
+- relaciones conocidas: parejas de las ``relations`` de DOMAINS, que además
+  dan el nombre y los atributos de la tabla intermedia.
+
+Las parejas ya relacionadas (una referencia directa o una tabla que apunta
+a las dos) se descartan: lo que se devuelve son las tablas intermedias que
+faltan.
+"""
+from typing import Callable, Dict, FrozenSet, List, Tuple
+
+import numpy as np
+import scipy.sparse as sp
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.preprocessing import normalize as l2_normalize
+
+N_FEATURES = 2 ** 16
+W_SIMILARITY = 0.5
+W_SHARED_FK = 0.3
+W_KNOWN = 1.0
+
+_VECTORIZER = HashingVectorizer(n_features=N_FEATURES, alternate_sign=False, norm=None)
+
+
+def _table_text(t: Dict) -> str:
+    return " ".join([str(t.get("nombre", ""))] + [str(a) for a in t.get("atributos") or []])
+
+
+def _similarity(tablas: List[Dict]) -> np.ndarray:
+    X = _VECTORIZER.transform([_table_text(t) for t in tablas]).tocsc()
+    df = np.diff(X.indptr)
+    idf = np.log((1 + len(tablas)) / (1 + df)) + 1
+    X = l2_normalize(X.tocsr().multiply(idf).tocsr(), norm="l2")
+    return (X @ X.T).toarray()
+
+
+def _foreign_keys(tablas: List[Dict], keys: List[str], normalize: Callable[[str], str]) -> sp.csr_matrix:
+    index = {k: i for i, k in enumerate(keys)}
+    rows, cols = [], []
+    for i, t in enumerate(tablas):
+        for a in t.get("atributos") or []:
+            a = str(a)
+            if a.rstrip().lower().endswith("_id"):
+                j = index.get(normalize(a)[:-3])
+                if j is not None and j != i:
+                    rows.append(i)
+                    cols.append(j)
+    n = len(tablas)
+    return sp.csr_matrix((np.ones(len(rows), dtype=np.float32), (rows, cols)), shape=(n, n))
+
+
+def discover_relations(
+    tablas: List[Dict],
+    normalize: Callable[[str], str],
+    known: Dict[FrozenSet[str], Tuple[str, List[str]]],
+    top_n: int = 10,
+    date_attr: str = "fecha",
+) -> List[Dict]:
+    """Las ``top_n`` tablas intermedias más probables entre parejas del diagrama."""
+    n = len(tablas)
+    if n < 2:
+        return []
+    keys = [normalize(str(t.get("nombre", ""))) for t in tablas]
+
+    score = W_SIMILARITY * _similarity(tablas)
+
+    F = _foreign_keys(tablas, keys, normalize)
+    shared = (F @ F.T).toarray()
+    score += W_SHARED_FK * np.minimum(shared, 2) / 2
+
+    position = {k: i for i, k in enumerate(keys)}
+    known_at: Dict[Tuple[int, int], Tuple[str, List[str]]] = {}
+    for pair, rel in known.items():
+        if len(pair) == 2:
+            a, b = tuple(pair)
+            # la tabla intermedia ya existe en el diagrama: nada que sugerir
+            if a in position and b in position and normalize(rel[0]) not in position:
+                i, j = sorted((position[a], position[b]))
+                known_at[(i, j)] = rel
+                score[i, j] += W_KNOWN
+
+    # solo parejas i < j, distintas y todavía sin relacionar
+    related = (F + F.T + (F.T @ F)).toarray() > 0
+    score[related] = -np.inf
+    score[np.tril_indices(n)] = -np.inf
+    _, key_ids = np.unique(keys, return_inverse=True)
+    score[np.equal.outer(key_ids, key_ids)] = -np.inf
+
+    flat = score.ravel()
+    valid = np.flatnonzero(flat > 0)
+    if valid.size == 0:
+        return []
+    top_n = min(top_n, valid.size)
+    top = valid[np.argpartition(-flat[valid], top_n - 1)[:top_n]] if top_n < valid.size else valid
+    top = top[np.argsort(-flat[top], kind="stable")]
+
+    out: List[Dict] = []
+    for idx in top:
+        i, j = divmod(int(idx), n)
+        rel = known_at.get((i, j))
+        if rel is not None:
+            nombre, atributos, origen = rel[0], list(rel[1]), "exact"
+        else:
+            nombre = f"{keys[i]}_{keys[j]}_rel"
+            atributos = ["id", f"{keys[i]}_id", f"{keys[j]}_id", date_attr]
+            origen = "heuristic"
+        out.append({
+            "tablas": [tablas[i].get("nombre", ""), tablas[j].get("nombre", "")],
+            "tabla_sugerida": nombre,
+            "atributos": atributos,
+            "score": round(float(flat[idx]), 4),
+            "tier": origen,
+        })
+    return out
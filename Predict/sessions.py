@@ -0,0 +1,270 @@
+"""Sesiones de diagrama para sugerencias incrementales.
+
+El servicio guarda por proyecto las tablas del diagrama y, para cada modelo,
+la contribución de cada tabla al vector de features (conteos del
+HashingVectorizer) junto con su suma. Los clientes envían deltas (añadir,
+quitar o renombrar tablas y atributos) y solo se recalculan las filas
+afectadas; predecir ya no requiere reconstruir ni re-vectorizar el texto
+de todo el diagrama.
+
+Esto es exacto porque el vectorizador de ``train.py`` cuenta unigramas: el
+vector de ``"a b"`` es la suma de los de ``"a"`` y ``"b"``. Con modelos que no
+se pueden descomponer así (p. ej. un TfidfVectorizer heredado) la sesión
+sigue funcionando, pero reconstruye la entrada completa desde las tablas
+guardadas.
+"""
+import itertools
+import threading
+import time
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+
+from features import canonical_name, entrada_atributos, entrada_relacion
+
+
+if TYPE_CHECKING:
+    import scipy.sparse as sp
+
+# scipy se importa al crear la primera fila (el modelo ya está cargado): importar
+# ``app`` no debe arrastrar numpy/scipy, ver el informe de arranque
+
+
+class SessionError(ValueError):
+    pass
+
+
+# identificador único por sesión creada: un PUT que reemplaza la del proyecto no reutiliza claves
+_SESSION_IDS = itertools.count(1)
+
+
+class FeatureSpace:
+    """Vectorizador aditivo extraído de un pipeline (HashingVectorizer, clasificador lineal)."""
+
+    def __init__(self, vectorizer: Any, clf: Any):
+        from sklearn.feature_extraction.text import HashingVectorizer
+
+        params = vectorizer.get_params()
+        self.norm = params.get("norm")
+        self.counter = HashingVectorizer(**{**params, "norm": None})
+        self.clf = clf
+
+    @classmethod
+    def from_model(cls, model: Any) -> Optional["FeatureSpace"]:
+        steps = getattr(model, "steps", None)
+        if not steps or len(steps) != 2:
+            return None
+        # sklearn se importa aquí: el modelo ya está cargado, así que no cuesta nada
+        from sklearn.feature_extraction.text import HashingVectorizer
+
+        vectorizer, clf = steps[0][1], steps[1][1]
+        if not isinstance(vectorizer, HashingVectorizer):
+            return None
+        if vectorizer.analyzer != "word" or tuple(vectorizer.ngram_range) != (1, 1):
+            return None
+        return cls(vectorizer, clf)
+
+    def counts(self, texts: List[str]) -> "sp.csr_matrix":
+        return self.counter.transform(texts)
+
+    def finish(self, X: "sp.csr_matrix") -> "sp.csr_matrix":
+        from sklearn.preprocessing import normalize
+
+        return normalize(X, norm=self.norm, copy=False) if self.norm else X
+
+
+def _table_text(nombre: str, atributos: List[str]) -> str:
+    return nombre + " " + " ".join(atributos)
+
+
+class _KindState:
+    """Filas por tabla y su suma para un modelo (versión, tipo) concreto."""
+
+    def __init__(self, space: FeatureSpace, tables: Dict[str, List[str]]):
+        import scipy.sparse as sp
+
+        self.space = space
+        names = list(tables)
+        self.rows: Dict[str, "sp.csr_matrix"] = {}
+        if names:
+            X = space.counts([_table_text(n, tables[n]) for n in names])
+            for i, n in enumerate(names):
+                self.rows[n] = X[i]
+            self.total = sp.csr_matrix(X.sum(axis=0))
+        else:
+            self.total = sp.csr_matrix((1, space.counter.n_features))
+
+    def update(self, nombre: str, atributos: Optional[List[str]]) -> None:
+        old = self.rows.pop(nombre, None)
+        if old is not None:
+            self.total = self.total - old
+        if atributos is not None:
+            row = self.space.counts([_table_text(nombre, atributos)])
+            self.rows[nombre] = row
+            self.total = self.total + row
+        self.total.eliminate_zeros()
+
+
+class DiagramSession:
+    def __init__(self, project_id: str, tablas: List[Dict]):
+        self.project_id = project_id
+        self.lock = threading.Lock()
+        self.last_access = time.monotonic()
+        self.edits = 0
+        self.uid = next(_SESSION_IDS)
+        # sube con cada cambio de tablas: junto con ``uid`` identifica el diagrama sin recorrerlo
+        self.generation = 0
+        self.tables: Dict[str, List[str]] = {}
+        for t in tablas:
+            self.tables[canonical_name(t["nombre"])] = [canonical_name(a) for a in t.get("atributos") or []]
+        self._states: Dict[Tuple[str, str], _KindState] = {}
+
+    # ---- deltas ----
+    def _set_table(self, nombre: str, atributos: Optional[List[str]]) -> None:
+        self.generation += 1
+        if atributos is None:
+            self.tables.pop(nombre, None)
+        else:
+            self.tables[nombre] = atributos
+        for state in self._states.values():
+            state.update(nombre, atributos)
+
+    def _require(self, nombre: str) -> List[str]:
+        if nombre not in self.tables:
+            raise SessionError(f"La tabla '{nombre}' no existe en la sesión")
+        return self.tables[nombre]
+
+    def apply(self, op: Dict) -> None:
+        kind = op.get("op")
+        if kind == "add_table":
+            nombre = canonical_name(op["nombre"])
+            self._set_table(nombre, [canonical_name(a) for a in op.get("atributos") or []])
+        elif kind == "remove_table":
+            nombre = canonical_name(op["nombre"])
+            self._require(nombre)
+            self._set_table(nombre, None)
+        elif kind == "rename_table":
+            nombre, nuevo = canonical_name(op["nombre"]), canonical_name(op["nuevo"])
+            atributos = self._require(nombre)
+            self._set_table(nombre, None)
+            self._set_table(nuevo, atributos)
+        elif kind in ("add_attribute", "remove_attribute", "rename_attribute"):
+            nombre = canonical_name(op["tabla"])
+            atributos = list(self._require(nombre))
+            atributo = canonical_name(op["atributo"])
+            if kind == "add_attribute":
+                atributos.append(atributo)
+            elif atributo not in atributos:
+                raise SessionError(f"El atributo '{atributo}' no existe en '{nombre}'")
+            elif kind == "remove_attribute":
+                atributos.remove(atributo)
+            else:
+                atributos[atributos.index(atributo)] = canonical_name(op["nuevo"])
+            self._set_table(nombre, atributos)
+        else:
+            raise SessionError(f"Operación desconocida: {kind!r}")
+        self.edits += 1
+
+    # ---- features ----
+    def cache_key(self, nombre: Optional[str] = None) -> Tuple:
+        """Clave de cache de una predicción sobre el estado actual, en O(1)."""
+        return ("session", self.uid, self.generation, nombre)
+
+    def _tablas(self, excluir: Optional[str] = None) -> List[Dict]:
+        return [{"nombre": n, "atributos": a} for n, a in self.tables.items() if n != excluir]
+
+    def _state(self, key: Tuple[str, str], model: Any) -> Optional[_KindState]:
+        state = self._states.get(key)
+        if state is None:
+            space = FeatureSpace.from_model(model)
+            if space is None:
+                return None
+            # otra versión del modelo: se descartan las filas calculadas con la anterior
+            self._states = {k: v for k, v in self._states.items() if k[0] == key[0]}
+            state = self._states[key] = _KindState(space, self.tables)
+        return state
+
+    def features_atributos(self, key: Tuple[str, str], model: Any, tablas: List[str]):
+        """Matriz lista para ``clf.predict`` (una fila por tabla) o, si el modelo no
+        es descomponible, las entradas de texto equivalentes."""
+        state = self._state(key, model)
+        nombres = [canonical_name(t) for t in tablas]
+        if state is None:
+            return None, [entrada_atributos(n, self._tablas(excluir=n)) for n in nombres]
+        own = state.space.counts(nombres)
+        rows = []
+        for i, n in enumerate(nombres):
+            row = state.total + own[i]
+            if n in state.rows:
+                # la propia tabla no forma parte de sus "tablas existentes"
+                row = row - state.rows[n]
+            rows.append(row)
+        import scipy.sparse as sp
+
+        X = sp.vstack(rows, format="csr")
+        X.eliminate_zeros()
+        return state.space.finish(X), None
+
+    def features_relacion(self, key: Tuple[str, str], model: Any):
+        state = self._state(key, model)
+        if state is None:
+            return None, [entrada_relacion(self._tablas())]
+        return state.space.finish(state.total.copy()), None
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "project_id": self.project_id,
+            "tablas": len(self.tables),
+            "edits": self.edits,
+            "incremental": sorted(k[1] for k in self._states),
+        }
+
+
+class SessionStore:
+    """Sesiones por proyecto con expiración por inactividad y tope de tamaño (LRU)."""
+
+    def __init__(self, idle_seconds: float = 1800.0, max_sessions: int = 1000):
+        self.idle_seconds = idle_seconds
+        self.max_sessions = max(1, int(max_sessions))
+        self._sessions: "OrderedDict[str, DiagramSession]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.evicted = 0
+
+    def _evict(self, now: float) -> None:
+        while self._sessions:
+            pid, oldest = next(iter(self._sessions.items()))
+            if len(self._sessions) > self.max_sessions or now - oldest.last_access > self.idle_seconds:
+                del self._sessions[pid]
+                self.evicted += 1
+            else:
+                break
+
+    def create(self, project_id: str, tablas: List[Dict]) -> DiagramSession:
+        session = DiagramSession(project_id, tablas)
+        with self._lock:
+            self._sessions[project_id] = session
+            self._sessions.move_to_end(project_id)
+            self._evict(time.monotonic())
+        return session
+
+    def get(self, project_id: str) -> Optional[DiagramSession]:
+        now = time.monotonic()
+        with self._lock:
+            self._evict(now)
+            session = self._sessions.get(project_id)
+            if session is not None:
+                session.last_access = now
+                self._sessions.move_to_end(project_id)
+            return session
+
+    def delete(self, project_id: str) -> bool:
+        with self._lock:
+            return self._sessions.pop(project_id, None) is not None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "max_sessions": self.max_sessions,
+                "idle_seconds": self.idle_seconds,
+                "evicted": self.evicted,
+            }
@@ -0,0 +1,69 @@
+"""Informe de arranque del servicio por fases.
+
+Los tiempos se miden desde el inicio del proceso (``/proc/self/stat`` en
+Linux; en otros sistemas, desde que se importa este módulo), así que
+``first_prediction`` es el tiempo real desde arrancar el proceso hasta la
+primera predicción servida.
+"""
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+
+def _process_age() -> Optional[float]:
+    """Segundos desde que arrancó el proceso, o None si no se puede saber."""
+    try:
+        with open("/proc/self/stat", "rb") as f:
+            # el nombre del proceso va entre paréntesis y puede contener espacios
+            fields = f.read().rsplit(b")", 1)[1].split()
+        start_ticks = int(fields[19])
+        with open("/proc/uptime", "rb") as f:
+            uptime = float(f.read().split()[0])
+        return uptime - start_ticks / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+class StartupReport:
+    def __init__(self):
+        age = _process_age()
+        self._origin = time.perf_counter() - (age or 0.0)
+        self.clock = "process" if age is not None else "import"
+        self.marks: Dict[str, float] = {}
+        self.phases: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self._origin
+
+    def mark(self, name: str, once: bool = False) -> bool:
+        """Momento (s desde el arranque) en que se alcanza un hito."""
+        with self._lock:
+            if once and name in self.marks:
+                return False
+            self.marks[name] = self.elapsed()
+            return True
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.phases[name] = time.perf_counter() - start
+
+    def record(self, name: str, seconds: Optional[float]) -> None:
+        if seconds is not None:
+            with self._lock:
+                self.phases[name] = seconds
+
+    def report(self) -> Dict[str, object]:
+        with self._lock:
+            return {
+                "clock": self.clock,
+                "marks_seconds": {k: round(v, 4) for k, v in sorted(self.marks.items(), key=lambda kv: kv[1])},
+                "phases_seconds": {k: round(v, 4) for k, v in self.phases.items()},
+            }
@@ -0,0 +1,79 @@
+"""Server-Sent Events con buffer acotado y cancelación.
+
+``stream_events(produce)`` ejecuta ``produce(emit, cancelled)`` en un hilo y
+devuelve un generador que entrega cada evento en formato SSE en cuanto se
+produce. Entre productor y cliente hay como mucho ``max_buffer`` eventos:
+si el cliente lee despacio, ``emit`` espera. Si el cliente se desconecta,
+el servidor WSGI cierra el generador, ``cancelled`` se activa y el
+productor deja de calcular en el siguiente ``emit``.
+"""
+import json
+import logging
+import queue
+import threading
+from typing import Any, Callable, Iterator, Optional
+
+_DONE = object()
+
+
+class Cancelled(Exception):
+    pass
+
+
+def format_event(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def stream_events(
+    produce: Callable[[Callable[[str, Any], None], threading.Event], None],
+    max_buffer: int = 16,
+    heartbeat: float = 15.0,
+) -> Iterator[str]:
+    buffer: "queue.Queue" = queue.Queue(maxsize=max(1, max_buffer))
+    cancelled = threading.Event()
+
+    def put(item: object) -> None:
+        while True:
+            if cancelled.is_set():
+                raise Cancelled()
+            try:
+                buffer.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+
+    def emit(event: str, data: Any) -> None:
+        put(format_event(event, data))
+
+    def run() -> None:
+        try:
+            produce(emit, cancelled)
+            put(_DONE)
+        except Cancelled:
+            return
+        except Exception as e:
+            logging.exception("Error generando eventos")
+            try:
+                emit("error", {"error": str(e)})
+                put(_DONE)
+            except Cancelled:
+                return
+
+    def events() -> Iterator[str]:
+        producer = threading.Thread(target=run, name="sse-producer", daemon=True)
+        producer.start()
+        try:
+            while True:
+                try:
+                    item: Optional[object] = buffer.get(timeout=heartbeat)
+                except queue.Empty:
+                    # comentario SSE: mantiene viva la conexión y detecta clientes caídos
+                    yield ": keep-alive\n\n"
+                    continue
+                if item is _DONE:
+                    return
+                yield item
+        finally:
+            cancelled.set()
+
+    return events()
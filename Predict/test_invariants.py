@@ -0,0 +1,234 @@
+"""Invariantes del servicio que las optimizaciones no deben romper.
+
+- las rutas de sesión predicen lo mismo que las rutas sin estado;
+- la clave de cache no depende del orden de las tablas ni de mayúsculas;
+- ``DomainIndex`` ordena los dominios igual que el recorrido original;
+- el corpus columnar devuelve los ejemplos tal cual, también tras un
+  append interrumpido;
+- la consulta exacta responde los nombres conocidos sin pasar por el modelo.
+
+    cd Predict && python -m pytest -q test_invariants.py
+"""
+import json
+import os
+import tempfile
+from pathlib import Path
+from typing import Dict, List
+
+import pytest
+
+# antes de importar app: sin artefactos ni corpus en segundo plano, modelos instalados en memoria
+os.environ["MODEL_LOAD"] = "lazy"
+os.environ["MODEL_DIR"] = tempfile.mkdtemp(prefix="predict-test-")
+os.environ["NN_INDEX_DATA"] = os.path.join(os.environ["MODEL_DIR"], "sin-corpus.json")
+os.environ.pop("LOOKUP_DATA", None)
+os.environ.pop("DOMAIN_VOCAB", None)
+
+import app as A  # noqa: E402
+from dataset import ColumnarDataset, ColumnarWriter  # noqa: E402
+from domain_index import DomainIndex  # noqa: E402
+from features import consulta_atributos, orden_indiferente  # noqa: E402
+
+DATA = Path(__file__).with_name("tables_train.json")
+EXAMPLES: List[Dict] = json.loads(DATA.read_text(encoding="utf-8"))
+
+
+@pytest.fixture(scope="module")
+def client():
+    from train import KINDS, fit_model
+
+    models = {kind: fit_model(DATA, kind, epochs=2)[0] for kind in KINDS}
+    A._MODELS.install(models, version="test")
+    return A.app.test_client()
+
+
+@pytest.fixture
+def sin_exacta(monkeypatch):
+    # solo el modelo: así se comparan predicciones y no la tabla de consulta
+    monkeypatch.setattr(A, "_EXACT_LOOKUP_ENABLED", False)
+    A._PREDICTION_CACHE.clear()
+
+
+def _nombres_unicos(inp: Dict) -> bool:
+    # la sesión guarda las tablas por nombre: un diagrama con nombres repetidos no es representable
+    nombres = [t["nombre"].lower() for t in inp["tablas_existentes"]] + [inp.get("tabla", "").lower()]
+    return len(set(nombres)) == len(nombres)
+
+
+def _atributos_examples(n: int = 40) -> List[Dict]:
+    return [ex["input"] for ex in EXAMPLES if "tabla" in ex["input"] and _nombres_unicos(ex["input"])][:n]
+
+
+def _relacion_examples(n: int = 40) -> List[Dict]:
+    return [ex["input"] for ex in EXAMPLES if "tabla" not in ex["input"] and _nombres_unicos(ex["input"])][:n]
+
+
+# ---- sesión == rutas sin estado ----
+
+@pytest.mark.parametrize("exacta", [False, True])
+def test_session_atributos_matches_stateless(client, monkeypatch, exacta):
+    monkeypatch.setattr(A, "_EXACT_LOOKUP_ENABLED", exacta)
+    A._PREDICTION_CACHE.clear()
+    for i, inp in enumerate(_atributos_examples()):
+        esperado = client.post("/predict/atributos", json=inp).get_json()
+        assert client.put(f"/session/a{i}", json={"tablas_existentes": inp["tablas_existentes"]}).status_code == 201
+        r = client.post(f"/session/a{i}/predict/atributos", json={"tabla": inp["tabla"]}).get_json()
+        assert r == esperado, inp
+
+
+@pytest.mark.parametrize("exacta", [False, True])
+def test_session_relacion_matches_stateless(client, monkeypatch, exacta):
+    monkeypatch.setattr(A, "_EXACT_LOOKUP_ENABLED", exacta)
+    A._PREDICTION_CACHE.clear()
+    for i, inp in enumerate(_relacion_examples()):
+        esperado = client.post("/predict/relacion", json=inp).get_json()
+        client.put(f"/session/r{i}", json={"tablas_existentes": inp["tablas_existentes"]})
+        assert client.post(f"/session/r{i}/predict/relacion", json={}).get_json() == esperado, inp
+
+
+def test_session_after_deltas_matches_stateless(client, sin_exacta):
+    """Tras editar la sesión (y con la cache ya poblada) sigue igual que enviar el diagrama entero."""
+    tablas = [{"nombre": "cliente", "atributos": ["id", "nombre"]},
+              {"nombre": "pedido", "atributos": ["id", "fecha", "cliente_id"]}]
+    client.put("/session/d", json={"tablas_existentes": tablas})
+    client.post("/session/d/predict/relacion", json={})
+    ops = [{"op": "add_table", "nombre": "Producto", "atributos": ["id", "precio"]},
+           {"op": "rename_attribute", "tabla": "pedido", "atributo": "fecha", "nuevo": "fecha_pedido"},
+           {"op": "remove_table", "nombre": "cliente"}]
+    assert client.post("/session/d/delta", json={"ops": ops}).status_code == 200
+    tablas = [{"nombre": "pedido", "atributos": ["id", "fecha_pedido", "cliente_id"]},
+              {"nombre": "producto", "atributos": ["id", "precio"]}]
+    esperado = client.post("/predict/relacion", json={"tablas_existentes": tablas}).get_json()
+    assert client.post("/session/d/predict/relacion", json={}).get_json() == esperado
+    esperado = client.post("/predict/atributos", json={"tabla": "factura", "tablas_existentes": tablas}).get_json()
+    assert client.post("/session/d/predict/atributos", json={"tabla": "factura"}).get_json() == esperado
+
+
+# ---- cache: claves canónicas ----
+
+def test_cache_key_ignores_order_and_case(client, sin_exacta):
+    _, modelos = A._MODELS.snapshot()
+    assert orden_indiferente(modelos["atributos"])
+    tablas = [{"nombre": "Cliente", "atributos": ["ID", "Nombre"]},
+              {"nombre": "producto", "atributos": ["id", "precio"]}]
+    reordenadas = [{"nombre": "PRODUCTO", "atributos": ["id", "precio"]},
+                   {"nombre": "cliente", "atributos": ["id", "nombre"]}]
+    a, b = consulta_atributos("Pedido", tablas), consulta_atributos("pedido", reordenadas)
+    assert a.texto != b.texto and a.canonica == b.canonica
+
+    primera = A._predict("atributos", [a])
+    hits = A._PREDICTION_CACHE.stats()["hits"]
+    assert A._predict("atributos", [b]) == primera
+    assert A._PREDICTION_CACHE.stats()["hits"] == hits + 1
+    # y el modelo da lo mismo con el texto original de cada una
+    assert [str(p) for p in modelos["atributos"].predict([a.texto, b.texto])] == primera * 2
+
+
+def test_session_cache_key_follows_edits(client, sin_exacta):
+    client.put("/session/k", json={"tablas_existentes": [{"nombre": "cliente", "atributos": ["id"]}]})
+    session = A._SESSIONS.get("k")
+    antes = session.cache_key("pedido")
+    assert session.cache_key("pedido") == antes
+    client.post("/session/k/delta", json={"ops": [{"op": "add_attribute", "tabla": "cliente", "atributo": "email"}]})
+    assert session.cache_key("pedido") != antes
+    client.put("/session/k2", json={"tablas_existentes": [{"nombre": "cliente", "atributos": ["id"]}]})
+    assert A._SESSIONS.get("k2").cache_key("pedido") != antes
+
+
+# ---- DomainIndex == recorrido original ----
+
+def _scan(domain_entities: Dict[str, List[str]], existing_norm, title_norm: str, k: int):
+    """El ranking de /suggest/classes antes del índice invertido."""
+    scores = []
+    for key, ents in domain_entities.items():
+        score = sum(1 for e in ents if e in existing_norm)
+        score += sum(1 for e in ents if e in title_norm)
+        scores.append((score, key))
+    scores.sort(reverse=True)
+    return scores[:k]
+
+
+def test_domain_index_matches_scan():
+    entities = A._DOMAIN_ENTITIES
+    assert entities
+    index = DomainIndex(entities)
+    todas = sorted({e for ents in entities.values() for e in ents})
+    casos = [(set(), ""), (set(), "sistema de gestión"), ({"cliente", "producto"}, ""),
+             ({"cliente"}, A._normalize_name("Tienda online de productos y pedidos"))]
+    # combinaciones deterministas de entidades reales y títulos que las contienen como subcadena
+    for i in range(0, len(todas), 7):
+        existentes = set(todas[i:i + 3])
+        casos.append((existentes, "".join(todas[i + 3:i + 5])))
+    for existentes, titulo in casos:
+        for k in (1, 3, len(entities) + 2):
+            assert index.top_domains(existentes, titulo, k) == _scan(entities, existentes, titulo, k)
+
+
+def test_domain_index_ties_break_by_key():
+    entities = {"b": ["x", "y"], "a": ["x"], "c": ["y"], "d": ["z"]}
+    index = DomainIndex(entities)
+    for existentes, titulo in [({"x"}, ""), ({"y"}, "x"), (set(), "zy"), (set(), "")]:
+        assert index.top_domains(existentes, titulo, 4) == _scan(entities, existentes, titulo, 4)
+
+
+# ---- corpus columnar ----
+
+def test_columnar_roundtrip(tmp_path):
+    with ColumnarWriter(tmp_path / "c.columnar", flush_every=50) as writer:
+        writer.extend(EXAMPLES)
+    ds = ColumnarDataset(tmp_path / "c.columnar")
+    assert len(ds) == len(EXAMPLES)
+    assert list(ds.iter_examples()) == EXAMPLES
+    assert ds[-1] == EXAMPLES[-1]
+
+
+def test_columnar_interrupted_append(tmp_path):
+    path = tmp_path / "c.columnar"
+    with ColumnarWriter(path) as writer:
+        writer.extend(EXAMPLES[:100])
+
+    # append cortado: columnas y vocab escritos, meta.json no
+    writer = ColumnarWriter(path)
+    writer.extend(EXAMPLES[100:200])
+    for name, buf in writer._buf.items():
+        writer._files[name].write(buf.tobytes())
+    (path / "vocab.json").write_text(json.dumps(writer.vocab + ["basura"]), encoding="utf-8")
+    writer._close_files()
+    assert list(ColumnarDataset(path).iter_examples()) == EXAMPLES[:100]
+
+    with ColumnarWriter(path) as writer:
+        writer.extend(EXAMPLES[200:300])
+    ds = ColumnarDataset(path)
+    assert list(ds.iter_examples()) == EXAMPLES[:100] + EXAMPLES[200:300]
+    assert len(ds.vocab) == ds.meta["vocab"]
+
+
+# ---- consulta exacta ----
+
+def test_exact_tier_for_known_names(client, monkeypatch):
+    monkeypatch.setattr(A, "_EXACT_LOOKUP_ENABLED", True)
+    tablas = [{"nombre": "producto", "atributos": ["id", "nombre", "precio"]}]
+    esperado = A._LOOKUP.atributos("cliente", ["producto"])
+    assert esperado
+    r = client.post("/predict/atributos", json={"tabla": " Cliente ", "tablas_existentes": tablas}).get_json()
+    assert r == {"atributos": list(esperado), "tier": "exact"}
+
+    body = {"tablas_existentes": tablas,
+            "items": [{"id": "c", "tabla": "cliente"}, {"id": "x", "tabla": "zzz_desconocida"}]}
+    resultados = client.post("/predict/atributos/batch", json=body).get_json()["resultados"]
+    assert resultados["c"] == r
+    assert resultados["x"]["tier"] == "model"
+
+    monkeypatch.setattr(A, "_EXACT_LOOKUP_ENABLED", False)
+    r = client.post("/predict/atributos", json={"tabla": "cliente", "tablas_existentes": tablas}).get_json()
+    assert r["tier"] == "model"
+
+
+def test_exact_tier_relacion(client, monkeypatch):
+    monkeypatch.setattr(A, "_EXACT_LOOKUP_ENABLED", True)
+    conocidas = A._LOOKUP.relaciones_conocidas()
+    assert conocidas
+    nombres, (tabla, atributos) = next(iter(conocidas.items()))
+    tablas = [{"nombre": n.upper(), "atributos": []} for n in sorted(nombres, reverse=True)]
+    r = client.post("/predict/relacion", json={"tablas_existentes": tablas}).get_json()
+    assert r == {"tabla_sugerida": tabla, "atributos": list(atributos), "tier": "exact"}
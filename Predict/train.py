@@ -0,0 +1,293 @@
+"""Entrenamiento offline de los modelos de atributos y de relación.
+
+Lee los ejemplos en streaming (JSON de tables_train.json, JSONL o el
+formato columnar de ``dataset.py``), los
+vectoriza con un HashingVectorizer (sin vocabulario que crezca con el
+corpus) y ajusta ambos clasificadores por mini-lotes con ``partial_fit``.
+La memoria depende del tamaño de lote y de la dimensión de features, no del
+número de ejemplos.
+
+Escribe una versión en ``models/<version>/`` con los artefactos joblib que
+carga ``model_registry.py`` y un ``metadata.json``:
+
+    python train.py --data tables_train.json --version v2 --set-current
+
+Con ``--holdout F`` se excluye del entrenamiento la parte de test del mismo
+reparto por hash que usa ``evaluate.py`` y se anota en ``metadata.json``
+(``split``); sin él se entrena con todo el corpus y ``evaluate.py`` se niega
+a dar métricas de holdout de esa versión.
+"""
+import argparse
+import json
+import random
+import time
+from collections import Counter
+from datetime import datetime
+from functools import partial
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+import joblib
+import numpy as np
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.linear_model import SGDClassifier
+from sklearn.naive_bayes import MultinomialNB
+from sklearn.pipeline import make_pipeline
+
+from dataset import ColumnarDataset, is_columnar
+from features import example_texts
+from model_registry import MODEL_FILES
+
+KINDS = tuple(MODEL_FILES.keys())
+
+
+def _iter_json_array(f, chunk_size: int = 1 << 16) -> Iterator[Dict]:
+    """Itera los elementos de un array JSON sin cargar la lista completa."""
+    decoder = json.JSONDecoder()
+    buf = ""
+    pos = 0
+    started = False
+    eof = False
+    while True:
+        # descarta separadores hasta el siguiente valor
+        while True:
+            while pos < len(buf) and buf[pos] in " \t\r\n,":
+                pos += 1
+            if not started and pos < len(buf):
+                if buf[pos] != "[":
+                    raise ValueError("Se esperaba un array JSON")
+                started = True
+                pos += 1
+                continue
+            break
+        if pos < len(buf) and buf[pos] == "]":
+            return
+        try:
+            if pos >= len(buf):
+                raise ValueError("buffer vacío")
+            obj, end = decoder.raw_decode(buf, pos)
+        except ValueError:
+            if eof:
+                if buf[pos:].strip():
+                    raise
+                return
+            chunk = f.read(chunk_size)
+            eof = not chunk
+            buf = buf[pos:] + chunk
+            pos = 0
+            continue
+        yield obj
+        pos = end
+
+
+def iter_examples(path: Path) -> Iterator[Dict]:
+    """Ejemplos de un fichero .jsonl (uno por línea), de un array JSON o de un corpus columnar."""
+    if is_columnar(path):
+        yield from ColumnarDataset(path).iter_examples()
+        return
+    with path.open("r", encoding="utf-8") as f:
+        if path.suffix == ".jsonl":
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+        else:
+            yield from _iter_json_array(f)
+
+
+ExampleSource = Union[Path, Callable[[], Iterable[Dict]]]
+
+
+def iter_texts(source: ExampleSource, kind: str) -> Iterator[Tuple[str, str]]:
+    """(entrada, salida) de un tipo; ``source`` es un fichero o una función que
+    devuelve un iterador nuevo de ejemplos (p. ej. un fold de ``evaluate.py``)."""
+    examples = source() if callable(source) else iter_examples(source)
+    for ex in examples:
+        try:
+            ex_kind, entrada, salida = example_texts(ex)
+        except (KeyError, TypeError):
+            continue
+        if ex_kind == kind:
+            yield entrada, salida
+
+
+def _shuffled(items: Iterable, buffer_size: int, rng: random.Random) -> Iterator:
+    """Barajado aproximado con un buffer acotado (no requiere todo el corpus en memoria)."""
+    buf: List = []
+    for item in items:
+        if len(buf) < buffer_size:
+            buf.append(item)
+            continue
+        i = rng.randrange(buffer_size)
+        yield buf[i]
+        buf[i] = item
+    rng.shuffle(buf)
+    yield from buf
+
+
+def _batches(items: Iterable, size: int) -> Iterator[List]:
+    batch: List = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def make_vectorizer(n_features: int) -> HashingVectorizer:
+    # unigramas sin signo alterno: las features son conteos no negativos y aditivos
+    return HashingVectorizer(n_features=n_features, alternate_sign=False, norm="l2")
+
+
+def make_classifier(algo: str, seed: int):
+    if algo == "nb":
+        return MultinomialNB(alpha=0.01)
+    return SGDClassifier(alpha=1e-5, random_state=seed, n_jobs=-1)
+
+
+def _column_major(clf) -> None:
+    """Guarda los pesos en orden Fortran.
+
+    predict() calcula ``X @ W.T`` con X dispersa; con W en orden C la
+    transpuesta no es contigua y scipy tarda decenas de ms por llamada.
+    """
+    for attr in ("coef_", "feature_log_prob_"):
+        if hasattr(clf, attr):
+            setattr(clf, attr, np.asfortranarray(getattr(clf, attr)))
+
+
+def fit_model(
+    path: ExampleSource,
+    kind: str,
+    n_features: int = 2 ** 14,
+    algo: str = "sgd",
+    epochs: int = 10,
+    batch_size: int = 2048,
+    shuffle_buffer: int = 50_000,
+    seed: int = 0,
+    min_count: int = 1,
+) -> Tuple[object, Dict]:
+    """Ajusta un modelo en dos fases: conteo de etiquetas y ``partial_fit`` por lotes."""
+    start = time.perf_counter()
+    label_counts: Counter = Counter(salida for _, salida in iter_texts(path, kind))
+    classes = np.array(sorted(c for c, n in label_counts.items() if n >= min_count))
+    if len(classes) == 0:
+        raise ValueError(f"No hay ejemplos de tipo '{kind}' en {path}")
+    known = set(classes.tolist())
+
+    vectorizer = make_vectorizer(n_features)
+    clf = make_classifier(algo, seed)
+    rng = random.Random(seed)
+    n_epochs = 1 if algo == "nb" else max(1, epochs)
+    for _ in range(n_epochs):
+        stream = ((e, s) for e, s in iter_texts(path, kind) if s in known)
+        for batch in _batches(_shuffled(stream, shuffle_buffer, rng), batch_size):
+            X = vectorizer.transform([e for e, _ in batch])
+            y = [s for _, s in batch]
+            clf.partial_fit(X, y, classes=classes)
+
+    _column_major(clf)
+    model = make_pipeline(vectorizer, clf)
+    info = {
+        "algo": algo,
+        "examples": sum(label_counts.values()),
+        "classes": int(len(classes)),
+        "dropped_classes": len(label_counts) - len(classes),
+        "n_features": n_features,
+        "epochs": n_epochs,
+        "batch_size": batch_size,
+        "training_seconds": round(time.perf_counter() - start, 3),
+        "class_counts": {c: label_counts[c] for c in classes.tolist()},
+    }
+    return model, info
+
+
+def train(
+    data: Path,
+    base_dir: Path,
+    version: Optional[str] = None,
+    set_current: bool = False,
+    holdout: float = 0.0,
+    **params,
+) -> Path:
+    """``holdout``: fracción de test de ``evaluate.py`` que no se usa para entrenar."""
+    version = version or datetime.now().strftime("%Y%m%d-%H%M%S")
+    target = base_dir / "models" / version
+    target.mkdir(parents=True, exist_ok=True)
+
+    source: ExampleSource = data
+    split: Dict = {"mode": "full"}
+    if holdout:
+        # import tardío: evaluate.py importa este módulo
+        from evaluate import _split_examples
+
+        source = partial(_split_examples, data, 0, 1, False, holdout)
+        split = {"mode": "holdout", "test_fraction": holdout}
+
+    started = time.perf_counter()
+    metadata: Dict = {
+        "version": version,
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "source": str(data),
+        "split": split,
+        "params": params,
+        "models": {},
+    }
+    for kind in KINDS:
+        model, info = fit_model(source, kind, **params)
+        joblib.dump(model, target / (MODEL_FILES[kind] + ".joblib"), compress=0)
+        metadata["models"][kind] = info
+        print(
+            f"[{kind}] {info['examples']} examples, {info['classes']} classes, "
+            f"{info['n_features']} features in {info['training_seconds']}s"
+        )
+    metadata["training_seconds"] = round(time.perf_counter() - started, 3)
+    metadata["examples"] = sum(m["examples"] for m in metadata["models"].values())
+
+    with (target / "metadata.json").open("w", encoding="utf-8") as f:
+        json.dump(metadata, f, ensure_ascii=False, indent=2)
+    if set_current:
+        (base_dir / "models" / "CURRENT").write_text(version + "\n", encoding="utf-8")
+    return target
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Entrena los modelos de atributos y de relación")
+    parser.add_argument("--data", default="tables_train.json", help="Fichero de ejemplos (.json o .jsonl)")
+    parser.add_argument("--dir", default=".", help="Directorio base donde se crea models/<version>/")
+    parser.add_argument("--version", default=None, help="Nombre de la versión (por defecto, fecha y hora)")
+    parser.add_argument("--set-current", action="store_true", help="Marca la versión como activa")
+    parser.add_argument("--algo", choices=["sgd", "nb"], default="sgd", help="Clasificador lineal a usar")
+    parser.add_argument("--n-features", type=int, default=2 ** 14, help="Dimensión del HashingVectorizer")
+    parser.add_argument("--epochs", type=int, default=10, help="Pasadas sobre el corpus (sgd)")
+    parser.add_argument("--batch-size", type=int, default=2048, help="Ejemplos por partial_fit")
+    parser.add_argument("--shuffle-buffer", type=int, default=50_000, help="Tamaño del buffer de barajado")
+    parser.add_argument("--min-count", type=int, default=1, help="Descarta salidas vistas menos veces")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--holdout", type=float, default=0.0,
+                        help="Fracción de test de evaluate.py que se excluye del entrenamiento")
+    args = parser.parse_args()
+    if not 0.0 <= args.holdout < 1.0:
+        parser.error("--holdout debe estar en [0, 1)")
+
+    target = train(
+        Path(args.data),
+        Path(args.dir),
+        version=args.version,
+        set_current=args.set_current,
+        holdout=args.holdout,
+        n_features=args.n_features,
+        algo=args.algo,
+        epochs=args.epochs,
+        batch_size=args.batch_size,
+        shuffle_buffer=args.shuffle_buffer,
+        seed=args.seed,
+        min_count=args.min_count,
+    )
+    print(f"Saved models to {target}")
+
+
+if __name__ == "__main__":
+    main()
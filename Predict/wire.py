@@ -0,0 +1,181 @@
+"""Formato de las peticiones y respuestas: JSON rápido, msgpack e interning.
+
+- ``FastJSONProvider``: proveedor JSON de Flask sobre ``orjson`` si está
+  instalado (si no, el de la librería estándar). Lo usan ``request.json`` y
+  ``jsonify`` en todas las rutas.
+- msgpack: peticiones con ``Content-Type: application/msgpack`` y respuestas
+  en msgpack si ``Accept`` lo prefiere sobre JSON. Es opcional: sin el
+  paquete ``msgpack`` esas peticiones reciben 415 y las respuestas siguen
+  en JSON.
+- interning: un cuerpo con ``"strings": [...]`` puede enviar las tablas como
+  ``[nombre, [atributos...]]`` con índices en esa lista, de modo que cada
+  nombre de atributo repetido viaja una sola vez::
+
+      {"strings": ["cliente", "id", "nombre", "producto"],
+       "tablas_existentes": [[0, [1, 2]], [3, [1, 2]]],
+       "items": [{"id": "c1", "tabla": 0}]}
+
+  Se expande a la forma normal al leer la petición. Solo reduce el tamaño
+  del cuerpo (red, proxies): la expansión se hace en Python y cuesta más CPU
+  que parsear la forma normal con orjson o msgpack, así que no conviene
+  cuando el cliente y el servicio comparten máquina o red rápida.
+"""
+from typing import Any, Callable, Dict, List
+
+from flask import Request
+from flask.json.provider import DefaultJSONProvider
+from werkzeug.exceptions import BadRequest, UnsupportedMediaType
+
+try:
+    import orjson
+except ImportError:  # opcional
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # opcional
+    msgpack = None
+
+MSGPACK_TYPES = ("application/msgpack", "application/x-msgpack")
+
+
+def _wants_msgpack(request: Request) -> bool:
+    if msgpack is None:
+        return False
+    accept = request.accept_mimetypes
+    best = accept.best_match(("application/json",) + MSGPACK_TYPES, default="application/json")
+    return best in MSGPACK_TYPES
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        if orjson is None or kwargs.get("indent"):
+            return super().dumps(obj, **kwargs)
+        return self._orjson(obj).decode("utf-8")
+
+    def loads(self, s: Any, **kwargs: Any) -> Any:
+        if orjson is None:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def _orjson(self, obj: Any) -> bytes:
+        option = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, default=self.default, option=option)
+
+    def response(self, *args: Any, **kwargs: Any):
+        from flask import request
+
+        obj = self._prepare_response_obj(args, kwargs)
+        if request and _wants_msgpack(request):
+            return self._app.response_class(msgpack.packb(obj, use_bin_type=True, default=self.default),
+                                            mimetype="application/msgpack")
+        if orjson is None or (self.compact is None and self._app.debug) or self.compact is False:
+            return super().response(obj)
+        return self._app.response_class(self._orjson(obj) + b"\n", mimetype=self.mimetype)
+
+
+def _expand_tabla(t: Any, strings: List[str]) -> Any:
+    if isinstance(t, list) and len(t) == 2:
+        nombre, atributos = t
+        return {"nombre": _expand_str(nombre, strings),
+                "atributos": [_expand_str(a, strings) for a in atributos or []]}
+    return t
+
+
+def _expand_str(v: Any, strings: List[str]) -> Any:
+    if isinstance(v, int) and not isinstance(v, bool):
+        if not 0 <= v < len(strings):
+            raise BadRequest(f"Índice {v} fuera de 'strings'")
+        return strings[v]
+    return v
+
+
+# Camino rápido: los índices se resuelven con ``map`` sobre un diccionario índice -> cadena,
+# que además rechaza negativos y fuera de rango (KeyError) sin comprobar uno a uno. Ante
+# cualquier otra forma (cadenas literales, None, tablas ya expandidas) se repite elemento
+# a elemento con ``_expand_str``, que responde 400 a los índices no válidos.
+def _expand_tablas(ts: List, get: Callable[[Any], str], strings: List[str]) -> List:
+    try:
+        return [{"nombre": get(n), "atributos": list(map(get, atributos))} for n, atributos in ts]
+    except (KeyError, TypeError, ValueError):
+        return [_expand_tabla(t, strings) for t in ts]
+
+
+def _expand_many(values: List, get: Callable[[Any], str], strings: List[str]) -> List:
+    try:
+        return list(map(get, values))
+    except (KeyError, TypeError):
+        return [_expand_str(v, strings) for v in values]
+
+
+def expand_interned(data: Any) -> Any:
+    """Forma interning -> forma normal (sin cambios si no hay ``strings``)."""
+    if not isinstance(data, dict) or not isinstance(data.get("strings"), list):
+        return data
+    strings = data.pop("strings")
+    get = dict(enumerate(strings)).__getitem__
+    if isinstance(data.get("tablas_existentes"), list):
+        data["tablas_existentes"] = _expand_tablas(data["tablas_existentes"], get, strings)
+    if "tabla" in data:
+        data["tabla"] = _expand_str(data["tabla"], strings)
+    for item in data.get("items") or []:
+        if isinstance(item, dict):
+            if "tabla" in item:
+                item["tabla"] = _expand_str(item["tabla"], strings)
+            if isinstance(item.get("tablas_existentes"), list):
+                item["tablas_existentes"] = _expand_tablas(item["tablas_existentes"], get, strings)
+    if isinstance(data.get("existing_classes"), list):
+        data["existing_classes"] = _expand_many(data["existing_classes"], get, strings)
+    return data
+
+
+class WireRequest(Request):
+    """``request.json`` acepta JSON o msgpack y expande la forma interning."""
+
+    def get_json(self, force: bool = False, silent: bool = False, cache: bool = True) -> Any:
+        if self.mimetype in MSGPACK_TYPES:
+            if msgpack is None:
+                raise UnsupportedMediaType("msgpack no está instalado en el servidor")
+            cached = getattr(self, "_msgpack_body", None)
+            if cached is None:
+                try:
+                    cached = expand_interned(msgpack.unpackb(self.get_data(cache=cache), raw=False))
+                except (ValueError, msgpack.ExtraData) as e:
+                    if silent:
+                        return None
+                    raise BadRequest(f"Cuerpo msgpack inválido: {e}")
+                if cache:
+                    self._msgpack_body = cached
+            return cached
+        data = super().get_json(force=force, silent=silent, cache=cache)
+        return expand_interned(data)
+
+
+def intern_payload(data: Dict) -> Dict:
+    """Forma normal -> forma interning (para clientes y benchmarks)."""
+    strings: List[str] = []
+    index: Dict[str, int] = {}
+
+    def ref(s: str) -> int:
+        i = index.get(s)
+        if i is None:
+            i = index[s] = len(strings)
+            strings.append(s)
+        return i
+
+    def tablas(ts: List[Dict]) -> List:
+        return [[ref(t["nombre"]), [ref(a) for a in t.get("atributos") or []]] for t in ts]
+
+    out: Dict[str, Any] = dict(data)
+    if "tablas_existentes" in out:
+        out["tablas_existentes"] = tablas(out["tablas_existentes"])
+    if "items" in out:
+        out["items"] = [
+            {**it, **({"tabla": ref(it["tabla"])} if "tabla" in it else {}),
+             **({"tablas_existentes": tablas(it["tablas_existentes"])} if "tablas_existentes" in it else {})}
+            for it in out["items"]
+        ]
+    out["strings"] = strings
+    return out
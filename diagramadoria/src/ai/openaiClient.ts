@@ -712,30 +712,33 @@ export async function suggestAttributesForClasses(
     };
 
     try {
+      // Una sola petición para todo el diagrama: el servicio vectoriza todas las clases juntas
+      const payload = {
+        items: classes.map(cls => ({ id: String(cls.displayId), tabla: cls.name })),
+        tablas_existentes: classes.map(e => ({
+          nombre: e.name,
+          atributos: (e.attributes || []).map(a => a.name)
+        }))
+      };
+      const url = `${ML_BASE}/predict/atributos/batch`;
+      try { console.info('[ML] atributos (batch) ->', url, payload); } catch (err) {}
+      const res = await fetch(url, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify(payload)
+      });
+      if (!res.ok) {
+        // eslint-disable-next-line no-console
+        console.error('ML atributos error', res.status, await res.text());
+        return [];
+      }
+      const data = await res.json();
+      const resultados: Record<string, { atributos?: unknown[] }> = data?.resultados || {};
       const results: AttributeSuggestion[] = [];
       for (const cls of classes) {
-        const existingForThis = (classes || []).filter(c => c.displayId !== cls.displayId);
-        const payload = {
-          tabla: cls.name,
-          tablas_existentes: existingForThis.map(e => ({
-            nombre: e.name,
-            atributos: (e.attributes || []).map(a => a.name)
-          }))
-        };
-        const url = `${ML_BASE}/predict/atributos`;
-        try { console.info('[ML] atributos ->', url, payload); } catch (err) {}
-        const res = await fetch(url, {
-          method: 'POST',
-          headers: { 'Content-Type': 'application/json' },
-          body: JSON.stringify(payload)
-        });
-        if (!res.ok) {
-          // eslint-disable-next-line no-console
-          console.error('ML atributos error', res.status, await res.text());
-          continue;
-        }
-        const data = await res.json();
-        const attrs: unknown[] = Array.isArray(data?.atributos) ? data.atributos : [];
+        const entry = resultados[String(cls.displayId)];
+        if (!entry) continue;
+        const attrs: unknown[] = Array.isArray(entry.atributos) ? entry.atributos : [];
         const mapped = attrs
           .map(a => String(a).trim())
           .filter(a => !!a)